@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the CPU-bound helpers that run on every turn or every import.
+
+    python benchmarks.py                      # run, print, append to the history file
+    python benchmarks.py --save-baseline      # run and store the results as the new baseline
+    python benchmarks.py --threshold 0.25     # fail (exit 1) if any benchmark is >25% slower than the baseline
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import subprocess
+import sys
+import timeit
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+# The helper modules create their singletons at import time and need a key
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from models import Tool, ToolType, ApiRequest, Api, Message, MessageType
+from openai_helper import OpenAIHelper
+from tools_router import resolve_schema_reference_from_spec
+from openapi_schema import SchemaRefResolver, ComponentCatalog
+from request_plans import compile_request_plan, apply_request_plan
+from token_counter import HISTORY_FIELD_MAX_CHARS
+from turn_context import TurnContext, ChatSettingsSnapshot
+from wuzapi_router import WuzapiHandler
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BACKEND_DIR)
+OPENAI_SPEC_PATH = os.path.join(PROJECT_ROOT, "openapi.json")
+WEATHER_SPEC_PATH = os.path.join(PROJECT_ROOT, "weatherapi_openapi_1.0.2.json")
+DEFAULT_BASELINE_PATH = os.path.join(BACKEND_DIR, "benchmark_baseline.json")
+# Where each run is appended; point it outside the source tree to keep checkouts clean
+DEFAULT_HISTORY_PATH = os.environ.get(
+    "BENCHMARK_HISTORY_PATH", os.path.join(BACKEND_DIR, "benchmark_history.jsonl")
+)
+
+TOOL_COUNTS = [50, 200, 500]
+
+SAMPLE_REPLY = """## Weather in Tel Aviv
+
+Here's what I found for **today**:
+
+- **Temperature**: 31°C, feels like _**34°C**_
+- **Humidity**: 64%
+- ~~Rain~~ No rain expected
+
+### Tomorrow
+- Slightly cooler, **28°C**
+- Light wind from the west
+
+Let me know if you want the **weekly** forecast or a _**detailed**_ hourly breakdown!
+""" * 4
+
+
+class _FakeQuery:
+    """Minimal stand-in for a SQLAlchemy query chain that returns canned rows."""
+
+    def __init__(self, rows: List[Any]):
+        self._rows = rows
+
+    def __getattr__(self, name: str) -> Callable[..., "_FakeQuery"]:
+        return lambda *args, **kwargs: self
+
+    def all(self) -> List[Any]:
+        return list(self._rows)
+
+    def first(self) -> Optional[Any]:
+        return self._rows[0] if self._rows else None
+
+
+class _FakeSession:
+    """Session stand-in whose queries all return the same canned rows."""
+
+    def __init__(self, rows: List[Any]):
+        self._rows = rows
+
+    def query(self, *entities: Any) -> _FakeQuery:
+        return _FakeQuery(self._rows)
+
+    def execute(self, statement: Any, params: Optional[Dict[str, Any]] = None) -> _FakeQuery:
+        return _FakeQuery(self._rows)
+
+
+def load_spec(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def resolve_all(schemas: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Resolve a list of schemas the way the OpenAPI import does: one resolver per spec."""
+    resolver = SchemaRefResolver(spec)
+    return [resolve_schema_reference_from_spec(schema, spec, resolver) for schema in schemas]
+
+
+def catalog_all(schemas: List[Dict[str, Any]], spec: Dict[str, Any]) -> ComponentCatalog:
+    """Hash every schema and its reachable components, as the OpenAPI import does."""
+    catalog = ComponentCatalog(spec)
+    for schema in schemas:
+        catalog.add_schema(schema)
+    return catalog
+
+
+def iter_operation_schemas(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Collect the (unresolved) request body and response schemas of every operation in a spec."""
+    schemas = []
+    for path_item in spec.get("paths", {}).values():
+        for method, operation in path_item.items():
+            if method in ["parameters", "summary", "description", "servers"]:
+                continue
+            for content_obj in operation.get("requestBody", {}).get("content", {}).values():
+                if "schema" in content_obj:
+                    schemas.append(content_obj["schema"])
+                    break
+            for response in operation.get("responses", {}).values():
+                # Swagger 2.0 responses carry the schema directly
+                if "schema" in response:
+                    schemas.append(response["schema"])
+                for content_obj in response.get("content", {}).values():
+                    if "schema" in content_obj:
+                        schemas.append(content_obj["schema"])
+    return schemas
+
+
+def build_tools(spec: Dict[str, Any], count: int) -> List[Tool]:
+    """
+    Build a realistic tool set: mostly API-linked tools from the spec, plus custom function tools and web search.
+    """
+    api = Api(
+        id=str(uuid.uuid4()),
+        server=spec.get("servers", [{}])[0].get("url", "https://api.example.com"),
+        service=spec.get("info", {}).get("title", "API"),
+        provider="Benchmark",
+        version="1.0",
+        processed=True
+    )
+
+    resolver = SchemaRefResolver(spec)
+    operations = []
+    for path, path_item in spec.get("paths", {}).items():
+        for method, operation in path_item.items():
+            if method in ["parameters", "summary", "description", "servers"]:
+                continue
+            request_schema = None
+            for content_obj in operation.get("requestBody", {}).get("content", {}).values():
+                if "schema" in content_obj:
+                    request_schema = resolve_schema_reference_from_spec(content_obj["schema"], spec, resolver)
+                    break
+            operations.append((path, method.upper(), operation.get("summary"), request_schema))
+
+    tools = [Tool(
+        id=str(uuid.uuid4()),
+        name="Web Search",
+        type=ToolType.WEB_SEARCH,
+        tool_type=ToolType.WEB_SEARCH,
+        configuration={},
+        function_schema={"search_context_size": "medium"}
+    )]
+
+    for i in range(count - 1):
+        if i % 5 == 4:
+            tools.append(Tool(
+                id=str(uuid.uuid4()),
+                name=f"custom function {i}",
+                type=ToolType.FUNCTION,
+                tool_type=ToolType.FUNCTION,
+                configuration={},
+                function_schema={
+                    "description": f"Custom function {i}",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {"value": {"type": "number"}, "unit": {"type": "string"}},
+                        "required": ["value"]
+                    }
+                }
+            ))
+            continue
+
+        path, method, summary, request_schema = operations[i % len(operations)]
+        api_request = ApiRequest(
+            id=str(uuid.uuid4()),
+            api_id=api.id,
+            path=path,
+            method=method,
+            description=summary,
+            request_body_schema=request_schema
+        )
+        api_request.api = api
+        tool = Tool(
+            id=str(uuid.uuid4()),
+            name=f"{method.lower()} {path}",
+            type=ToolType.FUNCTION,
+            tool_type=ToolType.FUNCTION,
+            api_request_id=api_request.id,
+            configuration={},
+            skip_params=["user"] if i % 3 == 0 else None
+        )
+        tool.api_request = api_request
+        tools.append(tool)
+
+    return tools
+
+
+def build_conversation_fixture():
+    """Build a conversation with 20 history messages, including tool calls with large results."""
+    chat_settings = ChatSettingsSnapshot(
+        id=str(uuid.uuid4()), name="Benchmark", system_prompt="You are Oats.", model="gpt-4o-mini",
+        is_template=False, history_token_budget=None, turn_timeout_seconds=None, tools=()
+    )
+    conversation = TurnContext(
+        chatid="120363402409737791@g.us", name=None, is_group=True, group_name="Benchmark",
+        source_type="WHATSAPP", portal_user_id=None, chat_settings=chat_settings,
+        summary="The group planned a weekend trip to Tel Aviv and asked about the weather."
+    )
+
+    history = []
+    for i in range(20):
+        if i % 5 == 3:
+            history.append(Message(
+                id=str(uuid.uuid4()), chatid=conversation.chatid, type=MessageType.TOOL_CALL, role="assistant",
+                openai_tool_call_id=f"fc_{i}", tool_call_id=f"call_{i}", openai_function_name="api_weatherapi_forecast_get",
+                function_arguments=json.dumps({"q": "Tel Aviv", "days": 3})
+            ))
+        elif i % 5 == 4:
+            history.append(Message(
+                id=str(uuid.uuid4()), chatid=conversation.chatid, type=MessageType.TOOL_RESULT, role="tool",
+                tool_call_id=f"call_{i - 1}", openai_function_name="api_weatherapi_forecast_get",
+                function_result=json.dumps({"forecast": [{"hour": h, "temp_c": 20 + h % 7} for h in range(72)]}, indent=2)
+            ))
+        else:
+            history.append(Message(
+                id=str(uuid.uuid4()), chatid=conversation.chatid, type=MessageType.TEXT,
+                role="user" if i % 2 == 0 else "assistant", sender="972501234567@s.whatsapp.net" if i % 2 == 0 else None,
+                content=SAMPLE_REPLY[:400]
+            ))
+
+    user_message = Message(id=str(uuid.uuid4()), chatid=conversation.chatid, type=MessageType.TEXT, role="user", content="And tomorrow?")
+    # Rows as selected by the load_message_history window, newest first
+    rows = []
+    for msg in reversed(history):
+        rows.append((
+            msg.id, msg.type, msg.role, msg.sender, msg.content,
+            msg.openai_tool_call_id, msg.tool_call_id, msg.openai_function_name,
+            msg.function_arguments[:HISTORY_FIELD_MAX_CHARS] if msg.function_arguments else None,
+            len(msg.function_arguments) if msg.function_arguments else None,
+            msg.function_result[:HISTORY_FIELD_MAX_CHARS] if msg.function_result else None,
+            len(msg.function_result) if msg.function_result else None
+        ))
+    return conversation, user_message, _FakeSession(rows)
+
+
+def build_benchmarks() -> Dict[str, Callable[[], Any]]:
+    """Create the benchmark callables, keyed by name."""
+    helper = OpenAIHelper("sk-benchmark")
+    wuzapi = WuzapiHandler()
+    openai_spec = load_spec(OPENAI_SPEC_PATH)
+    weather_spec = load_spec(WEATHER_SPEC_PATH)
+    openai_bodies = iter_operation_schemas(openai_spec)
+    weather_bodies = iter_operation_schemas(weather_spec)
+    conversation, user_message, session = build_conversation_fixture()
+    plan = compile_request_plan(build_tools(openai_spec, 2)[1])
+    plan_arguments = {"model": "gpt-4o-mini", "input": "Hello there", "voice": "alloy", "unknown": 1}
+
+    benchmarks: Dict[str, Callable[[], Any]] = {
+        "resolve_schema_reference_from_spec[openapi.json]":
+            lambda: resolve_all(openai_bodies, openai_spec),
+        "resolve_schema_reference_from_spec[weatherapi]":
+            lambda: resolve_all(weather_bodies, weather_spec),
+        "ComponentCatalog[openapi.json]":
+            lambda: catalog_all(openai_bodies, openai_spec),
+        "sanitize_message[2KB reply]":
+            lambda: wuzapi.sanitize_message(SAMPLE_REPLY),
+        "_format_conversation[20 messages]":
+            lambda: helper._format_conversation(conversation, user_message, session, 20),
+        "apply_request_plan[API tool call]":
+            lambda: apply_request_plan(plan, plan_arguments, "sk-benchmark"),
+    }
+
+    for count in TOOL_COUNTS:
+        tools = build_tools(openai_spec, count)
+        names = [f"{tool.name} ({tool.id[:8]})" for tool in tools]
+        benchmarks[f"format_tools_for_openai[{count} tools]"] = (lambda tools=tools: helper.format_tools_for_openai(tools))
+        benchmarks[f"_sanitize_tool_name[{count} names]"] = (lambda names=names: [helper._sanitize_tool_name(n) for n in names])
+
+    return benchmarks
+
+
+def run_benchmarks(benchmarks: Dict[str, Callable[[], Any]], repeat: int = 5, min_time: float = 0.2) -> Dict[str, float]:
+    """
+    Time each benchmark and return the best seconds-per-call of several repeats.
+
+    Args:
+        benchmarks: Benchmark callables keyed by name
+        repeat: Number of timing repeats per benchmark (the minimum is reported)
+        min_time: Minimum duration of one repeat in seconds
+
+    Returns:
+        Seconds per call, keyed by benchmark name
+    """
+    results = {}
+    for name, func in benchmarks.items():
+        timer = timeit.Timer(func)
+        number = 1
+        while timer.timeit(number) < min_time and number < 1_000_000:
+            number *= 2
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+        results[name] = best
+        print(f"{name:<60} {best * 1000:>12.4f} ms")
+    return results
+
+
+def compare_to_baseline(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    """
+    Return a description of every benchmark that is slower than its baseline by more than the threshold.
+    """
+    regressions = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = (seconds - base) / base
+        if change > threshold:
+            regressions.append(f"{name}: {base * 1000:.4f} ms -> {seconds * 1000:.4f} ms (+{change:.0%})")
+    return regressions
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for CPU-bound helpers")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="Baseline results file")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_PATH, help="Results history file (one JSON line per run)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown vs. baseline (0.25 = 25%%)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repeats per benchmark")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this string")
+    args = parser.parse_args()
+
+    # The helpers log every tool at INFO; keep the log output out of the measurements
+    logging.basicConfig(level=logging.WARNING)
+    logging.disable(logging.INFO)
+
+    benchmarks = {name: func for name, func in build_benchmarks().items() if args.filter in name}
+    results = run_benchmarks(benchmarks, repeat=args.repeat)
+
+    with open(args.history, "a", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "timestamp": datetime.datetime.utcnow().isoformat(),
+            "revision": _git_revision(),
+            "python": sys.version.split()[0],
+            "results": results
+        }) + "\n")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = compare_to_baseline(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+
+    print(f"\nNo regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import ast
+import math
+import logging
+import operator
+from datetime import date, timedelta
+from typing import Any, Dict
+
+from local_tools import local_tools, PROCESS
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Factor to the base unit of each dimension
+UNIT_FACTORS: Dict[str, Dict[str, float]] = {
+    "length": {"mm": 0.001, "cm": 0.01, "m": 1.0, "km": 1000.0, "in": 0.0254, "ft": 0.3048, "yd": 0.9144, "mi": 1609.344},
+    "mass": {"mg": 0.000001, "g": 0.001, "kg": 1.0, "t": 1000.0, "oz": 0.028349523125, "lb": 0.45359237},
+    "volume": {"ml": 0.001, "l": 1.0, "tsp": 0.00492892159375, "tbsp": 0.01478676478125, "cup": 0.2365882365, "gal": 3.785411784},
+    "time": {"s": 1.0, "min": 60.0, "h": 3600.0, "d": 86400.0, "wk": 604800.0},
+}
+TEMPERATURE_UNITS = {"c", "f", "k"}
+
+# Operators allowed in calculate expressions
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+MATH_FUNCTIONS = {
+    name: getattr(math, name)
+    for name in ("sqrt", "log", "log10", "exp", "sin", "cos", "tan", "floor", "ceil", "fabs", "factorial")
+}
+MATH_CONSTANTS = {"pi": math.pi, "e": math.e}
+# Largest exponent and factorial argument, so one expression cannot run for minutes
+MAX_EXPONENT = 10000
+# Largest integer result, in bits (about 3000 digits); checked before a power is computed
+MAX_RESULT_BITS = 10000
+MAX_EXPRESSION_LENGTH = 500
+
+
+def _to_celsius(value: float, unit: str) -> float:
+    if unit == "f":
+        return (value - 32) * 5 / 9
+    if unit == "k":
+        return value - 273.15
+    return value
+
+
+def _from_celsius(value: float, unit: str) -> float:
+    if unit == "f":
+        return value * 9 / 5 + 32
+    if unit == "k":
+        return value + 273.15
+    return value
+
+
+@local_tools.register(
+    name="convert_units",
+    description="Convert a value between units of length, mass, volume, time or temperature",
+    parameters={
+        "type": "object",
+        "properties": {
+            "value": {"type": "number", "description": "The value to convert"},
+            "from_unit": {"type": "string", "description": "Unit of the value, e.g. km, lb, cup, h, f"},
+            "to_unit": {"type": "string", "description": "Unit to convert to"}
+        },
+        "required": ["value", "from_unit", "to_unit"]
+    },
+    timeout_seconds=2
+)
+def convert_units(value: float, from_unit: str, to_unit: str) -> Dict[str, Any]:
+    """
+    Convert a value between two units of the same dimension.
+
+    Args:
+        value: The value to convert
+        from_unit: Unit of the value (case-insensitive)
+        to_unit: Unit to convert to
+
+    Returns:
+        The converted value with both units
+    """
+    source, target = from_unit.strip().lower(), to_unit.strip().lower()
+    if source in TEMPERATURE_UNITS and target in TEMPERATURE_UNITS:
+        converted = _from_celsius(_to_celsius(value, source), target)
+    else:
+        for factors in UNIT_FACTORS.values():
+            if source in factors and target in factors:
+                converted = value * factors[source] / factors[target]
+                break
+        else:
+            raise ValueError(f"Cannot convert {from_unit} to {to_unit}")
+    return {"value": value, "from_unit": from_unit, "to_unit": to_unit, "result": round(converted, 10)}
+
+
+@local_tools.register(
+    name="date_calculator",
+    description="Add days to a date, or count the days between two dates (ISO format, YYYY-MM-DD)",
+    parameters={
+        "type": "object",
+        "properties": {
+            "start_date": {"type": "string", "description": "Start date, YYYY-MM-DD"},
+            "days": {"type": "integer", "description": "Days to add (negative to subtract)"},
+            "end_date": {"type": "string", "description": "End date, YYYY-MM-DD, to count the days until"}
+        },
+        "required": ["start_date"]
+    },
+    timeout_seconds=2
+)
+def date_calculator(start_date: str, days: int = None, end_date: str = None) -> Dict[str, Any]:
+    """
+    Do date arithmetic.
+
+    Args:
+        start_date: Start date in ISO format
+        days: Days to add to start_date
+        end_date: Date to count the days until from start_date
+
+    Returns:
+        The resulting date and weekday, or the number of days between the dates
+    """
+    start = date.fromisoformat(start_date)
+    if end_date is not None:
+        end = date.fromisoformat(end_date)
+        return {"start_date": start.isoformat(), "end_date": end.isoformat(), "days": (end - start).days}
+    if days is None:
+        raise ValueError("Either days or end_date is required")
+    result = start + timedelta(days=days)
+    return {"start_date": start.isoformat(), "days": days, "date": result.isoformat(), "weekday": result.strftime("%A")}
+
+
+def _check_size(value: Any) -> Any:
+    # Products and factorials are cheap to compute but their results grow without bound
+    if isinstance(value, int) and value.bit_length() > MAX_RESULT_BITS:
+        raise ValueError(f"Result larger than {MAX_RESULT_BITS} bits")
+    return value
+
+
+def _evaluate(node: ast.AST) -> Any:
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in MATH_CONSTANTS:
+        return MATH_CONSTANTS[node.id]
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        left, right = _evaluate(node.left), _evaluate(node.right)
+        if isinstance(node.op, ast.Pow):
+            if abs(right) > MAX_EXPONENT:
+                raise ValueError(f"Exponent larger than {MAX_EXPONENT}")
+            if isinstance(left, int) and isinstance(right, int) and abs(left).bit_length() * abs(right) > MAX_RESULT_BITS:
+                raise ValueError(f"Result larger than {MAX_RESULT_BITS} bits")
+        return _check_size(BINARY_OPERATORS[type(node.op)](left, right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        return UNARY_OPERATORS[type(node.op)](_evaluate(node.operand))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in MATH_FUNCTIONS and len(node.args) == 1 and not node.keywords:
+        argument = _evaluate(node.args[0])
+        if node.func.id == "factorial" and argument > MAX_EXPONENT:
+            raise ValueError(f"Factorial argument larger than {MAX_EXPONENT}")
+        return _check_size(MATH_FUNCTIONS[node.func.id](argument))
+    raise ValueError(f"Unsupported expression element: {type(node).__name__}")
+
+
+@local_tools.register(
+    name="calculate",
+    description="Evaluate an arithmetic expression (+ - * / // % **, sqrt, log, exp, sin, cos, tan, factorial, pi, e)",
+    parameters={
+        "type": "object",
+        "properties": {
+            "expression": {"type": "string", "description": "The expression, e.g. (3 + 4) * sqrt(2)"}
+        },
+        "required": ["expression"]
+    },
+    executor=PROCESS,
+    timeout_seconds=5,
+    memory_limit_mb=256
+)
+def calculate(expression: str) -> Dict[str, Any]:
+    """
+    Evaluate an arithmetic expression without eval().
+
+    Runs in the process pool: large integer arithmetic is CPU-bound and its memory is
+    capped there.
+
+    Args:
+        expression: The expression
+
+    Returns:
+        The expression and its result
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"Expression longer than {MAX_EXPRESSION_LENGTH} characters")
+    return {"expression": expression, "result": _evaluate(ast.parse(expression, mode="eval"))}
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 import logging
 import uuid
@@ -7,11 +8,41 @@ from datetime import datetime
 
 from db import get_db
 from models import ChatSettings, ChatSettingsCreate, ChatSettingsUpdate, ChatSettingsResponse
-from models import Tool, ToolType
+from models import Tool, ToolType, SourceType, Conversation
+from well_known_tools import get_well_known_tool, WEB_SEARCH_TOOL_KEY
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Default system prompts for auto-created conversations, by source type
+DEFAULT_SYSTEM_PROMPTS = {
+    SourceType.WHATSAPP: "You are a friendly and laid back whatsapp assistant called Oats (Hebrew: אוטס).",
+    SourceType.PORTAL: "You are Oats, a helpful AI assistant available through our web portal.",
+}
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Fixed IDs, so every worker finds (or creates) the same template row
+SETTINGS_TEMPLATE_NAMESPACE = uuid.UUID("6f3c2a1e-9d4b-4c8e-a0f7-5b2d8e1c9a34")
+
+def ensure_settings_editable(chat_settings: ChatSettings, apply_to_template: bool) -> None:
+    """
+    Refuse to edit a shared settings template unless the caller explicitly opted in.
+    
+    Args:
+        chat_settings: The chat settings about to be edited
+        apply_to_template: Whether the caller asked to change the template for every conversation
+    """
+    if chat_settings.is_template and not apply_to_template:
+        logger.warning(f"Refused to edit settings template {chat_settings.id} without apply_to_template.")
+        raise HTTPException(
+            status_code=409,
+            detail=(
+                "These chat settings are a template shared by many conversations. Use "
+                "POST /conversations/{conversation_id}/chat_settings/copy to customize one "
+                "conversation, or pass apply_to_template=true to change all of them."
+            )
+        )
+
 async def get_or_create_web_search_tool(db: Session) -> Tool:
     """
     Get the web search tool from the database or create it if it doesn't exist.
@@ -22,43 +53,94 @@ async def get_or_create_web_search_tool(db: Session) -> Tool:
     Returns:
         Web search tool object
     """
-    # Check if web search tool already exists - getting all OpenAI tools and filtering in Python
-    # This approach is more compatible across different database backends
-    openai_tools = db.query(Tool).filter(Tool.type == ToolType.OPENAI_TOOL).all()
-    web_search_tool = None
-    
-    for tool in openai_tools:
-        if tool.configuration.get('type') in ['web_search', 'web_search_preview']:
-            web_search_tool = tool
-            break
-    
-    # If web search tool doesn't exist, create it
-    if not web_search_tool:
-        tool_id = str(uuid.uuid4())
-        
-        # Create new web search tool
-        web_search_tool = Tool(
-            id=tool_id,
-            name="Web Search",
-            description="Search the web for the latest information",
-            type=ToolType.OPENAI_TOOL,
-            configuration={
-                "type": "web_search_preview",
-                # Optionally add user_location and search_context_size here if needed
-                # "user_location": {"type": "approximate", "country": "US"},
-                # "search_context_size": "medium"
-            },
-            created_at=datetime.utcnow()
-        )
+    return get_well_known_tool(db, WEB_SEARCH_TOOL_KEY)
+
+def settings_template_id(source_type: str) -> str:
+    """Get the fixed ID of the default settings template for a source type."""
+    return str(uuid.uuid5(SETTINGS_TEMPLATE_NAMESPACE, f"default-{SourceType(source_type).value}"))
+
+async def get_or_create_settings_template(db: Session, source_type: str = SourceType.WHATSAPP) -> ChatSettings:
+    """
+    Get the default chat settings template for a source type, creating it on first use.
+    
+    New conversations share this template instead of getting their own settings row;
+    a conversation only gets its own copy once it is customized (see fork_chat_settings).
+    
+    Args:
+        db: Database session
+        source_type: The conversation source type
         
-        # Add to database
-        db.add(web_search_tool)
+    Returns:
+        The template chat settings
+    """
+    template_id = settings_template_id(source_type)
+    template = db.query(ChatSettings).filter(ChatSettings.id == template_id).first()
+    if template:
+        return template
+    
+    tools = []
+    if source_type == SourceType.WHATSAPP:
+        tools.append(await get_or_create_web_search_tool(db))
+    
+    source_name = SourceType(source_type).value.lower()
+    template = ChatSettings(
+        id=template_id,
+        name=f"Default {source_name} settings",
+        description=f"Shared chat settings template for {source_name} conversations",
+        system_prompt=DEFAULT_SYSTEM_PROMPTS.get(source_type, "You are Oats, a helpful AI assistant."),
+        model=DEFAULT_MODEL,
+        is_template=True
+    )
+    template.tools = tools
+    db.add(template)
+    
+    try:
         db.commit()
-        db.refresh(web_search_tool)
+    except IntegrityError:
+        # Another worker created it first
+        db.rollback()
+        template = db.query(ChatSettings).filter(ChatSettings.id == template_id).one()
+    else:
+        logger.info(f"Created chat settings template {template_id} for {source_type}")
+    
+    return template
+
+def fork_chat_settings(db: Session, conversation: Conversation) -> ChatSettings:
+    """
+    Copy-on-write: give a conversation its own copy of the template settings it uses.
+    
+    The copy links to the same tools as the template (no tools are cloned). Conversations
+    that already have their own settings are returned as-is. The caller commits.
+    
+    Args:
+        db: Database session
+        conversation: The conversation about to customize its settings
         
-        logger.info(f"Created new web search tool with ID: {tool_id}")
+    Returns:
+        The conversation's own chat settings
+    """
+    template = conversation.chat_settings
+    if template is not None and not template.is_template:
+        return template
+    
+    settings = ChatSettings(
+        id=str(uuid.uuid4()),
+        name=f"Settings for {conversation.name or conversation.group_name or 'Untitled Chat'}",
+        description=template.description if template else None,
+        system_prompt=template.system_prompt if template else DEFAULT_SYSTEM_PROMPTS.get(conversation.source_type, "You are Oats, a helpful AI assistant."),
+        model=template.model if template else DEFAULT_MODEL,
+        history_token_budget=template.history_token_budget if template else None,
+        turn_timeout_seconds=template.turn_timeout_seconds if template else None,
+        template_id=template.id if template else None
+    )
+    settings.tools = list(template.tools) if template else []
+    db.add(settings)
     
-    return web_search_tool
+    conversation.chat_settings = settings
+    conversation.updated_at = datetime.utcnow()
+    
+    logger.info(f"Copied chat settings {template.id if template else None} to {settings.id} for conversation {conversation.chatid}")
+    return settings
 
 @router.post("/chat-settings", response_model=ChatSettingsResponse)
 async def create_chat_settings(chat_settings: ChatSettingsCreate, db: Session = Depends(get_db)):
@@ -71,7 +153,10 @@ async def create_chat_settings(chat_settings: ChatSettingsCreate, db: Session =
         name=chat_settings.name,
         description=chat_settings.description,
         system_prompt=chat_settings.system_prompt,
-        model=chat_settings.model
+        model=chat_settings.model,
+        history_token_budget=chat_settings.history_token_budget,
+        turn_timeout_seconds=chat_settings.turn_timeout_seconds,
+        is_template=chat_settings.is_template
     )
     
     # Add to database
@@ -109,7 +194,12 @@ async def get_chat_settings(settings_id: str, db: Session = Depends(get_db)):
     return chat_settings
 
 @router.put("/chat-settings/{settings_id}", response_model=ChatSettingsResponse)
-async def update_chat_settings(settings_id: str, chat_settings: ChatSettingsUpdate, db: Session = Depends(get_db)):
+async def update_chat_settings(
+    settings_id: str,
+    chat_settings: ChatSettingsUpdate,
+    apply_to_template: bool = Query(False, description="Allow changing a template shared by many conversations"),
+    db: Session = Depends(get_db)
+):
     # Get the chat settings by ID
     db_chat_settings = db.query(ChatSettings).filter(ChatSettings.id == settings_id).first()
     
@@ -118,6 +208,9 @@ async def update_chat_settings(settings_id: str, chat_settings: ChatSettingsUpda
         logger.warning(f"Chat settings with ID {settings_id} not found for update.")
         raise HTTPException(status_code=404, detail="Chat settings not found")
     
+    # Updating a template changes it for every conversation sharing it
+    ensure_settings_editable(db_chat_settings, apply_to_template)
+    
     # Update fields if provided in the request
     if chat_settings.name is not None:
         db_chat_settings.name = chat_settings.name
@@ -127,6 +220,10 @@ async def update_chat_settings(settings_id: str, chat_settings: ChatSettingsUpda
         db_chat_settings.system_prompt = chat_settings.system_prompt
     if chat_settings.model is not None:
         db_chat_settings.model = chat_settings.model
+    if chat_settings.history_token_budget is not None:
+        db_chat_settings.history_token_budget = chat_settings.history_token_budget
+    if chat_settings.turn_timeout_seconds is not None:
+        db_chat_settings.turn_timeout_seconds = chat_settings.turn_timeout_seconds
     
     # Save the changes
     db.add(db_chat_settings)
@@ -156,6 +253,11 @@ async def delete_chat_settings(settings_id: str, db: Session = Depends(get_db)):
             detail="Cannot delete chat settings that are being used by conversations"
         )
     
+    # Copies made from this template keep their settings, just not the link
+    db.query(ChatSettings).filter(ChatSettings.template_id == settings_id).update(
+        {ChatSettings.template_id: None}, synchronize_session=False
+    )
+    
     # Delete the chat settings
     db.delete(chat_settings)
     
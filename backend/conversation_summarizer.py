@@ -0,0 +1,274 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, Iterable, Optional, Set
+from sqlalchemy import func, select, bindparam, or_
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+
+from db import SessionLocal
+from models import Message, MessageType, ConversationSummary
+from token_counter import MESSAGE_OVERHEAD_TOKENS, count_tokens
+from turn_context import DEFAULT_HISTORY_TOKEN_BUDGET, HISTORY_MAX_MESSAGES
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Model used to fold messages into the summary
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "gpt-4o-mini")
+# Minimum number of messages outside the history window before a fold runs
+SUMMARY_MIN_MESSAGES = int(os.environ.get("SUMMARY_MIN_MESSAGES", "10"))
+# Maximum number of messages folded in one run
+SUMMARY_BATCH_MESSAGES = int(os.environ.get("SUMMARY_BATCH_MESSAGES", "200"))
+# Longest summary kept, in characters
+SUMMARY_MAX_CHARS = int(os.environ.get("SUMMARY_MAX_CHARS", "4000"))
+
+# Longest tool arguments / result quoted in the transcript given to the summary model
+TRANSCRIPT_FIELD_MAX_CHARS = 500
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain the running summary of a chat between users and an assistant named Oats. "
+    "Merge the new messages into the current summary. Keep names, decisions, open questions, "
+    "preferences and facts the assistant may need later; drop greetings and small talk. "
+    "Write plain prose in the language of the chat, at most a few short paragraphs."
+)
+
+# summarize(instructions, text) -> summary
+SummarizeFn = Callable[[str, str], str]
+
+
+def format_transcript(messages: Iterable[Any]) -> str:
+    """
+    Render messages as a compact transcript for the summary model.
+
+    Args:
+        messages: Rows with type, role, sender_name, content, openai_function_name,
+            function_arguments and function_result attributes, oldest first
+
+    Returns:
+        One line per message
+    """
+    lines = []
+    for msg in messages:
+        if msg.type == MessageType.TOOL_CALL:
+            arguments = (msg.function_arguments or "")[:TRANSCRIPT_FIELD_MAX_CHARS]
+            lines.append(f"[Oats called {msg.openai_function_name}({arguments})]")
+        elif msg.type == MessageType.TOOL_RESULT:
+            result = (msg.function_result or "")[:TRANSCRIPT_FIELD_MAX_CHARS]
+            lines.append(f"[{msg.openai_function_name} returned: {result}]")
+        elif msg.content:
+            speaker = msg.sender_name or ("Oats" if msg.role == "assistant" else "User")
+            lines.append(f"{speaker}: {msg.content}")
+    return "\n".join(lines)
+
+
+def fold_summary(previous_summary: Optional[str], messages: Iterable[Any], summarize: SummarizeFn) -> str:
+    """
+    Fold messages into a summary.
+
+    Args:
+        previous_summary: The current summary, if any
+        messages: The messages to fold, oldest first (see format_transcript)
+        summarize: Function called with (instructions, text) that returns the new summary
+
+    Returns:
+        The new summary, at most SUMMARY_MAX_CHARS long
+    """
+    text = (
+        f"Current summary:\n{previous_summary or '(none yet)'}\n\n"
+        f"New messages:\n{format_transcript(messages)}"
+    )
+    summary = (summarize(SUMMARY_INSTRUCTIONS, text) or "").strip()
+    return summary[:SUMMARY_MAX_CHARS]
+
+
+def _openai_summarize(instructions: str, text: str) -> str:
+    # Imported here so the summarizer can be used (and tested) without an API key
+    from openai_helper import openai_helper
+    from openai_limiter import PRIORITY_BACKGROUND
+    # Queued behind the turns, on whichever pooled API key has capacity
+    raw_response = openai_helper.rate_limiter.run_blocking(
+        lambda client: client.responses.with_raw_response.create(model=SUMMARY_MODEL, instructions=instructions, input=text),
+        PRIORITY_BACKGROUND
+    )
+    return raw_response.parse().output_text
+
+
+def _messages_to_fold_statement() -> Any:
+    # Messages after the summary that are outside the history window, oldest first: beyond the
+    # newest history_limit messages or the newest keep_tokens of history. Position and running sum
+    # are computed exactly like the history window in turn_context.py.
+    tokens = func.coalesce(
+        Message.token_count,
+        func.coalesce(func.length(Message.content), 0) / 4 + MESSAGE_OVERHEAD_TOKENS
+    )
+    newest_first = (Message.created_at.desc(), Message.id.desc())
+    after = bindparam("after", type_=Message.created_at.type)
+    ranked = (
+        select(
+            Message.id,
+            Message.created_at,
+            Message.type,
+            Message.role,
+            Message.sender_name,
+            Message.content,
+            Message.openai_function_name,
+            func.substr(Message.function_arguments, 1, TRANSCRIPT_FIELD_MAX_CHARS).label("function_arguments"),
+            func.substr(Message.function_result, 1, TRANSCRIPT_FIELD_MAX_CHARS).label("function_result"),
+            func.sum(tokens).over(order_by=newest_first).label("running_tokens"),
+            func.row_number().over(order_by=newest_first).label("position")
+        )
+        .where(Message.chatid == bindparam("chat_id"))
+        .where(or_(after.is_(None), Message.created_at > after))
+        .subquery()
+    )
+    return (
+        select(ranked)
+        .where(or_(
+            ranked.c.position > bindparam("history_limit"),
+            ranked.c.running_tokens > bindparam("keep_tokens")
+        ))
+        .order_by(ranked.c.created_at, ranked.c.id)
+        .limit(bindparam("batch_size"))
+    )
+
+
+def summarize_conversation(
+    db: Session,
+    chat_id: str,
+    keep_tokens: int = DEFAULT_HISTORY_TOKEN_BUDGET,
+    summarize: Optional[SummarizeFn] = None,
+    min_messages: int = SUMMARY_MIN_MESSAGES,
+    batch_size: int = SUMMARY_BATCH_MESSAGES,
+    history_limit: int = HISTORY_MAX_MESSAGES
+) -> Optional[ConversationSummary]:
+    """
+    Fold the messages that no longer fit the history window into the conversation summary.
+
+    Does nothing until at least min_messages are outside the window. The update is
+    conditional on the summary not having moved in the meantime, so concurrent runs for
+    the same conversation cannot fold the same messages twice.
+
+    Args:
+        db: Database session
+        chat_id: The conversation ID
+        keep_tokens: Tokens of recent history left unsummarized (the history token budget)
+        summarize: Function called with (instructions, text); defaults to the OpenAI Responses API
+        min_messages: Minimum number of messages to fold
+        batch_size: Maximum number of messages to fold in this run
+        history_limit: Maximum number of messages in the history window
+
+    Returns:
+        The updated summary, or None if nothing was folded
+    """
+    current = db.get(ConversationSummary, chat_id)
+    previous_until = current.summarized_until if current else None
+
+    messages = db.execute(_messages_to_fold_statement(), {
+        "chat_id": chat_id,
+        "after": previous_until,
+        "keep_tokens": keep_tokens,
+        "history_limit": history_limit,
+        "batch_size": batch_size
+    }).all()
+    if len(messages) < min_messages:
+        return None
+
+    logger.info(f"[Summarizer] Folding {len(messages)} messages into the summary of {chat_id}")
+    summary_text = fold_summary(current.summary if current else None, messages, summarize or _openai_summarize)
+    if not summary_text:
+        logger.warning(f"[Summarizer] Empty summary returned for {chat_id}, keeping the previous one")
+        return None
+
+    newest = messages[-1]
+    values = {
+        "summary": summary_text,
+        "summarized_until": newest.created_at,
+        "last_message_id": newest.id,
+        "token_count": count_tokens(summary_text),
+        "updated_at": datetime.utcnow()
+    }
+
+    if current is None:
+        current = ConversationSummary(chatid=chat_id, message_count=len(messages), **values)
+        db.add(current)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            logger.info(f"[Summarizer] Summary of {chat_id} was created concurrently, skipping")
+            return None
+        return current
+
+    updated = db.query(ConversationSummary).filter(
+        ConversationSummary.chatid == chat_id,
+        ConversationSummary.summarized_until == previous_until
+    ).update(
+        {**values, "message_count": ConversationSummary.message_count + len(messages)},
+        synchronize_session=False
+    )
+    if not updated:
+        db.rollback()
+        logger.info(f"[Summarizer] Summary of {chat_id} was updated concurrently, skipping")
+        return None
+    db.commit()
+    db.refresh(current)
+    return current
+
+
+class ConversationSummarizer:
+    """
+    Runs summarize_conversation in the background, off the reply path.
+
+    At most one run per conversation is in flight in this process; each run uses its
+    own database session in a worker thread.
+    """
+
+    def __init__(self, summarize: Optional[SummarizeFn] = None, session_factory: Callable[[], Session] = SessionLocal):
+        """
+        Initialize the summarizer.
+
+        Args:
+            summarize: Function called with (instructions, text); defaults to the OpenAI Responses API
+            session_factory: Creates the database session of a run
+        """
+        self.summarize = summarize
+        self.session_factory = session_factory
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, chat_id: str, keep_tokens: int = DEFAULT_HISTORY_TOKEN_BUDGET) -> Optional[asyncio.Task]:
+        """
+        Start a background summary run for a conversation unless one is already running.
+
+        Args:
+            chat_id: The conversation ID
+            keep_tokens: Tokens of recent history left unsummarized
+
+        Returns:
+            The background task, or None if a run is already in flight
+        """
+        if chat_id in self._running:
+            return None
+        self._running.add(chat_id)
+        task = asyncio.get_running_loop().create_task(asyncio.to_thread(self._run, chat_id, keep_tokens))
+        # Keep a reference until done, the loop only holds weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _run(self, chat_id: str, keep_tokens: int) -> None:
+        db = self.session_factory()
+        try:
+            summarize_conversation(db, chat_id, keep_tokens, self.summarize)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[Summarizer] Error summarizing conversation {chat_id}: {e}")
+        finally:
+            db.close()
+            self._running.discard(chat_id)
+
+
+# Shared instance used by the message handlers
+conversation_summarizer = ConversationSummarizer()
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict
+from typing import Any, List, Optional, Dict
 import logging
 import uuid
 from datetime import datetime
@@ -9,6 +9,11 @@ from pydantic import BaseModel
 from db import get_db
 from models import Conversation, ConversationParticipant, ConversationCreate, ConversationResponse, ChatSettings, ChatSettingsCreate, ChatSettingsResponse, Message, MessageType, SourceType
 from openai_helper import openai_helper
+from chat_settings_router import get_or_create_settings_template, fork_chat_settings
+from turn_context import load_turn_context
+from conversation_summarizer import conversation_summarizer
+from deadline import Deadline, turn_metrics
+from tool_jobs import tool_job_runner
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -25,33 +30,9 @@ async def create_conversation(conversation: ConversationCreate, db: Session = De
         if not chat_settings:
             logger.warning(f"Chat settings with ID {chat_settings_id} not found.")
             raise HTTPException(status_code=404, detail="Specified chat settings not found")
-    # If no chat_settings_id is provided, create default chat settings based on source type
+    # If no chat_settings_id is provided, share the default settings template for the source type
     else:
-        # Create a new chat setting for this conversation
-        settings_id = str(uuid.uuid4())
-        system_prompt = ""
-        
-        # Set appropriate system prompt based on source type
-        if conversation.source_type == "WHATSAPP":
-            system_prompt = "You are a friendly and laid back whatsapp assistant called Oats (Hebrew: אוטס)."
-        elif conversation.source_type == "PORTAL":
-            system_prompt = "You are Oats, a helpful AI assistant available through our web portal."
-        else:
-            system_prompt = "You are Oats, a helpful AI assistant."
-        
-        # Create new chat settings DB record with appropriate values
-        db_chat_settings = ChatSettings(
-            id=settings_id,
-            name=f"Settings for {conversation.name or 'Untitled Chat'} ({conversation.source_type.lower()})",
-            description=f"Auto-generated chat settings for {conversation.source_type.lower()} conversation",
-            system_prompt=system_prompt,
-            model="gpt-4o-mini",
-            enabled_tools=[]
-        )
-        
-        # Add to database
-        db.add(db_chat_settings)
-        chat_settings_id = settings_id
+        chat_settings_id = (await get_or_create_settings_template(db, conversation.source_type)).id
     
     # Create new conversation DB record
     db_conversation = Conversation(
@@ -223,6 +204,31 @@ async def update_conversation_chat_settings(
         chat_settings_id=conversation.chat_settings_id
     )
 
+@router.post("/conversations/{conversation_id}/chat_settings/copy", response_model=ChatSettingsResponse)
+async def copy_conversation_chat_settings(conversation_id: str, db: Session = Depends(get_db)):
+    """
+    Give a conversation its own copy of the shared settings template it uses, so its
+    prompt, model and tools can be changed without affecting other conversations.
+    Conversations that already have their own settings get them back unchanged.
+    
+    Args:
+        conversation_id: The conversation ID
+        db: Database session
+        
+    Returns:
+        The conversation's own chat settings
+    """
+    conversation = db.query(Conversation).filter(Conversation.chatid == conversation_id).first()
+    if not conversation:
+        logger.warning(f"Conversation with ID {conversation_id} not found for chat settings copy.")
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    chat_settings = fork_chat_settings(db, conversation)
+    db.commit()
+    db.refresh(chat_settings)
+    
+    return chat_settings
+
 @router.delete("/conversations/{conversation_id}", status_code=204)
 async def delete_conversation(conversation_id: str, db: Session = Depends(get_db)):
     # Get the conversation
@@ -283,8 +289,8 @@ async def add_portal_message(
     Returns:
         The response from the assistant
     """
-    # Get the conversation
-    conversation = db.query(Conversation).filter(Conversation.chatid == conversation_id).first()
+    # Load the conversation with its settings and tools for the turn
+    conversation = load_turn_context(db, conversation_id)
     if not conversation:
         logger.warning(f"Conversation with ID {conversation_id} not found.")
         raise HTTPException(status_code=404, detail="Conversation not found")
@@ -294,6 +300,9 @@ async def add_portal_message(
         logger.warning(f"Conversation {conversation_id} is not a portal conversation.")
         raise HTTPException(status_code=400, detail="This endpoint only supports portal conversations")
     
+    # The whole turn runs within the chat's time budget
+    deadline = Deadline(conversation.turn_timeout_seconds)
+    
     # Create a new user message
     message_id = str(uuid.uuid4())
     user_message = Message(
@@ -313,26 +322,31 @@ async def add_portal_message(
     
     logger.info(f"Added portal message with ID: {message_id} to conversation: {conversation_id}")
     
-    # Get response from OpenAI
-    response_text = await openai_helper.get_openai_response(conversation, user_message, db)
-    
-    # Create assistant message
-    assistant_message_id = str(uuid.uuid4())
-    assistant_message = Message(
-        id=assistant_message_id,
-        chatid=conversation_id,
-        sender=None,
-        sender_name="Oats",
-        type=MessageType.TEXT,
-        content=response_text,
-        role="assistant"
-    )
-    
-    # Add to database
-    db.add(assistant_message)
-    db.commit()
+    # Jobs started by this turn deliver their outcome only after its reply is stored
+    async with tool_job_runner.turn():
+        # Get response from OpenAI
+        response_text = await openai_helper.get_openai_response(conversation, user_message, db, deadline=deadline)
+        
+        # Create assistant message
+        assistant_message_id = str(uuid.uuid4())
+        assistant_message = Message(
+            id=assistant_message_id,
+            chatid=conversation_id,
+            sender=None,
+            sender_name="Oats",
+            type=MessageType.TEXT,
+            content=response_text,
+            role="assistant"
+        )
+        
+        # Add to database
+        db.add(assistant_message)
+        db.commit()
+        
+        logger.info(f"Added assistant response with ID: {assistant_message_id} to conversation: {conversation_id}")
     
-    logger.info(f"Added assistant response with ID: {assistant_message_id} to conversation: {conversation_id}")
+    # Fold messages that left the history window into the summary, off the reply path
+    conversation_summarizer.schedule(conversation_id, conversation.history_token_budget)
     
     # Return response
     return PortalMessageResponse(
@@ -410,4 +424,15 @@ async def get_conversation_messages(
     result.reverse()
     
     logger.info(f"Fetched {len(result)} messages for conversation {conversation_id}")
-    return result
\ No newline at end of file
+    return result
+
+@router.get("/turn-metrics", response_model=Dict[str, Any])
+async def get_turn_metrics():
+    """
+    Get the turn deadline counters of this process.
+    
+    Returns:
+        Turns handled, turns that fell back to a partial answer (in total and per stage)
+        and tool calls cancelled at the deadline
+    """
+    return turn_metrics.stats()
@@ -0,0 +1,174 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from response_shaper import cap_text
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Time budget of a turn, per conversation source type, for chat settings without their own turn_timeout_seconds
+WHATSAPP_TURN_TIMEOUT_SECONDS = float(os.environ.get("WHATSAPP_TURN_TIMEOUT_SECONDS", "60"))
+PORTAL_TURN_TIMEOUT_SECONDS = float(os.environ.get("PORTAL_TURN_TIMEOUT_SECONDS", "120"))
+# Least time worth starting a model call with; with less left the turn falls back right away
+MIN_MODEL_CALL_SECONDS = float(os.environ.get("MIN_MODEL_CALL_SECONDS", "3"))
+# Longest tool result quoted in a partial answer, per tool
+PARTIAL_ANSWER_RESULT_MAX_CHARS = int(os.environ.get("PARTIAL_ANSWER_RESULT_MAX_CHARS", "1000"))
+
+DEFAULT_TURN_TIMEOUTS = {
+    "WHATSAPP": WHATSAPP_TURN_TIMEOUT_SECONDS,
+    "PORTAL": PORTAL_TURN_TIMEOUT_SECONDS,
+}
+
+# Turn stages, for fallbacks and metrics
+HISTORY = "history"
+MODEL = "model"
+TOOLS = "tools"
+FOLLOW_UP = "follow_up"
+
+# Tool result of a call cancelled (or never started) at the deadline
+TOOL_CANCELLED_RESULT = "Error: the tool was cancelled because the reply ran out of time."
+
+FALLBACK_MESSAGES = {
+    HISTORY: "Sorry, I couldn't get to your message in time. Please try again.",
+    MODEL: "Sorry, I couldn't come up with an answer in time. Please try again in a moment.",
+    TOOLS: "Sorry, I ran out of time while working on this.",
+    FOLLOW_UP: "Sorry, I ran out of time while putting the answer together.",
+}
+
+
+def default_turn_timeout(source_type: Optional[str]) -> float:
+    """Get the turn time budget of a conversation source type."""
+    return DEFAULT_TURN_TIMEOUTS.get(str(getattr(source_type, "value", source_type)), WHATSAPP_TURN_TIMEOUT_SECONDS)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a turn runs out of time; stage names where."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Turn deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """
+    The time budget of one turn, passed down to every stage.
+
+    Stages ask for the time they may still take (timeout()) instead of using their own
+    fixed timeouts, and check() before starting work that cannot be bounded.
+    """
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Start the budget.
+
+        Args:
+            seconds: Seconds from now the turn must be done in
+            clock: Monotonic clock, in seconds
+        """
+        self.seconds = seconds
+        self._clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left (negative once expired)."""
+        return self.expires_at - self._clock()
+
+    @property
+    def expired(self) -> bool:
+        """Whether the budget is used up."""
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """
+        Get the timeout for the next operation.
+
+        Args:
+            cap: The operation's own timeout, if lower than what is left
+
+        Returns:
+            Seconds, at least a millisecond so a timeout of 0 never means "no timeout"
+        """
+        remaining = self.remaining()
+        if cap is not None:
+            remaining = min(remaining, cap)
+        return max(remaining, 0.001)
+
+    def check(self, stage: str) -> None:
+        """
+        Fail if the budget is used up.
+
+        Args:
+            stage: The stage about to run
+
+        Raises:
+            DeadlineExceeded: If no time is left
+        """
+        if self.expired:
+            raise DeadlineExceeded(stage)
+
+
+def partial_answer(stage: str, completed_tools: Optional[List[Tuple[str, str]]] = None) -> str:
+    """
+    Build the degraded reply of a turn that ran out of time.
+
+    Args:
+        stage: Where the turn ran out of time
+        completed_tools: (tool name, result) of the tools that did finish; each result is
+            quoted up to PARTIAL_ANSWER_RESULT_MAX_CHARS
+
+    Returns:
+        The reply text
+    """
+    message = FALLBACK_MESSAGES.get(stage, FALLBACK_MESSAGES[MODEL])
+    if completed_tools:
+        message += " Here is what I got so far:"
+        for tool_name, result in completed_tools:
+            message += f"\n\n{tool_name}:\n{cap_text(result or '', PARTIAL_ANSWER_RESULT_MAX_CHARS)}"
+    return message
+
+
+class TurnMetrics:
+    """Counters of turns and the work cancelled by their deadlines."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"turns": 0, "deadline_exceeded": 0, "tool_calls_cancelled": 0}
+        self._by_stage: Dict[str, int] = {}
+
+    def record_turn(self) -> None:
+        """Count a turn."""
+        with self._lock:
+            self._counters["turns"] += 1
+
+    def record_deadline_exceeded(self, stage: str) -> None:
+        """Count a turn that fell back to a partial answer."""
+        with self._lock:
+            self._counters["deadline_exceeded"] += 1
+            self._by_stage[stage] = self._by_stage.get(stage, 0) + 1
+        logger.warning(f"[Deadline] Turn deadline exceeded during {stage}")
+
+    def record_tool_call_cancelled(self) -> None:
+        """Count a tool call cancelled (or never started) because the turn ran out of time."""
+        with self._lock:
+            self._counters["tool_calls_cancelled"] += 1
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Get the counters.
+
+        Returns:
+            Counters, deadline misses per stage and the share of turns that missed their deadline
+        """
+        with self._lock:
+            stats: Dict[str, object] = dict(self._counters)
+            stats["deadline_exceeded_by_stage"] = dict(self._by_stage)
+        turns = stats["turns"]
+        stats["deadline_exceeded_rate"] = round(stats["deadline_exceeded"] / turns, 4) if turns else 0.0
+        return stats
+
+
+# Shared counters of the turn handlers
+turn_metrics = TurnMetrics()
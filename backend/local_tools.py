@@ -0,0 +1,269 @@
+import os
+import json
+import asyncio
+import inspect
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; memory limits are then not enforced
+    resource = None
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Worker threads shared by all thread tools
+LOCAL_TOOL_THREAD_WORKERS = int(os.environ.get("LOCAL_TOOL_THREAD_WORKERS", "4"))
+# Worker processes shared by all process tools (started on first use)
+LOCAL_TOOL_PROCESS_WORKERS = int(os.environ.get("LOCAL_TOOL_PROCESS_WORKERS", "2"))
+# Seconds a local tool call may take, for tools registered without their own timeout
+LOCAL_TOOL_DEFAULT_TIMEOUT = float(os.environ.get("LOCAL_TOOL_DEFAULT_TIMEOUT", "10"))
+# Address space limit of a process tool call in MB, for tools registered without their own
+LOCAL_TOOL_DEFAULT_MEMORY_MB = int(os.environ.get("LOCAL_TOOL_DEFAULT_MEMORY_MB", "512"))
+
+# Where a local tool runs
+THREAD = "thread"  # Blocking function in the shared thread pool
+PROCESS = "process"  # CPU-heavy or untrusted function in the process pool, with a memory limit
+ASYNC = "async"  # Coroutine function on the event loop
+
+# Tool configuration key naming the local tool a function tool runs
+LOCAL_TOOL_CONFIG_KEY = "local_tool"
+
+
+class LocalToolError(Exception):
+    """Raised when a local tool cannot be run (unknown, timed out or failed)."""
+
+
+class LocalTool(NamedTuple):
+    name: str
+    func: Callable[..., Any]
+    description: str
+    parameters: Dict[str, Any]  # JSON Schema of the keyword arguments
+    executor: str
+    timeout_seconds: float
+    max_concurrency: int
+    memory_limit_mb: Optional[int]  # Process tools only
+
+
+def _call_with_memory_limit(func: Callable[..., Any], arguments: Dict[str, Any], memory_limit_mb: Optional[int]) -> Any:
+    # Runs in a pool process: cap the address space for this call only
+    if resource is None or not memory_limit_mb:
+        return func(**arguments)
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = memory_limit_mb * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    try:
+        return func(**arguments)
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+def format_result(result: Any) -> str:
+    """Turn a local tool's return value into the tool result text (strings as-is, anything else as JSON)."""
+    if isinstance(result, str):
+        return result
+    return json.dumps(result, ensure_ascii=False, default=str)
+
+
+class LocalToolRegistry:
+    """
+    Registry and runtime of local function tools: Python callables the model can call
+    without an HTTP hop.
+
+    Each tool runs in the shared thread pool, the shared process pool or directly on the
+    event loop (async tools), with a per-call timeout and a limit on concurrent calls.
+    Process tools also run under an address space limit (RLIMIT_AS).
+
+    A timed out async call is cancelled. Thread and process calls cannot be interrupted:
+    the caller gets the timeout error right away, while the call keeps its concurrency
+    slot until the worker has actually finished it. A process call still running past its
+    timeout is ended by replacing the process pool, which also fails the other process
+    calls running at that moment.
+    """
+
+    def __init__(self, thread_workers: int = LOCAL_TOOL_THREAD_WORKERS, process_workers: int = LOCAL_TOOL_PROCESS_WORKERS):
+        """
+        Initialize the registry.
+
+        Args:
+            thread_workers: Size of the thread pool
+            process_workers: Size of the process pool
+        """
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self._tools: Dict[str, LocalTool] = {}
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def register(
+        self,
+        name: str,
+        description: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        executor: str = THREAD,
+        timeout_seconds: Optional[float] = None,
+        max_concurrency: int = 4,
+        memory_limit_mb: Optional[int] = None
+    ) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        """
+        Decorator registering a function as a local tool.
+
+        Process tools must be module-level functions, so the pool can import them.
+
+        Args:
+            name: Name function tools refer to in their configuration ("local_tool")
+            description: What the tool does, for the tool listing
+            parameters: JSON Schema of the keyword arguments
+            executor: THREAD, PROCESS or ASYNC (coroutine functions are always ASYNC)
+            timeout_seconds: Per-call timeout (LOCAL_TOOL_DEFAULT_TIMEOUT if not given)
+            max_concurrency: Most calls of this tool running at once
+            memory_limit_mb: Address space limit of process tools (LOCAL_TOOL_DEFAULT_MEMORY_MB if not given)
+
+        Returns:
+            The decorator, which returns the function unchanged
+        """
+        def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+            tool_executor = ASYNC if inspect.iscoroutinefunction(func) else executor
+            if tool_executor not in (THREAD, PROCESS, ASYNC):
+                raise ValueError(f"Unknown executor for local tool {name}: {executor}")
+            self._tools[name] = LocalTool(
+                name=name,
+                func=func,
+                description=description,
+                parameters=parameters or {"type": "object", "properties": {}, "required": []},
+                executor=tool_executor,
+                timeout_seconds=timeout_seconds or LOCAL_TOOL_DEFAULT_TIMEOUT,
+                max_concurrency=max(max_concurrency, 1),
+                memory_limit_mb=(memory_limit_mb or LOCAL_TOOL_DEFAULT_MEMORY_MB) if tool_executor == PROCESS else None
+            )
+            return func
+        return decorator
+
+    def get(self, name: str) -> Optional[LocalTool]:
+        """Get a registered tool by name."""
+        return self._tools.get(name)
+
+    def list_tools(self) -> List[LocalTool]:
+        """Get all registered tools, sorted by name."""
+        return [self._tools[name] for name in sorted(self._tools)]
+
+    def _executor_for(self, tool: LocalTool) -> Executor:
+        with self._lock:
+            if tool.executor == PROCESS:
+                if self._process_pool is None:
+                    # spawn: workers never inherit the server's threads, sockets or event loop
+                    self._process_pool = ProcessPoolExecutor(
+                        max_workers=self.process_workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+                return self._process_pool
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="local-tool")
+            return self._thread_pool
+
+    def _semaphore_for(self, tool: LocalTool) -> asyncio.Semaphore:
+        # Created on first use, inside the event loop that runs the calls
+        semaphore = self._semaphores.get(tool.name)
+        if semaphore is None:
+            semaphore = self._semaphores[tool.name] = asyncio.Semaphore(tool.max_concurrency)
+        return semaphore
+
+    async def run(self, name: str, arguments: Dict[str, Any]) -> str:
+        """
+        Run a local tool.
+
+        Args:
+            name: The registered tool name
+            arguments: Keyword arguments from the model
+
+        Returns:
+            The tool result text
+
+        Raises:
+            LocalToolError: If the tool is unknown, times out or raises
+        """
+        tool = self._tools.get(name)
+        if tool is None:
+            raise LocalToolError(f"Unknown local tool: {name}")
+
+        semaphore = self._semaphore_for(tool)
+        await semaphore.acquire()
+        work: Optional[Future] = None
+        try:
+            if tool.executor == ASYNC:
+                call = tool.func(**arguments)
+            else:
+                if tool.executor == PROCESS:
+                    work = self._executor_for(tool).submit(
+                        _call_with_memory_limit, tool.func, arguments, tool.memory_limit_mb
+                    )
+                else:
+                    work = self._executor_for(tool).submit(lambda: tool.func(**arguments))
+                # The slot is given back when the worker is done, not when the caller stops waiting
+                work.add_done_callback(self._release_from_worker(semaphore))
+                call = asyncio.wrap_future(work)
+            result = await asyncio.wait_for(call, timeout=tool.timeout_seconds)
+            return format_result(result)
+        except asyncio.TimeoutError:
+            if tool.executor == PROCESS and work is not None and not work.done():
+                self._recycle_process_pool(name)
+            raise LocalToolError(f"Local tool {name} timed out after {tool.timeout_seconds:g} seconds")
+        except MemoryError:
+            raise LocalToolError(f"Local tool {name} exceeded its memory limit of {tool.memory_limit_mb} MB")
+        except TypeError as e:
+            # Usually unexpected or missing arguments
+            raise LocalToolError(f"Invalid arguments for local tool {name}: {e}")
+        except LocalToolError:
+            raise
+        except Exception as e:
+            raise LocalToolError(f"Local tool {name} failed: {type(e).__name__}: {e}")
+        finally:
+            if work is None:
+                semaphore.release()
+
+    def _release_from_worker(self, semaphore: asyncio.Semaphore) -> Callable[[Future], None]:
+        loop = asyncio.get_running_loop()
+
+        def release(_: Future) -> None:
+            # Called in the worker thread (or the pool's management thread)
+            try:
+                loop.call_soon_threadsafe(semaphore.release)
+            except RuntimeError:
+                # The event loop is closed, nothing waits on the slot anymore
+                pass
+        return release
+
+    def _recycle_process_pool(self, name: str) -> None:
+        # A pool process cannot be interrupted: stop the pool and kill its processes, which
+        # fails the calls they were running; the next process call starts a new pool
+        with self._lock:
+            pool, self._process_pool = self._process_pool, None
+        if pool is None:
+            return
+        logger.warning(f"Local tool {name} is still running past its timeout, replacing the process pool")
+        processes = list((getattr(pool, "_processes", None) or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def shutdown(self) -> None:
+        """Stop the worker pools (running calls are not waited for)."""
+        with self._lock:
+            if self._thread_pool is not None:
+                self._thread_pool.shutdown(wait=False)
+                self._thread_pool = None
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=False)
+                self._process_pool = None
+
+
+# Shared registry; tools register at import (see builtin_local_tools.py)
+local_tools = LocalToolRegistry()
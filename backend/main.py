@@ -9,6 +9,12 @@ from conversations_router import router as conversations_router
 from chat_settings_router import router as chat_settings_router
 from tools_router import router as tools_router
 from portal_users_router import router as portal_users_router
+from tool_jobs_router import router as tool_jobs_router
+from db import SessionLocal
+from well_known_tools import ensure_well_known_tools
+from local_tools import local_tools
+from tool_jobs import tool_job_runner
+import builtin_local_tools  # Registers the built-in local tools
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO)
@@ -23,6 +29,7 @@ app.include_router(conversations_router, prefix="/api")
 app.include_router(chat_settings_router, prefix="/api")
 app.include_router(tools_router, prefix="/api")
 app.include_router(portal_users_router, prefix="/api")
+app.include_router(tool_jobs_router, prefix="/api")
 
 @app.get("/")
 async def root():
@@ -58,12 +65,31 @@ async def startup_db_client():
         raise ValueError(f"Application startup failed: {str(e)}")
     
     # Database connection setup happens in the db.py module
+    
+    # Create the built-in tools if needed and keep their IDs in memory
+    db = SessionLocal()
+    try:
+        ensure_well_known_tools(db)
+    except Exception as e:
+        # Resolved lazily on first use instead
+        logger.error(f"Failed to resolve well-known tools at startup: {str(e)}")
+    finally:
+        db.close()
+    
+    # Pick up background tool jobs interrupted by a restart
+    try:
+        tool_job_runner.resume_pending()
+    except Exception as e:
+        logger.error(f"Failed to resume background tool jobs: {str(e)}")
 
 # Shutdown event to close database connection
 @app.on_event("shutdown")
 async def shutdown_db_client():
     logger.info("Shutting down the FastAPI application")
     # Any cleanup needed for database connections
+    
+    # Stop the local tool worker pools
+    local_tools.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,419 @@
+import os
+import re
+import time
+import uuid
+import base64
+import hashlib
+import logging
+import binascii
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Directory holding the stored media files
+MEDIA_STORE_DIR = os.environ.get("MEDIA_STORE_DIR", "/tmp/chatwithoats-media")
+# Base64 strings at least this long in tool responses are moved to the media store
+MEDIA_OFFLOAD_MIN_CHARS = int(os.environ.get("MEDIA_OFFLOAD_MIN_CHARS", "4096"))
+# Total size of the store; least recently used files are evicted beyond it
+MEDIA_STORE_MAX_BYTES = int(os.environ.get("MEDIA_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Files not used for this long are evicted (0 keeps files until the size quota needs the space)
+MEDIA_STORE_MAX_AGE_SECONDS = int(os.environ.get("MEDIA_STORE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+# Largest single file the store accepts
+MEDIA_STORE_MAX_FILE_BYTES = int(os.environ.get("MEDIA_STORE_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+
+# Chunk size for streaming downloads into the store
+STREAM_CHUNK_BYTES = 64 * 1024
+# How often writes trigger an age-based sweep, in seconds
+SWEEP_INTERVAL_SECONDS = 3600
+# Directory (under the root) for files being written
+TEMP_DIR_NAME = "tmp"
+
+# media://<sha256><extension>
+MEDIA_REF_PATTERN = re.compile(r"media://([0-9a-f]{64})(\.[a-z0-9]{1,8})?")
+
+DATA_URI_PATTERN = re.compile(r"^data:([\w.+-]+/[\w.+-]+)?(?:;[\w=.+-]+)*;base64,", re.IGNORECASE)
+BASE64_PATTERN = re.compile(r"^[A-Za-z0-9+/_-]+={0,2}$")
+
+MIME_TYPE_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "audio/mpeg": ".mp3",
+    "audio/mp3": ".mp3",
+    "audio/ogg": ".ogg",
+    "audio/opus": ".opus",
+    "audio/wav": ".wav",
+    "audio/wave": ".wav",
+    "audio/aac": ".aac",
+    "audio/flac": ".flac",
+    "application/pdf": ".pdf",
+    "application/octet-stream": ".bin",
+}
+
+
+def sniff_mime_type(head: bytes) -> str:
+    """
+    Guess a MIME type from the first bytes of a file.
+
+    Args:
+        head: At least the first 12 bytes
+
+    Returns:
+        The MIME type, application/octet-stream if unknown
+    """
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"RIFF") and head[8:12] == b"WAVE":
+        return "audio/wav"
+    if head.startswith(b"ID3") or head[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return "audio/mpeg"
+    if head.startswith(b"OggS"):
+        return "audio/ogg"
+    if head.startswith(b"fLaC"):
+        return "audio/flac"
+    if head.startswith(b"%PDF"):
+        return "application/pdf"
+    return "application/octet-stream"
+
+
+def extension_for(mime_type: Optional[str]) -> str:
+    """Get the file extension stored media of a MIME type gets."""
+    return MIME_TYPE_EXTENSIONS.get((mime_type or "").split(";")[0].strip().lower(), ".bin")
+
+
+def media_ref(digest: str, extension: str) -> str:
+    """Build the reference of a stored file."""
+    return f"media://{digest}{extension}"
+
+
+def find_media_refs(text: Optional[str]) -> List[str]:
+    """
+    Find the media references in a text, in order and without duplicates.
+
+    Args:
+        text: Any text, e.g. a stored tool result
+
+    Returns:
+        List of media:// references
+    """
+    refs: List[str] = []
+    for match in MEDIA_REF_PATTERN.finditer(text or ""):
+        if match.group(0) not in refs:
+            refs.append(match.group(0))
+    return refs
+
+
+class MediaTooLargeError(ValueError):
+    """Raised when a file exceeds the store's per-file size limit."""
+
+
+class MediaStore:
+    """
+    Content-addressed store for binary tool output (images, audio, documents).
+
+    Files are stored once per content hash under <root>/<first two hex digits>/<hash><ext>
+    and referenced as media://<hash><ext>, a short string that can live in messages and
+    prompts and be resolved back to a path for sending.
+
+    Every store or resolve of a file refreshes its modification time, which makes the
+    mtime the last use. Files unused for max_age_seconds are evicted, and when the store
+    grows beyond max_bytes the least recently used files go first.
+    """
+
+    def __init__(
+        self,
+        root: str = MEDIA_STORE_DIR,
+        max_bytes: int = MEDIA_STORE_MAX_BYTES,
+        max_age_seconds: int = MEDIA_STORE_MAX_AGE_SECONDS,
+        max_file_bytes: int = MEDIA_STORE_MAX_FILE_BYTES
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            root: Directory holding the stored files
+            max_bytes: Total size quota of the store
+            max_age_seconds: Evict files unused for this long (0 disables age-based eviction)
+            max_file_bytes: Largest single file accepted
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.max_file_bytes = max_file_bytes
+        # Size of the stored files, computed on first use and kept up to date by writes
+        self._total_bytes: Optional[int] = None
+        self._last_sweep = time.time()
+        self._lock = threading.Lock()
+
+    def path_for(self, digest: str, extension: str) -> str:
+        """Get the path a file with this hash and extension is stored at."""
+        return os.path.join(self.root, digest[:2], f"{digest}{extension}")
+
+    def _temp_path(self) -> str:
+        directory = os.path.join(self.root, TEMP_DIR_NAME)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{uuid.uuid4().hex}.tmp")
+
+    def _commit(self, temp_path: str, digest: str, extension: str, size: int) -> str:
+        # Move a fully written temporary file to its content address, unless it is already stored
+        path = self.path_for(digest, extension)
+        ref = media_ref(digest, extension)
+        if os.path.exists(path):
+            os.remove(temp_path)
+            os.utime(path)
+            logger.info(f"[Media Store] {ref} is already stored")
+            return ref
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Readers never see a partial file: it only appears under its final name when complete
+        os.replace(temp_path, path)
+        logger.info(f"[Media Store] Stored {size} bytes as {ref}")
+        self._record_write(size)
+        return ref
+
+    def put_bytes(self, data: bytes, mime_type: Optional[str] = None) -> str:
+        """
+        Store a blob, unless the same content is already stored.
+
+        Args:
+            data: The file content
+            mime_type: The content's MIME type; sniffed from the content if not given
+
+        Returns:
+            The media:// reference of the stored file
+
+        Raises:
+            MediaTooLargeError: If the blob exceeds max_file_bytes
+        """
+        if len(data) > self.max_file_bytes:
+            raise MediaTooLargeError(f"Media of {len(data)} bytes exceeds the limit of {self.max_file_bytes} bytes")
+
+        extension = extension_for(mime_type or sniff_mime_type(data[:16]))
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest, extension)
+        if os.path.exists(path):
+            os.utime(path)
+            return media_ref(digest, extension)
+
+        temp_path = self._temp_path()
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        return self._commit(temp_path, digest, extension, len(data))
+
+    async def put_stream(self, chunks: AsyncIterator[bytes], mime_type: Optional[str] = None, max_bytes: Optional[int] = None) -> str:
+        """
+        Store a streamed file, hashing it while it is written to disk.
+
+        Only one chunk is held in memory at a time, so large downloads (e.g. generated
+        audio) never need to be buffered whole.
+
+        Args:
+            chunks: The file content, e.g. httpx.Response.aiter_bytes()
+            mime_type: The content's MIME type; sniffed from the first bytes if not given
+            max_bytes: Optional limit for this file, below the store's max_file_bytes
+
+        Returns:
+            The media:// reference of the stored file
+
+        Raises:
+            MediaTooLargeError: If the stream exceeds the limit (nothing is stored)
+        """
+        limit = min(self.max_file_bytes, max_bytes) if max_bytes else self.max_file_bytes
+        digest = hashlib.sha256()
+        head = b""
+        size = 0
+        temp_path = self._temp_path()
+        try:
+            with open(temp_path, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > limit:
+                        raise MediaTooLargeError(f"Media stream exceeds the limit of {limit} bytes")
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        extension = extension_for(mime_type or sniff_mime_type(head))
+        return self._commit(temp_path, digest.hexdigest(), extension, size)
+
+    def resolve(self, ref: str) -> Optional[str]:
+        """
+        Get the path of a stored file, marking it as recently used.
+
+        Args:
+            ref: A media:// reference
+
+        Returns:
+            The file path, or None if the reference is invalid or the file is gone
+        """
+        match = MEDIA_REF_PATTERN.fullmatch(ref.strip())
+        if not match:
+            return None
+        path = self.path_for(match.group(1), match.group(2) or "")
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        # (last use, size, path) of every stored file and leftover temporary file
+        files = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _record_write(self, size: int) -> None:
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(file_size for _, file_size, _ in self._scan())
+            else:
+                self._total_bytes += size
+            due = time.time() - self._last_sweep >= SWEEP_INTERVAL_SECONDS
+            if self._total_bytes > self.max_bytes or due:
+                self._evict()
+
+    def evict(self) -> int:
+        """
+        Remove expired files, then least recently used ones until the store fits its quota.
+
+        Returns:
+            Number of files removed
+        """
+        with self._lock:
+            return self._evict()
+
+    def _evict(self) -> int:
+        now = time.time()
+        self._last_sweep = now
+        temp_dir = os.path.join(self.root, TEMP_DIR_NAME)
+        files = sorted(self._scan())
+        total = sum(size for _, size, _ in files)
+        removed = 0
+
+        for last_used, size, path in files:
+            in_progress = os.path.dirname(path) == temp_dir
+            expired = self.max_age_seconds > 0 and now - last_used > self.max_age_seconds
+            # Files being written are only cleaned up once they are clearly abandoned
+            if not expired and (in_progress or total <= self.max_bytes):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        self._total_bytes = total
+        if removed:
+            logger.info(f"[Media Store] Evicted {removed} files, {total} bytes stored")
+        return removed
+
+    def usage(self) -> Dict[str, int]:
+        """
+        Get the size of the store.
+
+        Returns:
+            Number of stored files and their total size in bytes
+        """
+        files = self._scan()
+        return {"files": len(files), "bytes": sum(size for _, size, _ in files), "max_bytes": self.max_bytes}
+
+
+def _decode_base64(value: str) -> Optional[Tuple[bytes, Optional[str]]]:
+    # Returns (content, MIME type from a data URI) if the string is a base64 blob
+    mime_type = None
+    payload = value
+    data_uri = DATA_URI_PATTERN.match(value)
+    if data_uri:
+        mime_type = data_uri.group(1)
+        payload = value[data_uri.end():]
+    payload = payload.strip()
+    if not BASE64_PATTERN.match(payload):
+        return None
+    try:
+        if "-" in payload or "_" in payload:
+            content = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        else:
+            content = base64.b64decode(payload + "=" * (-len(payload) % 4), validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return content, mime_type
+
+
+def _iter_strings(value: Any, path: Tuple[Any, ...] = ()) -> Iterator[Tuple[Tuple[Any, ...], str]]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _iter_strings(item, path + (key,))
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            yield from _iter_strings(item, path + (index,))
+    elif isinstance(value, str):
+        yield path, value
+
+
+def offload_binary_fields(data: Any, store: "MediaStore", min_chars: int = MEDIA_OFFLOAD_MIN_CHARS) -> Any:
+    """
+    Move large base64 blobs (plain or data URIs) out of a decoded JSON response.
+
+    Every string of at least min_chars that decodes as base64 is written to the media store
+    and replaced by its media:// reference. Other values are left as they are.
+
+    Args:
+        data: The decoded JSON response
+        store: The media store to write to
+        min_chars: Shortest string considered a binary payload
+
+    Returns:
+        The response with blobs replaced (a new object if anything was replaced)
+    """
+    replacements: Dict[Tuple[Any, ...], str] = {}
+    for path, value in _iter_strings(data):
+        if len(value) < min_chars:
+            continue
+        decoded = _decode_base64(value)
+        if decoded is None:
+            continue
+        content, mime_type = decoded
+        try:
+            replacements[path] = store.put_bytes(content, mime_type)
+        except MediaTooLargeError as e:
+            logger.warning(f"[Media Store] Keeping a binary field in the response: {e}")
+
+    if not replacements:
+        return data
+    logger.info(f"[Media Store] Offloaded {len(replacements)} binary fields from a tool response")
+    return _replace(data, (), replacements)
+
+
+def _replace(value: Any, path: Tuple[Any, ...], replacements: Dict[Tuple[Any, ...], str]) -> Any:
+    if path in replacements:
+        return replacements[path]
+    if isinstance(value, dict):
+        return {key: _replace(item, path + (key,), replacements) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_replace(item, path + (index,), replacements) for index, item in enumerate(value)]
+    return value
+
+
+# Shared store used by the tool executor and the WhatsApp sender
+media_store = MediaStore()
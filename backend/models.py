@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, ForeignKey, DateTime, JSON, Integer, Float, Table
+from sqlalchemy import Column, String, Boolean, ForeignKey, DateTime, JSON, Integer, Float, Table, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from typing import List, Optional, Dict, Any, Union
@@ -7,6 +7,7 @@ from pydantic import BaseModel, Field
 from db import Base
 import datetime
 from sqlalchemy.dialects.postgresql import ARRAY
+from token_counter import message_token_count
 
 # Enum types (matching PostgreSQL enum types)
 class MessageType(str, Enum):
@@ -66,6 +67,8 @@ class Tool(Base):
     configuration = Column(JSON, nullable=False)  # Legacy column, kept for backwards compatibility
     function_schema = Column(JSON, nullable=True)  # New column: Directly stores OpenAI function schema
     skip_params = Column(ARRAY(String), nullable=True)
+    builtin_key = Column(String, nullable=True, unique=True)  # Set for the built-in tools (see well_known_tools.py)
+    long_running = Column(Boolean, nullable=False, default=False, server_default="false")  # Calls run as background jobs (see tool_jobs.py)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), nullable=True)
     
@@ -82,6 +85,10 @@ class ChatSettings(Base):
     system_prompt = Column(String, nullable=False)
     model = Column(String, nullable=False, default="gpt-4o-mini")
     # enabled_tools removed - we now only use the relationship
+    is_template = Column(Boolean, nullable=False, default=False)  # Shared by many conversations
+    template_id = Column(String, ForeignKey("chat_settings.id"), nullable=True)  # Template this was copied from
+    history_token_budget = Column(Integer, nullable=True)  # Tokens of history per turn; NULL uses DEFAULT_HISTORY_TOKEN_BUDGET
+    turn_timeout_seconds = Column(Integer, nullable=True)  # Time budget of a turn; NULL uses the source type default (see deadline.py)
     
     # Relationships
     conversations = relationship("Conversation", back_populates="chat_settings")
@@ -95,15 +102,29 @@ class ApiRequest(Base):
     path = Column(String, nullable=False)
     method = Column(String, nullable=False)  # HTTP method (GET, POST, etc.)
     description = Column(String, nullable=True)
-    request_body_schema = Column(JSON, nullable=True)
+    request_body_schema = Column(JSON, nullable=True)  # Legacy: fully resolved inline copy (pre component storage)
+    request_body_schema_hash = Column(String, ForeignKey("component_schemas.hash"), nullable=True)
+    schema_refs = Column(JSON, nullable=True)  # Every $ref reachable from the body -> component hash
     response_schema = Column(JSON, nullable=True)
+    parameters = Column(JSON, nullable=True)  # Path/query/header parameters: [{name, in, required, schema, description}]
     skip_parameters = Column(JSON, nullable=True)
     constant_parameters = Column(JSON, nullable=True)
+    cache_ttl_seconds = Column(Integer, nullable=True)  # Tool result cache TTL; NULL = default for GET/HEAD, 0 = never cache
+    max_response_bytes = Column(Integer, nullable=True)  # Response body read limit; NULL = TOOL_RESPONSE_MAX_BYTES
+    updated_at = Column(DateTime(timezone=True), nullable=True)  # Set on every edit; part of the request plan signature
     
     # Relationships
     api = relationship("Api", back_populates="requests")
     tools = relationship("Tool", back_populates="api_request")
 
+class ComponentSchema(Base):
+    __tablename__ = "component_schemas"
+    
+    hash = Column(String, primary_key=True)  # sha256 of the canonical JSON definition
+    name = Column(String, nullable=True)  # Component name in the spec it was first imported from
+    definition = Column(JSON, nullable=False)  # Unresolved schema, $refs included
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
 class Api(Base):
     __tablename__ = "apis"
     
@@ -139,6 +160,39 @@ class Conversation(Base):
     messages = relationship("Message", back_populates="conversation")
     chat_settings = relationship("ChatSettings", back_populates="conversations")
     portal_user = relationship("PortalUser", back_populates="conversations")
+    summary = relationship("ConversationSummary", uselist=False, back_populates="conversation")
+
+class ConversationSummary(Base):
+    __tablename__ = "conversation_summaries"
+    
+    chatid = Column(String, ForeignKey("conversations.chatid"), primary_key=True)
+    summary = Column(String, nullable=False)
+    summarized_until = Column(DateTime(timezone=True), nullable=False)  # created_at of the newest folded message
+    last_message_id = Column(String, nullable=False)  # ID of the newest folded message
+    message_count = Column(Integer, nullable=False, default=0)  # Messages folded so far
+    token_count = Column(Integer, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    # Relationships
+    conversation = relationship("Conversation", back_populates="summary")
+
+class ToolJob(Base):
+    __tablename__ = "tool_jobs"
+    
+    id = Column(String, primary_key=True)
+    chatid = Column(String, ForeignKey("conversations.chatid"), nullable=False)
+    tool_id = Column(String, ForeignKey("tools.id"), nullable=True)
+    tool_call_id = Column(String, nullable=True)  # call_... ID of the tool call
+    tool_definition_name = Column(String, nullable=True)
+    openai_function_name = Column(String, nullable=False)
+    arguments = Column(JSON, nullable=True)
+    status = Column(String, nullable=False, default="pending")  # pending, running, succeeded, failed
+    result = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    delivered_at = Column(DateTime(timezone=True), nullable=True)  # When the follow-up reply was sent
 
 class ConversationParticipant(Base):
     __tablename__ = "conversation_participants"
@@ -172,12 +226,19 @@ class Message(Base):
     openai_function_name = Column(String, nullable=True) # Name used by/returned from OpenAI
     function_arguments = Column(String, nullable=True)
     function_result = Column(String, nullable=True)
+    token_count = Column(Integer, nullable=True)  # Tokens as part of the history, counted once at insert
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=True)
     
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
     quoted_message = relationship("Message", remote_side=[id], backref="quotes")
 
+@event.listens_for(Message, "before_insert")
+def _count_message_tokens(mapper, connection, message):
+    # Counted once here, so building the history window never re-tokenizes
+    if message.token_count is None:
+        message.token_count = message_token_count(message)
+
 # Pydantic models for API requests/responses
 class ConversationParticipantModel(BaseModel):
     number: str
@@ -218,18 +279,24 @@ class ChatSettingsBase(BaseModel):
     description: Optional[str] = None
     system_prompt: str
     model: str = "gpt-4o-mini"
+    history_token_budget: Optional[int] = None
+    turn_timeout_seconds: Optional[int] = None
 
 class ChatSettingsCreate(ChatSettingsBase):
-    pass
+    is_template: bool = False
 
 class ChatSettingsUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
     system_prompt: Optional[str] = None
     model: Optional[str] = None
+    history_token_budget: Optional[int] = None
+    turn_timeout_seconds: Optional[int] = None
 
 class ChatSettingsResponse(ChatSettingsBase):
     id: str
+    is_template: bool = False
+    template_id: Optional[str] = None
     
     class Config:
         orm_mode = True
@@ -265,6 +332,7 @@ class ToolBase(BaseModel):
     api_request_id: Optional[str] = None
     function_schema: Optional[Dict[str, Any]] = None
     skip_params: Optional[List[str]] = None
+    long_running: bool = False  # Calls run as background jobs, the result is delivered later
 
 class ToolCreate(ToolBase):
     pass
@@ -276,6 +344,8 @@ class ToolUpdate(BaseModel):
     api_request_id: Optional[str] = None
     function_schema: Optional[Dict[str, Any]] = None
     skip_params: Optional[List[str]] = None
+    configuration: Optional[Dict[str, Any]] = None  # Merged into the current configuration
+    long_running: Optional[bool] = None
 
 class ToolResponse(ToolBase):
     id: str
@@ -285,6 +355,25 @@ class ToolResponse(ToolBase):
     class Config:
         orm_mode = True
 
+# Tool job models
+class ToolJobResponse(BaseModel):
+    id: str
+    chatid: str
+    tool_id: Optional[str] = None
+    tool_definition_name: Optional[str] = None
+    openai_function_name: str
+    arguments: Optional[Dict[str, Any]] = None
+    status: str
+    result: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime.datetime
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+    delivered_at: Optional[datetime.datetime] = None
+    
+    class Config:
+        orm_mode = True
+
 # Portal user Pydantic models
 class PortalUserCreate(BaseModel):
     id: str  # User ID from the portal system
@@ -309,6 +398,11 @@ class ApiRequestBase(BaseModel):
     description: Optional[str] = None
     request_body_schema: Optional[Dict[str, Any]] = None
     response_schema: Optional[Dict[str, Any]] = None
+    parameters: Optional[List[Dict[str, Any]]] = None
+    skip_parameters: Optional[List[str]] = None
+    constant_parameters: Optional[Dict[str, Any]] = None
+    cache_ttl_seconds: Optional[int] = None
+    max_response_bytes: Optional[int] = None
 
 class ApiRequestCreate(ApiRequestBase):
     pass
@@ -319,9 +413,15 @@ class ApiRequestUpdate(BaseModel):
     description: Optional[str] = None
     request_body_schema: Optional[Dict[str, Any]] = None
     response_schema: Optional[Dict[str, Any]] = None
+    parameters: Optional[List[Dict[str, Any]]] = None
+    skip_parameters: Optional[List[str]] = None
+    constant_parameters: Optional[Dict[str, Any]] = None
+    cache_ttl_seconds: Optional[int] = None
+    max_response_bytes: Optional[int] = None
 
 class ApiRequestResponse(ApiRequestBase):
     id: str
+    updated_at: Optional[datetime.datetime] = None
     
     class Config:
         orm_mode = True
@@ -1,19 +1,39 @@
 import os
 import logging
 import json
+import asyncio
 import httpx
 import uuid
-from typing import List, Dict, Any, Optional, Union
-from openai import OpenAI
+from typing import List, Dict, Any, Optional, Tuple, Union
+from collections import OrderedDict
+from openai import OpenAI, APITimeoutError
 from sqlalchemy.orm import Session
 from urllib.parse import urlparse
 import re
 
 from models import Message, Conversation, ChatSettings, Tool, ToolType, MessageType
+from media_store import media_store, offload_binary_fields, MediaTooLargeError, STREAM_CHUNK_BYTES
+from response_shaper import shape_json, cap_text, TOOL_RESPONSE_MAX_CHARS
+from response_reader import read_capped, peek, is_binary_body, is_text_mime_type, max_response_bytes_for, TOOL_ERROR_BODY_MAX_BYTES
+from tool_result_cache import tool_result_cache, tool_result_key, cache_ttl_for
+from request_plans import request_plan_cache, tool_signature, apply_request_plan, build_parameters_schema, RequestPlanError
+from tool_validators import ArgumentValidator, validation_error_result
+from local_tools import local_tools, LocalToolError, LOCAL_TOOL_CONFIG_KEY
+from tool_jobs import tool_job_runner, job_handle_result
+from deadline import Deadline, DeadlineExceeded, partial_answer, turn_metrics, TOOL_CANCELLED_RESULT, MIN_MODEL_CALL_SECONDS, HISTORY, MODEL, TOOLS, FOLLOW_UP
+from openai_limiter import OpenAIRateLimiter, RateLimitQueueTimeout, parse_api_keys, OPENAI_API_KEYS, PRIORITY_FOLLOW_UP, PRIORITY_TURN
+from resilience import call_with_retries, hedged, status_outcome, CircuitOpenError, OPENAI_UPSTREAM, OPENAI_POLICY, IDEMPOTENT_POLICY, UNSAFE_POLICY, IDEMPOTENT_METHODS, TOOL_HEDGE_DELAY_SECONDS
+from turn_context import TurnContext, ChatSettingsSnapshot, load_turn_context, load_message_history, HISTORY_MAX_MESSAGES
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# Number of chat settings whose formatted tools payload is kept in memory
+TOOLS_PAYLOAD_CACHE_SIZE = int(os.getenv("TOOLS_PAYLOAD_CACHE_SIZE", "256"))
+
+# Reply of a turn while OpenAI's circuit is open
+OPENAI_UNAVAILABLE_MESSAGE = "Sorry, the AI service is temporarily unavailable. Please try again in a minute."
+
 
 class OpenAIHelper:
     """
@@ -41,30 +61,68 @@ class OpenAIHelper:
         self.masked_key = self.api_key[:6] + "..." if self.api_key else "NOT SET"
         logger.info(f"[OpenAI Helper] Initializing OpenAI client with key: {self.masked_key}")
         
+        # One client per API key of the pool (OPENAI_API_KEYS, or just this key); model calls
+        # are spread across them by the rate limiter
+        clients = []
+        for key, project in parse_api_keys(OPENAI_API_KEYS, self.api_key):
+            label = key[:6] + "..." + (f" ({project})" if project else "")
+            clients.append((OpenAI(api_key=key, project=project), label))
+        self.rate_limiter = OpenAIRateLimiter(clients)
+        if len(clients) > 1:
+            logger.info(f"[OpenAI Helper] Spreading model calls across {len(clients)} API keys")
+        
         # Initialize the OpenAI client
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = clients[0][0]
+        
+        # Formatted tools per chat settings ID: (tools signature, payload, [(tool name, tool ID)], {tool name: validator})
+        self._tools_payload_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tool_name_to_id_map: Dict[str, str] = {}
+        # Argument validators of the function tools in the cached payloads, by tool name
+        self._tool_validators: Dict[str, ArgumentValidator] = {}
 
     async def get_openai_response(
         self,
-        conversation: Conversation, 
+        conversation: Union[Conversation, TurnContext], 
         user_message: Message, 
         db: Session,
-        message_history_limit: int = 20
+        message_history_limit: int = HISTORY_MAX_MESSAGES,
+        deadline: Optional[Deadline] = None,
+        priority: int = PRIORITY_TURN
     ) -> str:
         """
         Get a response from the OpenAI Responses API.
         
+        The conversation, its settings and tools are loaded once into an immutable
+        TurnContext (see turn_context.py); nothing below walks ORM relationships.
+        
+        The whole turn runs within one deadline: model and tool calls get the time that is
+        left as their timeout, and a turn that runs out of time returns a partial answer.
+        
         Args:
-            conversation: The conversation object
+            conversation: The conversation object, or an already loaded turn context
             user_message: The user message to respond to
             db: Database session
-            message_history_limit: Maximum number of previous messages to include (default: 20)
+            message_history_limit: Maximum number of previous messages to include; the window is
+                otherwise cut by the chat settings' history token budget
+            deadline: The turn's deadline; started from the chat settings' turn timeout if not given
+            priority: Queue priority of the model calls when OpenAI capacity is short (see openai_limiter.py)
             
         Returns:
             The text response from OpenAI
         """
         logger.info(f"[OpenAI Helper] ENTERING get_openai_response for conversation {conversation.chatid}, user message: {user_message.id}")
+        completed_tools: List[Tuple[str, str]] = []
         try:
+            # Load the conversation, settings, tools, API requests and APIs in one go
+            if not isinstance(conversation, TurnContext):
+                conversation = load_turn_context(db, conversation.chatid)
+                if conversation is None:
+                    return "I'm sorry, I couldn't find this conversation."
+            
+            if deadline is None:
+                deadline = Deadline(conversation.turn_timeout_seconds)
+            turn_metrics.record_turn()
+            
             # Get chat settings for the conversation
             chat_settings = conversation.chat_settings
             if not chat_settings:
@@ -73,6 +131,7 @@ class OpenAIHelper:
 
             # Format conversation for OpenAI
             formatted_messages = self._format_conversation(conversation, user_message, db, message_history_limit)
+            deadline.check(HISTORY)
             
             # Get enabled tools for this chat
             tools = self._get_tools_for_chat(conversation.chatid, chat_settings)
@@ -96,13 +155,21 @@ class OpenAIHelper:
             
             logger.info(f"[OpenAI Helper] PREPARING TO CALL OpenAI Responses API with model: {chat_settings.model}")
             response = None # Initialize response to None
+            deadline.check(MODEL)
             try:
-                response = self.client.responses.create(
+                response = await self._create_response(
+                    deadline,
+                    priority,
                     model=chat_settings.model,
                     input=formatted_messages,
                     tools=tools if tools else None,
                     tool_choice=actual_tool_choice
                 )
+            except (APITimeoutError, RateLimitQueueTimeout):
+                raise DeadlineExceeded(MODEL)
+            except CircuitOpenError as e_circuit:
+                logger.warning(f"[OpenAI Helper] {e_circuit}")
+                return OPENAI_UNAVAILABLE_MESSAGE
             except httpx.HTTPStatusError as e_http:
                 logger.error(f"[OpenAI Helper] HTTPStatusError during OpenAI API call: {e_http}")
                 logger.error(f"[OpenAI Helper] HTTPStatusError response: {e_http.response.text if e_http.response else 'No response body'}")
@@ -195,7 +262,16 @@ class OpenAIHelper:
                 logger.info(f"Response contains {len(tool_calls)} tool calls")
                 
                 # Process tool calls and get tool messages
-                tool_messages = await self.handle_tool_calls_with_array(tool_calls, conversation, db)
+                tool_messages = await self.handle_tool_calls_with_array(tool_calls, conversation, db, deadline)
+                
+                # Tools cancelled by the deadline leave nothing to build a full answer from
+                tool_results = [msg for msg in tool_messages if msg.type == MessageType.TOOL_RESULT]
+                completed_tools = [
+                    (msg.tool_definition_name or msg.openai_function_name, msg.function_result)
+                    for msg in tool_results if msg.function_result != TOOL_CANCELLED_RESULT
+                ]
+                if len(completed_tools) < len(tool_results):
+                    raise DeadlineExceeded(TOOLS)
                 
                 # Add these tool messages to our conversation history
                 for msg in tool_messages:
@@ -204,12 +280,23 @@ class OpenAIHelper:
                 # Log the messages being sent for the second call
                 logger.info(f"[OpenAI Helper] Messages for second call after tool execution: {json.dumps(formatted_messages, indent=2)}")
                 
-                # Make another request to get final response
-                response = self.client.responses.create(
-                    model=chat_settings.model,
-                    input=formatted_messages, 
-                    tools=tools if tools else None 
-                )
+                # Make another request to get final response, if there is still time for one
+                if deadline.remaining() < MIN_MODEL_CALL_SECONDS:
+                    raise DeadlineExceeded(FOLLOW_UP)
+                try:
+                    # The turn is half done: its follow-up goes before new turns
+                    response = await self._create_response(
+                        deadline,
+                        PRIORITY_FOLLOW_UP if priority <= PRIORITY_TURN else priority,
+                        model=chat_settings.model,
+                        input=formatted_messages, 
+                        tools=tools if tools else None 
+                    )
+                except (APITimeoutError, RateLimitQueueTimeout):
+                    raise DeadlineExceeded(FOLLOW_UP)
+                except CircuitOpenError as e_circuit:
+                    logger.warning(f"[OpenAI Helper] {e_circuit}")
+                    return OPENAI_UNAVAILABLE_MESSAGE
             
             # Extract and return the response text
             response_text = response.output_text
@@ -219,13 +306,48 @@ class OpenAIHelper:
             
             return response_text
             
+        except DeadlineExceeded as e:
+            turn_metrics.record_deadline_exceeded(e.stage)
+            return partial_answer(e.stage, completed_tools)
         except Exception as e:
             logger.error(f"Error getting OpenAI response: {e}")
             return f"I'm sorry, I encountered an error: {str(e)}"
     
+    async def _create_response(self, deadline: Deadline, priority: int, **kwargs) -> Any:
+        """
+        Call the Responses API with bounded retries behind the OpenAI circuit breaker.
+
+        Each attempt waits for capacity on one of the pooled API keys (see openai_limiter.py),
+        then runs the blocking SDK call in a worker thread so a slow model call does not stall
+        other turns. SDK retries are off: every attempt gets what is left of the deadline, and
+        retries are only made while there is time for them.
+
+        Args:
+            deadline: The turn's deadline
+            priority: Queue priority of the call
+            **kwargs: Arguments of responses.create
+
+        Returns:
+            The response
+
+        Raises:
+            APITimeoutError: If an attempt ran into the deadline
+            RateLimitQueueTimeout: If no API key had capacity before the deadline
+            CircuitOpenError: If OpenAI's circuit is open
+        """
+        def create(client: OpenAI):
+            # The raw response keeps the x-ratelimit-* headers the limiter adapts to
+            return client.with_options(timeout=deadline.timeout(), max_retries=0).responses.with_raw_response.create(**kwargs)
+
+        async def attempt():
+            raw_response = await self.rate_limiter.run(create, priority, timeout=deadline.remaining())
+            return raw_response.parse()
+
+        return await call_with_retries(attempt, OPENAI_UPSTREAM, OPENAI_POLICY, deadline=deadline)
+
     def _format_conversation(
         self, 
-        conversation: Conversation,
+        conversation: TurnContext,
         user_message: Message,
         db: Session,
         message_history_limit: int
@@ -234,7 +356,7 @@ class OpenAIHelper:
         Format a conversation for the OpenAI API.
         
         Args:
-            conversation: The conversation object
+            conversation: The turn context of the conversation
             user_message: The user message to respond to
             db: Database session
             message_history_limit: Maximum number of previous messages to include
@@ -242,13 +364,8 @@ class OpenAIHelper:
         Returns:
             List of formatted messages for the OpenAI API
         """
-        # Get recent message history
-        message_history = db.query(Message).filter(
-            Message.chatid == conversation.chatid
-        ).order_by(Message.created_at.desc()).limit(message_history_limit).all()
-        
-        # Reverse to get chronological order
-        message_history.reverse()
+        # Get recent message history that fits the token budget (chronological, only the needed columns)
+        message_history = load_message_history(db, conversation.chatid, conversation.history_token_budget, message_history_limit)
         
         # Format messages for OpenAI
         formatted_messages = []
@@ -259,6 +376,13 @@ class OpenAIHelper:
             "content": conversation.chat_settings.system_prompt
         })
         
+        # Older messages are only available folded into the rolling summary
+        if conversation.summary:
+            formatted_messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{conversation.summary}"
+            })
+        
         # Add previous messages
         for msg in message_history:
             if msg.id == user_message.id:
@@ -291,15 +415,15 @@ class OpenAIHelper:
                     "output": msg.function_result
                 })
         
-        # Add the current user message
+        # Add the current user message (or the system note of a finished background job)
         formatted_messages.append({
-            "role": "user",
+            "role": user_message.role or "user",
             "content": user_message.content
         })
         
         return formatted_messages
     
-    def _get_tools_for_chat(self, conversation_id: str, chat_settings: ChatSettings) -> List[Dict[str, Any]]:
+    def _get_tools_for_chat(self, conversation_id: str, chat_settings: Union[ChatSettings, ChatSettingsSnapshot]) -> List[Dict[str, Any]]:
         """
         Get the list of tools enabled for a chat.
         
@@ -310,28 +434,56 @@ class OpenAIHelper:
         Returns:
             List of formatted tools for the OpenAI API
         """
-        tools = []
-        if chat_settings.tools:
-            logger.info(f"Chat settings for {conversation_id} has {len(chat_settings.tools)} tools")
-            for tool in chat_settings.tools:
-                logger.info(f"Tool: {tool.id} - {tool.name} - {tool.tool_type}")
-            
-            tools = self.format_tools_for_openai(chat_settings.tools)
-            
-            # Double check to ensure all tools are properly formatted (flat structure)
-            for i, tool in enumerate(tools):
-                if tool.get("type") == "function" and "function" in tool:
-                    # Found old format - convert to flat structure
-                    logger.warning(f"Converting tool at index {i} from nested to flat structure")
-                    function_obj = tool.pop("function")
-                    for k, v in function_obj.items():
-                        tool[k] = v
-            
-            logger.info(f"Enabled tools for chat {conversation_id}: {json.dumps(tools)}")
-        else:
+        if not chat_settings.tools:
             logger.warning(f"No tools found for chat settings {chat_settings.id}")
+            return []
+        
+        # Settings are shared through templates, so the payload is cached per settings ID.
+        # Any tool added, removed, replaced or updated (or its API request edited) changes the signature.
+        signature = tuple(tool_signature(tool) for tool in chat_settings.tools)
+        cached = self._tools_payload_cache.get(chat_settings.id)
+        if cached is not None and cached[0] == signature:
+            self._tools_payload_cache.move_to_end(chat_settings.id)
+            # Name mappings may have been overwritten by another settings in the meantime
+            for tool_name, tool_id in cached[2]:
+                self._tool_name_to_id_map[tool_name] = tool_id
+            self._tool_validators.update(cached[3])
+            logger.info(f"Using cached tools payload for chat settings {chat_settings.id} ({len(cached[1])} tools)")
+            return cached[1]
+        
+        logger.info(f"Chat settings for {conversation_id} has {len(chat_settings.tools)} tools")
+        for tool in chat_settings.tools:
+            logger.info(f"Tool: {tool.id} - {tool.name} - {tool.tool_type}")
+        
+        tools = self.format_tools_for_openai(chat_settings.tools)
         
-        logger.info(f"[OpenAI Helper] _get_tools_for_chat returning: {json.dumps(tools)}")
+        # Double check to ensure all tools are properly formatted (flat structure)
+        for i, tool in enumerate(tools):
+            if tool.get("type") == "function" and "function" in tool:
+                # Found old format - convert to flat structure
+                logger.warning(f"Converting tool at index {i} from nested to flat structure")
+                function_obj = tool.pop("function")
+                for k, v in function_obj.items():
+                    tool[k] = v
+        
+        name_mappings = [
+            (tool["name"], self._tool_name_to_id_map[tool["name"]])
+            for tool in tools
+            if tool.get("type") == "function" and tool.get("name") in self._tool_name_to_id_map
+        ]
+        # Compiled on first call of each tool and kept as long as the payload is cached
+        validators = {
+            tool["name"]: ArgumentValidator(tool["name"], tool["parameters"])
+            for tool in tools
+            if tool.get("type") == "function" and isinstance(tool.get("parameters"), dict)
+        }
+        self._tool_validators.update(validators)
+        self._tools_payload_cache[chat_settings.id] = (signature, tools, name_mappings, validators)
+        self._tools_payload_cache.move_to_end(chat_settings.id)
+        while len(self._tools_payload_cache) > TOOLS_PAYLOAD_CACHE_SIZE:
+            self._tools_payload_cache.popitem(last=False)
+        
+        logger.info(f"[OpenAI Helper] _get_tools_for_chat returning {len(tools)} tools for chat {conversation_id}")
         return tools
     
     def format_tools_for_openai(self, tools: List[Tool]) -> List[Dict[str, Any]]:
@@ -609,24 +761,8 @@ class OpenAIHelper:
         Returns:
             JSON Schema object for parameters
         """
-        # Start with a basic object schema
-        parameters = {
-            "type": "object",
-            "properties": {},
-            "required": []
-        }
-        
-        # Use request_body_schema if available
-        if api_request.request_body_schema:
-            # Extract properties from request body schema
-            if isinstance(api_request.request_body_schema, dict):
-                schema = api_request.request_body_schema
-                if "properties" in schema:
-                    parameters["properties"] = schema["properties"]
-                if "required" in schema:
-                    parameters["required"] = schema["required"]
-        
-        return parameters
+        # Path/query/header parameters plus the request body, without skipped or constant ones
+        return build_parameters_schema(api_request)
     
     def _add_tool_message_to_history(
         self,
@@ -681,50 +817,11 @@ class OpenAIHelper:
             
             api_request = tool.api_request
             config = tool.configuration or {}
+            endpoint = api_request.path or ""
             
-            # Extract endpoint, method from API request
-            endpoint = api_request.path if hasattr(api_request, 'path') else ""
-            method = api_request.method.upper() if hasattr(api_request, 'method') and api_request.method else "GET"
-            
-            # First try to get server_url from the tool configuration
-            server_url = config.get("server_url", "")
-            
-            # If not in config, try to get from api_request's url attribute (legacy)
-            if not server_url and hasattr(api_request, 'url') and api_request.url:
-                # Try to extract the server URL from the full URL
-                try:
-                    url_parts = urlparse(api_request.url)
-                    server_url = f"{url_parts.scheme}://{url_parts.netloc}"
-                except Exception as e:
-                    logger.warning(f"Failed to parse URL from API request: {e}")
-            
-            # If still not found, try to get from the linked API object
-            if not server_url and hasattr(api_request, 'api') and api_request.api:
-                if hasattr(api_request.api, 'server') and api_request.api.server:
-                    server_url = api_request.api.server
-                    logger.info(f"Using server URL from linked API: {server_url}")
-            
-            # Construct full URL
-            full_url = f"{server_url}{endpoint}" if server_url else endpoint
-            
-            if not full_url:
-                return f"Error: Could not determine URL for API request {api_request.id}"
-            
-            # Check for missing protocol
-            if not full_url.startswith(('http://', 'https://')):
-                return f"Error: Invalid URL {full_url}. URL must start with http:// or https://"
-            
-            # Prepare request parameters
-            headers, params, body = self._prepare_request_params(config, arguments)
-            
-            # Add function arguments to the body if we have a request_body_schema
-            if hasattr(api_request, 'request_body_schema') and api_request.request_body_schema:
-                # Extract parameters from arguments based on the schema
-                schema = api_request.request_body_schema
-                if isinstance(schema, dict) and "properties" in schema:
-                    for prop_name in schema.get("properties", {}):
-                        if prop_name in arguments:
-                            body[prop_name] = arguments[prop_name]
+            # Compiled once per tool: URL template, argument routing, constants and auth
+            plan = request_plan_cache.get(tool)
+            method, full_url, headers, params, body = apply_request_plan(plan, arguments, self.api_key)
             
             # Log the request details
             logger.info(f"Executing API tool {tool.name} ({tool.id}): {method} {full_url}")
@@ -749,21 +846,27 @@ class OpenAIHelper:
                     logger.warning("[OpenAI Helper] No prompt specified for image generation. This request may fail.")
             
             # For speech tool, log the received arguments from LLM
-            if "speech" in tool.name.lower() or (hasattr(api_request, 'path') and "audio" in api_request.path.lower()):
+            if "speech" in (tool.name or "").lower() or "audio" in endpoint.lower():
                 logger.info(f"[OpenAI Helper] LLM provided arguments for speech tool ({tool.name}): {json.dumps(arguments, indent=2)}")
             
-            # Add OpenAI API key if needed
-            if "openai.com" in full_url:
-                logger.info(f"[OpenAI Helper] Setting Authorization header for OpenAI API call with key: {self.masked_key}")
-                headers["Authorization"] = f"Bearer {self.api_key}"
-                
-                # For OpenAI, ensure Content-Type is set correctly
-                if method == "POST" or method == "PUT":
-                    headers["Content-Type"] = "application/json"
+            # Serve repeated idempotent calls from the result cache
+            response_mapping = config.get("response_mapping")
+            max_response_bytes = getattr(api_request, "max_response_bytes", None)
+            cache_ttl = cache_ttl_for(method, getattr(api_request, "cache_ttl_seconds", None))
+            if cache_ttl:
+                cache_key = tool_result_key(api_request.id, method, full_url, headers, params, body, response_mapping)
+                return await tool_result_cache.get_or_fetch(
+                    cache_key,
+                    cache_ttl,
+                    lambda: self._fetch_http_result(method, full_url, headers, params, body, response_mapping, max_response_bytes)
+                )
             
             # Make the API request based on method
-            return await self._make_http_request(method, full_url, headers, params, body)
+            return await self._make_http_request(method, full_url, headers, params, body, response_mapping, max_response_bytes)
                 
+        except RequestPlanError as e:
+            logger.error(f"API tool {tool.id} cannot be called: {e}")
+            return f"Error: {e}"
         except httpx.HTTPStatusError as e:
             error_msg = f"Error code: {e.response.status_code} - {e.response.text}"
             logger.error(f"API call failed: {error_msg}")
@@ -773,55 +876,15 @@ class OpenAIHelper:
             logger.error(error_msg)
             return error_msg
     
-    def _prepare_request_params(
-        self,
-        config: Dict[str, Any],
-        arguments: Dict[str, Any]
-    ) -> tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
-        """
-        Prepare request parameters based on tool configuration and arguments.
-        
-        Args:
-            config: The tool configuration
-            arguments: Model-provided arguments
-            
-        Returns:
-            Tuple of (headers, params, body)
-        """
-        # Prepare request parameters
-        headers = {}
-        params = {}
-        body = {}
-        
-        # Add configured headers if any
-        if config.get("headers"):
-            headers.update(config.get("headers", {}))
-        
-        # Add query parameters from arguments that match param schema
-        if config.get("params"):
-            for param_name, param_info in config.get("params", {}).items():
-                if param_name in arguments:
-                    params[param_name] = arguments[param_name]
-                    
-        # Add body parameters from arguments that match body schema
-        if config.get("body_schema"):
-            body_schema = config.get("body_schema", {})
-            
-            if isinstance(body_schema, dict) and "properties" in body_schema:
-                # Extract properties from arguments that match the schema
-                for prop_name in body_schema.get("properties", {}):
-                    if prop_name in arguments:
-                        body[prop_name] = arguments[prop_name]
-        
-        return headers, params, body
-    
     async def _make_http_request(
         self,
         method: str,
         url: str,
         headers: Dict[str, Any],
         params: Dict[str, Any],
-        body: Dict[str, Any]
+        body: Dict[str, Any],
+        response_mapping: Optional[Dict[str, str]] = None,
+        max_response_bytes: Optional[int] = None
     ) -> str:
         """
         Make an HTTP request and handle the response.
@@ -832,120 +895,182 @@ class OpenAIHelper:
             headers: Request headers
             params: Query parameters
             body: Request body
+            response_mapping: Optional projection of JSON responses (output key -> path)
+            max_response_bytes: The API request's body size limit (None for the default)
             
         Returns:
             Response as a string
         """
-        try:
+        result, _ = await self._fetch_http_result(method, url, headers, params, body, response_mapping, max_response_bytes)
+        return result
+    
+    async def _fetch_http_result(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, Any],
+        params: Dict[str, Any],
+        body: Dict[str, Any],
+        response_mapping: Optional[Dict[str, str]] = None,
+        max_response_bytes: Optional[int] = None
+    ) -> Tuple[str, bool]:
+        """
+        Make an HTTP request and handle the response, reporting whether it succeeded.
+        
+        Transient failures are retried with backoff behind a circuit breaker per API host;
+        requests with side effects (POST) are only retried when the API refused them. Slow GET
+        requests are hedged with a second request after TOOL_HEDGE_DELAY_SECONDS (see resilience.py).
+        
+        Returns:
+            Tuple of (response as a string, whether the request succeeded)
+        """
+        if method not in ("GET", "POST", "PUT", "DELETE"):
+            return f"Error making HTTP request: Unsupported HTTP method: {method}", False
+        upstream = urlparse(url).hostname or url
+        policy = IDEMPOTENT_POLICY if method in IDEMPOTENT_METHODS else UNSAFE_POLICY
+        
+        async def send() -> Tuple[str, bool, int, httpx.Headers]:
             logger.info(f"Making {method} request to {url}")
             timeout_config = httpx.Timeout(60.0, connect=10.0)
             async with httpx.AsyncClient(timeout=timeout_config) as client:
-                if method == "GET":
-                    response = await client.get(url, headers=headers, params=params)
-                elif method == "POST":
-                    response = await client.post(url, headers=headers, params=params, json=body)
-                elif method == "PUT":
-                    response = await client.put(url, headers=headers, params=params, json=body)
-                elif method == "DELETE":
-                    response = await client.delete(url, headers=headers, params=params)
-                else:
-                    raise ValueError(f"Unsupported HTTP method: {method}")
-                
-                # Check if the response was successful
-                response.raise_for_status()
+                request_kwargs: Dict[str, Any] = {"headers": headers, "params": params}
+                if method in ("POST", "PUT"):
+                    request_kwargs["json"] = body
                 
-                return self._process_response(response, url)
-        except httpx.HTTPStatusError as e:
-            # Log more detailed information about the failed request
-            error_msg = f"Error code: {e.response.status_code} - {e.response.text}"
-            logger.error(f"HTTP request failed: {error_msg}")
-            
-            # For image generation requests, log more detailed information
-            if "/images/generations" in url:
-                logger.error(f"[OpenAI Helper] IMAGE GENERATION API CALL FAILED:")
-                logger.error(f"[OpenAI Helper] URL: {url}")
-                logger.error(f"[OpenAI Helper] Status code: {e.response.status_code}")
-                logger.error(f"[OpenAI Helper] Response headers: {e.response.headers}")
-                logger.error(f"[OpenAI Helper] Response body: {e.response.text}")
-                logger.error(f"[OpenAI Helper] Request body: {json.dumps(body, indent=2)}")
-            
-            return error_msg
+                # Stream the response: only a bounded prefix of it is ever held in memory
+                async with client.stream(method, url, **request_kwargs) as response:
+                    if response.is_error:
+                        error_body, _ = await read_capped(response.aiter_bytes(), TOOL_ERROR_BODY_MAX_BYTES)
+                        error_text = error_body.decode(response.charset_encoding or "utf-8", errors="replace")
+                        return self._http_error_result(url, body, response, error_text), False, response.status_code, response.headers
+                    
+                    result = await self._process_response(response, url, response_mapping, max_response_bytes)
+                    return result, True, response.status_code, response.headers
+        
+        attempt = send
+        if method == "GET" and TOOL_HEDGE_DELAY_SECONDS > 0:
+            attempt = lambda: hedged(send, TOOL_HEDGE_DELAY_SECONDS)
+        
+        try:
+            result, ok, _, _ = await call_with_retries(
+                attempt,
+                upstream,
+                policy,
+                classify_result=lambda sent: status_outcome(sent[2], sent[3], policy)
+            )
+            return result, ok
+        except CircuitOpenError as e:
+            logger.warning(f"HTTP request to {url} not sent: {e}")
+            return f"Error: {e}", False
         except Exception as e:
             logger.error(f"Unexpected error during HTTP request: str(e)='{str(e)}', repr(e)='{repr(e)}'")
-            return f"Error making HTTP request: {str(e)}"
+            return f"Error making HTTP request: {str(e)}", False
+    
+    def _http_error_result(self, url: str, body: Dict[str, Any], response: httpx.Response, error_text: str) -> str:
+        """
+        Log a failed HTTP request and build the error result returned to the model.
+        
+        Args:
+            url: The request URL
+            body: The request body
+            response: The error response
+            error_text: The (capped) response body
+            
+        Returns:
+            The error message
+        """
+        # Log more detailed information about the failed request
+        error_msg = cap_text(f"Error code: {response.status_code} - {error_text}")
+        logger.error(f"HTTP request failed: {error_msg}")
+        
+        # For image generation requests, log more detailed information
+        if "/images/generations" in url:
+            logger.error(f"[OpenAI Helper] IMAGE GENERATION API CALL FAILED:")
+            logger.error(f"[OpenAI Helper] URL: {url}")
+            logger.error(f"[OpenAI Helper] Status code: {response.status_code}")
+            logger.error(f"[OpenAI Helper] Response headers: {response.headers}")
+            logger.error(f"[OpenAI Helper] Response body: {error_text}")
+            logger.error(f"[OpenAI Helper] Request body: {json.dumps(body, indent=2)}")
+        
+        return error_msg
     
-    def _process_response(self, response: httpx.Response, url: str) -> str:
+    async def _process_response(
+        self,
+        response: httpx.Response,
+        url: str,
+        response_mapping: Optional[Dict[str, str]] = None,
+        max_response_bytes: Optional[int] = None
+    ) -> str:
         """
-        Process an HTTP response based on content type.
+        Process a streamed HTTP response based on content type.
+        
+        The type is decided from the content-type header and, unless it declares text, the
+        first chunk of the body. Audio and other binary bodies are streamed into the media
+        store and returned as a media:// reference. Text bodies are read up to the API
+        request's max_response_bytes (TOOL_RESPONSE_MAX_BYTES by default) and truncated
+        beyond it. Base64 blobs in JSON are moved to the media store, then the JSON is
+        projected with the tool's response mapping and compacted; every text result is
+        capped at TOOL_RESPONSE_MAX_CHARS (see response_reader.py, media_store.py and
+        response_shaper.py).
         
         Args:
-            response: The HTTP response
+            response: The HTTP response, opened with client.stream()
             url: The request URL
+            response_mapping: Optional projection of JSON responses (output key -> path)
+            max_response_bytes: The API request's body size limit (None for the default)
             
         Returns:
             Processed response as a string
         """
         content_type = response.headers.get("content-type", "").lower()
+        mime_type = content_type.split(";")[0].strip()
+        chunks = response.aiter_bytes(STREAM_CHUNK_BYTES)
         
-        # Define a mapping for common audio content types to file extensions
-        audio_type_to_extension = {
-            "audio/mpeg": ".mp3",
-            "audio/mp3": ".mp3",
-            "audio/opus": ".opus",
-            "audio/aac": ".aac",
-            "audio/flac": ".flac",
-            "audio/wav": ".wav",
-            "audio/wave": ".wav",
-            "audio/ogg": ".ogg",
-            # Add more mappings as needed
-        }
+        # Audio content types, or an /audio/ endpoint answering with an unspecific type
+        is_audio_response = mime_type.startswith("audio/") or (
+            "/audio/" in url.lower() and mime_type in ("", "application/octet-stream")
+        )
         
-        file_extension = None
-        for audio_type, ext in audio_type_to_extension.items():
-            if audio_type in content_type:
-                file_extension = ext
-                break
-        
-        # If we determined a file extension or the URL suggests audio, treat as audio
-        is_audio_response = file_extension is not None or "/audio/" in url.lower()
-        
-        if is_audio_response:
-            # If we couldn't determine extension from content-type but URL implies audio,
-            # default to .audio or a generic binary extension, or perhaps try to guess from URL path.
-            # For now, let's default to .mp3 if URL implies audio but type is unknown/unmapped.
-            if not file_extension and "/audio/" in url.lower():
-                logger.warning(f"Could not determine specific audio type for {url} with content-type {content_type}, defaulting to .mp3 due to /audio/ in URL.")
-                file_extension = ".mp3"
-            elif not file_extension:
-                # This case means content_type wasn't in our map and /audio/ not in URL, 
-                # but is_audio_response was true (which is now impossible based on logic above).
-                # However, to be safe, or if logic changes:
-                pass # Let it be handled by JSON/text processing below
-
-            if file_extension: # Proceed if we have an extension
-                file_id = str(uuid.uuid4())
-                # Using a generic name prefix for now, could be derived from tool name or URL later
-                file_path = f"/tmp/api_audio_output_{file_id}{file_extension}"
-                
-                try:
-                    with open(file_path, "wb") as f:
-                        f.write(response.content)
-                    logger.info(f"Saved audio response from {url} to {file_path} (Content-Type: {content_type})")
-                    return f"Audio file generated and saved as {file_path}. You can listen to it or download it."
-                except Exception as e:
-                    logger.error(f"Failed to save audio file {file_path}: {e}")
-                    # Fall through to default JSON/text processing if saving fails
-
-        # For JSON responses (if not handled as audio)
-        if "application/json" in content_type:
+        is_binary_response = is_audio_response
+        if not is_binary_response and not is_text_mime_type(mime_type):
+            # Sniff the first bytes of anything not declared as text
+            head, chunks = await peek(chunks)
+            is_binary_response = is_binary_body(mime_type, head)
+        
+        if is_binary_response:
+            declared_type = mime_type if mime_type not in ("", "application/octet-stream") else None
+            try:
+                ref = await media_store.put_stream(chunks, declared_type, max_response_bytes)
+            except MediaTooLargeError as e:
+                logger.error(f"Binary response from {url} not stored: {e}")
+                return f"Error: the file returned by the API is too large ({e})"
+            logger.info(f"Stored binary response from {url} as {ref} (Content-Type: {content_type})")
+            if is_audio_response:
+                return f"Audio file generated: {ref}. It will be sent to the user."
+            return f"File received ({declared_type or 'binary'}): {ref}. It will be sent to the user."
+        
+        max_bytes = max_response_bytes_for(max_response_bytes)
+        raw, truncated = await read_capped(chunks, max_bytes)
+        text = raw.decode(response.charset_encoding or "utf-8", errors="replace")
+        
+        if truncated:
+            # A cut document cannot be parsed; give the model its beginning
+            logger.warning(f"Response from {url} exceeds {max_bytes} bytes, truncating")
+            note = f"\n[Response truncated: larger than {max_bytes} bytes]"
+            return cap_text(text, max(TOOL_RESPONSE_MAX_CHARS - len(note), 0)) + note
+        
+        # For JSON responses (if not handled as a file)
+        if "json" in mime_type:
             try:
-                return json.dumps(response.json(), indent=2)
+                # Binary payloads go to the media store; only their references reach the prompt
+                data = offload_binary_fields(json.loads(text), media_store)
+                return shape_json(data, response_mapping)
             except json.JSONDecodeError:
                 logger.warning(f"Content-Type is application/json but failed to decode JSON from {url}. Returning raw text.")
-                return response.text
+                return cap_text(text)
         
         # For text responses (default fallback)
-        return response.text
+        return cap_text(text)
 
     async def handle_tool_calls(
         self, 
@@ -1084,7 +1209,7 @@ class OpenAIHelper:
     
     async def _execute_tool(
         self,
-        conversation: Conversation,
+        conversation: Union[Conversation, TurnContext],
         function_name: str,
         function_args: Dict[str, Any]
     ) -> str:
@@ -1132,7 +1257,14 @@ class OpenAIHelper:
         
         # Handle based on tool_type
         if tool.tool_type == ToolType.FUNCTION:
-            # For function tools without API links, we would implement custom logic here
+            # Function tools without API links run a registered local tool
+            local_tool_name = (tool.configuration or {}).get(LOCAL_TOOL_CONFIG_KEY) or tool.name
+            if local_tools.get(local_tool_name) is not None:
+                try:
+                    return await local_tools.run(local_tool_name, function_args)
+                except LocalToolError as e:
+                    logger.warning(f"Local tool {local_tool_name} failed: {e}")
+                    return f"Error: {e}"
             return f"Executed function {function_name} with args {function_args}. This is a placeholder response."
         
         return f"Unsupported tool type: {tool.tool_type}"
@@ -1140,16 +1272,18 @@ class OpenAIHelper:
     async def handle_tool_calls_with_array(
         self, 
         tool_calls,
-        conversation: Conversation,
-        db: Session
+        conversation: Union[Conversation, TurnContext],
+        db: Session,
+        deadline: Optional[Deadline] = None
     ) -> List[Message]:
         """
         Process tool calls from an array of tool calls (either dict or object style).
         
         Args:
             tool_calls: Array of tool calls (from response.output), named tool_calls_from_openai here
-            conversation: The conversation object
+            conversation: The conversation object or its turn context
             db: Database session
+            deadline: The turn's deadline; calls still running when it passes are cancelled
             
         Returns:
             A list of tool call and result messages
@@ -1252,8 +1386,39 @@ class OpenAIHelper:
             db.commit() # Commit tool call message first
             messages.append(tool_call_msg)
             
-            # _execute_tool uses the current_openai_function_name to find the tool again
-            function_result = await self._execute_tool(conversation, current_openai_function_name, function_args)
+            # Reject malformed arguments before any upstream call; the model gets the error right away
+            validator = self._tool_validators.get(current_openai_function_name)
+            validation_error = validator.validate(function_args) if validator else None
+            job = None
+            if validation_error:
+                logger.warning(f"Invalid arguments for {current_openai_function_name}: {validation_error['message']}")
+                function_result = validation_error_result(validation_error)
+            elif resolved_tool_object is not None and resolved_tool_object.long_running:
+                # Long-running tools run as background jobs; the model gets a handle and replies right away
+                job = tool_job_runner.create_job(
+                    db,
+                    conversation.chatid,
+                    resolved_tool_object.id,
+                    openai_call_id,
+                    canonical_tool_name,
+                    current_openai_function_name,
+                    function_args
+                )
+                function_result = job_handle_result(job.id, canonical_tool_name)
+            elif deadline is not None and deadline.expired:
+                turn_metrics.record_tool_call_cancelled()
+                function_result = TOOL_CANCELLED_RESULT
+            else:
+                # _execute_tool uses the current_openai_function_name to find the tool again
+                try:
+                    function_result = await asyncio.wait_for(
+                        self._execute_tool(conversation, current_openai_function_name, function_args),
+                        timeout=deadline.timeout() if deadline is not None else None
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning(f"Tool call {current_openai_function_name} cancelled at the turn deadline")
+                    turn_metrics.record_tool_call_cancelled()
+                    function_result = TOOL_CANCELLED_RESULT
             
             tool_result_msg = self._create_tool_result_message(
                 conversation.chatid, 
@@ -1266,6 +1431,10 @@ class OpenAIHelper:
             db.add(tool_result_msg)
             db.commit() # Commit tool result message
             messages.append(tool_result_msg)
+            
+            # Start the job once its handle is stored, so the follow-up comes after it in the history
+            if job is not None:
+                tool_job_runner.schedule(job.id)
         
         logger.info(f"Processed {len(messages) // 2} tool calls")
         return messages
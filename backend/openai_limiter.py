@@ -0,0 +1,364 @@
+import os
+import re
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import openai
+from openai import OpenAI
+
+from resilience import retry_after_seconds
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# API keys to spread model calls across, comma separated, each optionally "key:project";
+# OPENAI_API_KEY alone is used if not set
+OPENAI_API_KEYS = os.environ.get("OPENAI_API_KEYS", "")
+# Bounds and starting point of the in-flight model calls per key
+OPENAI_MIN_CONCURRENCY = int(os.environ.get("OPENAI_MIN_CONCURRENCY", "1"))
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "32"))
+OPENAI_INITIAL_CONCURRENCY = int(os.environ.get("OPENAI_INITIAL_CONCURRENCY", "4"))
+# Share of the request or token quota left at which a key's concurrency is cut instead of grown
+OPENAI_RATELIMIT_LOW_WATERMARK = float(os.environ.get("OPENAI_RATELIMIT_LOW_WATERMARK", "0.1"))
+
+# Concurrency is multiplied by this when the quota runs low, and halved on a 429
+LOW_QUOTA_DECREASE_FACTOR = 0.75
+RATE_LIMITED_DECREASE_FACTOR = 0.5
+# Pause of a key after a 429 that says nothing about when to come back
+DEFAULT_RATE_LIMIT_PAUSE_SECONDS = 1.0
+
+# Queue priorities, lowest first: a turn's follow-up call goes before new turns, and work
+# no one is waiting on (summaries, background job deliveries) only gets the capacity left over
+PRIORITY_FOLLOW_UP = 0
+PRIORITY_TURN = 1
+PRIORITY_BACKGROUND = 2
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class RateLimitQueueTimeout(Exception):
+    """Raised when a call waited in the queue for longer than its timeout."""
+
+
+def parse_api_keys(raw: str, fallback_key: Optional[str]) -> List[Tuple[str, Optional[str]]]:
+    """
+    Parse OPENAI_API_KEYS.
+
+    Args:
+        raw: Comma separated keys, each optionally followed by ":project"
+        fallback_key: The key used if raw holds none
+
+    Returns:
+        List of (API key, project or None)
+    """
+    keys = []
+    for entry in raw.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        key, _, project = entry.partition(":")
+        keys.append((key.strip(), project.strip() or None))
+    if not keys and fallback_key:
+        keys.append((fallback_key, None))
+    return keys
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse the x-ratelimit-reset-* duration format ("1s", "6m0s", "120ms").
+
+    Args:
+        value: The header value
+
+    Returns:
+        Seconds, or None if missing or malformed
+    """
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(number) * _DURATION_SECONDS[unit] for number, unit in parts)
+
+
+def _int_header(headers: Mapping[str, str], name: str) -> Optional[int]:
+    try:
+        return int(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class KeySlot:
+    """One API key with its client, adaptive concurrency limit and last known quota."""
+
+    def __init__(self, client: OpenAI, label: str, clock: Callable[[], float] = time.monotonic):
+        self.client = client
+        self.label = label
+        self._clock = clock
+        self.limit = float(min(max(OPENAI_INITIAL_CONCURRENCY, OPENAI_MIN_CONCURRENCY), OPENAI_MAX_CONCURRENCY))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        # Quota from the latest x-ratelimit-* headers: remaining requests count until requests_reset_at
+        self.remaining_requests: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.requests_reset_at = 0.0
+        self._counters = {"calls": 0, "rate_limited": 0, "increases": 0, "decreases": 0}
+
+    def capacity(self) -> int:
+        """Calls this key may have in flight right now."""
+        now = self._clock()
+        if now < self.paused_until:
+            return 0
+        capacity = max(int(self.limit), OPENAI_MIN_CONCURRENCY)
+        if self.remaining_requests is not None and now < self.requests_reset_at:
+            capacity = min(capacity, self.remaining_requests)
+        return capacity
+
+    def headroom(self) -> int:
+        """Further calls this key may start now."""
+        return self.capacity() - self.in_flight
+
+    def observe(self, headers: Optional[Mapping[str, str]], status_code: Optional[int]) -> None:
+        """
+        Adjust the limit from a call's outcome (additive increase, multiplicative decrease).
+
+        Args:
+            headers: The response headers, with the x-ratelimit-* quota
+            status_code: The response status (None if no response came back)
+        """
+        self._counters["calls"] += 1
+        now = self._clock()
+        headers = headers or {}
+
+        if status_code == 429:
+            self._counters["rate_limited"] += 1
+            self._decrease(RATE_LIMITED_DECREASE_FACTOR)
+            pause = retry_after_seconds(headers)
+            if pause is None:
+                pause = max(
+                    parse_reset_duration(headers.get("x-ratelimit-reset-requests")) or 0,
+                    parse_reset_duration(headers.get("x-ratelimit-reset-tokens")) or 0
+                ) or DEFAULT_RATE_LIMIT_PAUSE_SECONDS
+            self.paused_until = max(self.paused_until, now + pause)
+            logger.warning(f"[OpenAI Limiter] {self.label} rate limited, pausing {pause:.2f}s at concurrency {self.limit:.1f}")
+            return
+
+        if status_code is None or status_code >= 400:
+            return
+
+        limit_requests = _int_header(headers, "x-ratelimit-limit-requests")
+        limit_tokens = _int_header(headers, "x-ratelimit-limit-tokens")
+        self.remaining_requests = _int_header(headers, "x-ratelimit-remaining-requests")
+        self.remaining_tokens = _int_header(headers, "x-ratelimit-remaining-tokens")
+        self.requests_reset_at = now + (parse_reset_duration(headers.get("x-ratelimit-reset-requests")) or 0)
+
+        shares = []
+        if limit_requests and self.remaining_requests is not None:
+            shares.append(self.remaining_requests / limit_requests)
+        if limit_tokens and self.remaining_tokens is not None:
+            shares.append(self.remaining_tokens / limit_tokens)
+
+        if self.remaining_requests == 0:
+            self.paused_until = max(self.paused_until, self.requests_reset_at)
+        if self.remaining_tokens == 0:
+            # Out of tokens: no call can succeed before the token window resets
+            reset = parse_reset_duration(headers.get("x-ratelimit-reset-tokens")) or DEFAULT_RATE_LIMIT_PAUSE_SECONDS
+            self.paused_until = max(self.paused_until, now + reset)
+
+        if shares and min(shares) < OPENAI_RATELIMIT_LOW_WATERMARK:
+            self._decrease(LOW_QUOTA_DECREASE_FACTOR)
+        elif self.limit < OPENAI_MAX_CONCURRENCY:
+            # Grows by about one slot per round of `limit` successful calls
+            self.limit = min(self.limit + 1 / self.limit, float(OPENAI_MAX_CONCURRENCY))
+            self._counters["increases"] += 1
+
+    def _decrease(self, factor: float) -> None:
+        self.limit = max(self.limit * factor, float(OPENAI_MIN_CONCURRENCY))
+        self._counters["decreases"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the limit, quota and counters of this key."""
+        return {
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "remaining_requests": self.remaining_requests,
+            "remaining_tokens": self.remaining_tokens,
+            "paused_for_seconds": round(max(self.paused_until - self._clock(), 0.0), 3),
+            **self._counters
+        }
+
+
+class OpenAIRateLimiter:
+    """
+    Admits model calls across a pool of API keys, queueing them by priority.
+
+    Each key's in-flight limit follows its quota: it grows while the x-ratelimit-* headers
+    show room, shrinks when they run low and halves on a 429, which also pauses the key
+    until its window resets. Calls wait for a free slot on any key rather than failing;
+    the queue is served by priority, then first come first served.
+
+    The queue lives on the event loop: run() must be awaited there. Worker threads use
+    run_blocking(), which hands the call to the loop.
+    """
+
+    def __init__(self, clients: List[Tuple[OpenAI, str]], clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the limiter.
+
+        Args:
+            clients: (client, label for logs and stats) per API key
+            clock: Monotonic clock, in seconds
+        """
+        if not clients:
+            raise ValueError("At least one OpenAI client is required")
+        self.slots = [KeySlot(client, label, clock) for client, label in clients]
+        self._clock = clock
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._counters = {"queued": 0, "queue_timeouts": 0}
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    async def acquire(self, priority: int = PRIORITY_TURN, timeout: Optional[float] = None) -> KeySlot:
+        """
+        Wait for a slot on one of the keys.
+
+        Args:
+            priority: Queue priority (PRIORITY_*), lowest served first
+            timeout: Seconds to wait at most (no limit if None)
+
+        Returns:
+            The key slot to make the call with; hand it back with release()
+
+        Raises:
+            RateLimitQueueTimeout: If no slot came free in time
+        """
+        self._loop = asyncio.get_running_loop()
+        started = self._clock()
+        future = self._loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), future))
+        self._dispatch()
+        queued = not future.done()
+        if queued:
+            self._counters["queued"] += 1
+        try:
+            slot = await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # A slot was handed over just as the wait ended
+                self.release(future.result())
+            if isinstance(e, asyncio.TimeoutError):
+                self._counters["queue_timeouts"] += 1
+                raise RateLimitQueueTimeout(f"No OpenAI capacity within {timeout:.1f}s")
+            raise
+        if queued:
+            waited = self._clock() - started
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        return slot
+
+    def release(self, slot: KeySlot) -> None:
+        """Hand a slot back and admit the next queued call."""
+        slot.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        # Hand free slots to the queued calls, most important first
+        while self._queue:
+            priority, _, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            slot = max(self.slots, key=lambda s: s.headroom())
+            if slot.headroom() <= 0:
+                self._schedule_wakeup()
+                return
+            heapq.heappop(self._queue)
+            slot.in_flight += 1
+            future.set_result(slot)
+
+    def _schedule_wakeup(self) -> None:
+        # Paused keys free up by themselves; check again when the first pause ends
+        now = self._clock()
+        pauses = [slot.paused_until - now for slot in self.slots if slot.paused_until > now]
+        if not pauses or self._loop is None or (self._wakeup is not None and not self._wakeup.cancelled()):
+            return
+
+        def wake():
+            self._wakeup = None
+            self._dispatch()
+
+        self._wakeup = self._loop.call_later(min(pauses), wake)
+
+    async def run(self, call: Callable[[OpenAI], Any], priority: int = PRIORITY_TURN, timeout: Optional[float] = None) -> Any:
+        """
+        Make a model call once a key has capacity, and learn from its rate limit headers.
+
+        Args:
+            call: Makes the blocking call with the given client, using with_raw_response so the headers are kept
+            priority: Queue priority (PRIORITY_*)
+            timeout: Seconds to wait in the queue at most
+
+        Returns:
+            The raw response
+
+        Raises:
+            RateLimitQueueTimeout: If no key had capacity in time
+        """
+        slot = await self.acquire(priority, timeout)
+        try:
+            response = await asyncio.to_thread(call, slot.client)
+        except openai.APIStatusError as e:
+            slot.observe(e.response.headers, e.status_code)
+            raise
+        except Exception:
+            slot.observe(None, None)
+            raise
+        finally:
+            self.release(slot)
+        slot.observe(response.headers, getattr(response, "status_code", 200))
+        return response
+
+    def run_blocking(self, call: Callable[[OpenAI], Any], priority: int = PRIORITY_BACKGROUND) -> Any:
+        """
+        Make a model call from a worker thread, queued like any other.
+
+        Args:
+            call: As for run()
+            priority: Queue priority (PRIORITY_*)
+
+        Returns:
+            The raw response
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed() or not loop.is_running():
+            # No turn has run yet: there is no queue to wait in
+            return call(self.slots[0].client)
+        return asyncio.run_coroutine_threadsafe(self.run(call, priority), loop).result()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the queue and per-key state.
+
+        Returns:
+            Queue length and wait times, and the limit, quota and counters of each key
+        """
+        queued_now = sum(1 for _, _, future in self._queue if not future.done())
+        queued = self._counters["queued"]
+        return {
+            "queue_length": queued_now,
+            **self._counters,
+            "average_wait_seconds": round(self._total_wait / queued, 3) if queued else 0.0,
+            "max_wait_seconds": round(self._max_wait, 3),
+            "keys": {slot.label: slot.stats() for slot in self.slots},
+        }
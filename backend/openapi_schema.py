@@ -0,0 +1,378 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.exc import UnmappedInstanceError
+
+from models import ComponentSchema
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Maximum number of nested $ref hops expanded below a schema before a placeholder is emitted
+OPENAPI_SCHEMA_MAX_DEPTH = int(os.environ.get("OPENAPI_SCHEMA_MAX_DEPTH", "10"))
+
+# Maximum number of objects and arrays in one resolved schema before further $refs become placeholders
+OPENAPI_SCHEMA_MAX_NODES = int(os.environ.get("OPENAPI_SCHEMA_MAX_NODES", "20000"))
+
+
+class SchemaRefResolver:
+    """
+    Resolves local `$ref`s of an OpenAPI spec, resolving each component only once.
+
+    Resolved components are memoized per (reference, remaining depth) and shared between
+    all schemas that reference them. Self-referential schemas and references nested deeper
+    than max_depth are replaced by bounded placeholder schemas instead of recursing.
+
+    A component whose expansion ran into a cycle through one of its ancestors depends on
+    where it was reached from, so it is only memoized for the current root schema: it is
+    expanded once per resolve() call and later references to it get a placeholder. Each
+    resolved schema is also capped at max_nodes objects and arrays, after which remaining
+    references become placeholders, so densely interlinked specs stay bounded.
+
+    Use one resolver per spec; the returned schemas share structure and must not be mutated.
+    """
+
+    def __init__(
+        self,
+        spec: Dict[str, Any],
+        max_depth: int = OPENAPI_SCHEMA_MAX_DEPTH,
+        max_nodes: int = OPENAPI_SCHEMA_MAX_NODES
+    ):
+        """
+        Initialize the resolver.
+
+        Args:
+            spec: The complete OpenAPI specification
+            max_depth: Maximum number of nested $ref hops to expand
+            max_nodes: Maximum number of objects and arrays in one resolved schema
+        """
+        self.spec = spec
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        # (reference, depth) -> (resolved schema, number of objects and arrays in it)
+        self._cache: Dict[Tuple[str, int], Tuple[Dict[str, Any], int]] = {}
+        self._in_progress: Set[str] = set()
+        # Per component being expanded: whether its expansion depends on the current root
+        self._root_dependent: List[bool] = []
+        # Per component being expanded: the in-progress references its expansion cut short
+        self._cycle_hits: List[Set[str]] = []
+        # Root-dependent components already expanded under the current root
+        self._expanded_in_root: Set[str] = set()
+        self._nodes = 0
+
+    def resolve(self, schema: Any) -> Any:
+        """
+        Resolve all references in a schema.
+
+        Args:
+            schema: The schema object which might contain references
+
+        Returns:
+            The resolved schema
+        """
+        self._expanded_in_root = set()
+        self._nodes = 0
+        return self._resolve(schema, self.max_depth)
+
+    def _resolve(self, schema: Any, depth: int) -> Any:
+        if isinstance(schema, list):
+            self._nodes += 1
+            return [self._resolve(item, depth) if isinstance(item, dict) else item for item in schema]
+        if not isinstance(schema, dict):
+            return schema
+
+        if "$ref" in schema:
+            resolved = self._resolve_ref(schema["$ref"], depth)
+
+            # Merge any additional properties from the original reference
+            extras = {key: value for key, value in schema.items() if key != "$ref" and key not in resolved}
+            if extras:
+                resolved = {**resolved, **extras}
+            return resolved
+
+        self._nodes += 1
+        return {key: self._resolve(value, depth) for key, value in schema.items()}
+
+    def _placeholder(self, description: str) -> Dict[str, Any]:
+        self._nodes += 1
+        return {"type": "object", "description": description}
+
+    def _mark_root_dependent(self) -> None:
+        if self._root_dependent:
+            self._root_dependent[-1] = True
+
+    def _resolve_ref(self, ref: str, depth: int) -> Dict[str, Any]:
+        if not isinstance(ref, str) or not ref.startswith('#/'):
+            # External references not supported in this implementation
+            logger.warning(f"External reference not supported: {ref}")
+            return self._placeholder(f"External schema reference: {ref}. Check API documentation for details.")
+
+        if ref in self._in_progress:
+            # The reference points back at a schema we are still expanding
+            if self._cycle_hits:
+                self._cycle_hits[-1].add(ref)
+            return self._placeholder(f"Recursive schema reference: {ref}. Same structure as the enclosing {ref} schema.")
+
+        if depth <= 0:
+            return self._placeholder(f"Schema reference: {ref} (nesting limit reached). Check API documentation for details.")
+
+        cache_key = (ref, depth)
+        cached = self._cache.get(cache_key)
+        if cached is not None and self._nodes + cached[1] <= self.max_nodes:
+            self._nodes += cached[1]
+            return cached[0]
+
+        if ref in self._expanded_in_root:
+            # Expanded earlier under this root in a form that depends on where it was reached from
+            self._mark_root_dependent()
+            return self._placeholder(f"Schema reference: {ref}. Same structure as the {ref} schema above.")
+
+        if self._nodes >= self.max_nodes or cached is not None:
+            self._mark_root_dependent()
+            return self._placeholder(f"Schema reference: {ref} (size limit reached). Check API documentation for details.")
+
+        target = lookup_ref(self.spec, ref)
+        if target is None:
+            logger.warning(f"Could not resolve reference {ref}")
+            # If we can't resolve, return with a description of the reference
+            return self._placeholder(f"Schema reference: {ref}. Check API documentation for details.")
+
+        nodes_before = self._nodes
+        self._in_progress.add(ref)
+        self._cycle_hits.append(set())
+        self._root_dependent.append(False)
+        try:
+            resolved = self._resolve(target, depth - 1)
+        finally:
+            self._in_progress.discard(ref)
+            # Cycles back to this component are resolved the same wherever it is reached from;
+            # cycles to its ancestors are not, and make the ancestors' expansions path-dependent too
+            outer_hits = self._cycle_hits.pop() - {ref}
+            if self._cycle_hits:
+                self._cycle_hits[-1] |= outer_hits
+            root_dependent = self._root_dependent.pop() or bool(outer_hits)
+            if root_dependent:
+                self._mark_root_dependent()
+        if not isinstance(resolved, dict):
+            resolved = self._placeholder(f"Schema reference: {ref}.")
+
+        if root_dependent:
+            self._expanded_in_root.add(ref)
+        else:
+            self._cache[cache_key] = (resolved, self._nodes - nodes_before)
+        return resolved
+
+
+def schema_hash(schema: Any) -> str:
+    """
+    Content hash of a schema: sha256 of its canonical JSON form.
+
+    Args:
+        schema: Any JSON-serializable schema
+
+    Returns:
+        Hex digest used as the component_schemas primary key
+    """
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def lookup_ref(spec: Dict[str, Any], ref: str) -> Optional[Any]:
+    """
+    Follow a local reference such as "#/components/schemas/CreateSpeechRequest" inside a spec.
+
+    Returns:
+        The referenced object, or None if the reference is not local or cannot be found
+    """
+    if not isinstance(ref, str) or not ref.startswith('#/'):
+        return None
+    current: Any = spec
+    for part in ref[2:].split('/'):
+        # JSON pointer escapes
+        part = part.replace('~1', '/').replace('~0', '~')
+        if isinstance(current, dict) and part in current:
+            current = current[part]
+        else:
+            return None
+    return current
+
+
+def _iter_local_refs(schema: Any):
+    """Yield every local $ref string directly inside a schema (without following them)."""
+    stack = [schema]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if isinstance(ref, str) and ref.startswith('#/'):
+                yield ref
+            stack.extend(value for value in node.values() if isinstance(value, (dict, list)))
+        elif isinstance(node, list):
+            stack.extend(item for item in node if isinstance(item, (dict, list)))
+
+
+class ComponentCatalog:
+    """
+    Content-addressed view of the schemas of one OpenAPI spec, used to store each
+    schema once instead of inlining the expanded copy into every API request.
+
+    Schemas are kept unresolved (with their $refs). Every registered request body gets
+    a hash plus a map of every reference reachable from it to the referenced component's
+    hash, which is all that is needed to resolve it later.
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        """
+        Initialize the catalog.
+
+        Args:
+            spec: The complete OpenAPI specification
+        """
+        self.spec = spec
+        # hash -> component_schemas row
+        self.components: Dict[str, Dict[str, Any]] = {}
+        self._ref_hashes: Dict[str, Optional[str]] = {}
+        self._direct_refs: Dict[str, List[str]] = {}
+        self._pending: List[Dict[str, Any]] = []
+
+    def add_schema(self, schema: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
+        """
+        Register a schema (typically a request body).
+
+        Args:
+            schema: The unresolved schema
+
+        Returns:
+            Tuple of (hash of the stored schema, map of reachable reference -> component hash)
+        """
+        # A bare reference points straight at the shared component
+        if isinstance(schema, dict) and list(schema.keys()) == ["$ref"]:
+            body_hash = self._ref_hash(schema["$ref"])
+            if body_hash:
+                return body_hash, self._reachable_refs([schema["$ref"]])
+
+        body_hash = self._register(schema, None)
+        return body_hash, self._reachable_refs(list(_iter_local_refs(schema)))
+
+    def take_pending(self) -> List[Dict[str, Any]]:
+        """
+        Get the component rows registered since the last call.
+
+        Returns:
+            List of {"hash", "name", "definition"} rows for the component_schemas table
+        """
+        pending, self._pending = self._pending, []
+        return pending
+
+    def _register(self, definition: Any, name: Optional[str]) -> str:
+        digest = schema_hash(definition)
+        if digest not in self.components:
+            row = {"hash": digest, "name": name, "definition": definition}
+            self.components[digest] = row
+            self._pending.append(row)
+        return digest
+
+    def _ref_hash(self, ref: str) -> Optional[str]:
+        if ref not in self._ref_hashes:
+            target = lookup_ref(self.spec, ref)
+            if target is None:
+                logger.warning(f"Could not resolve reference {ref}")
+                self._ref_hashes[ref] = None
+            else:
+                self._ref_hashes[ref] = self._register(target, ref.rsplit('/', 1)[-1])
+                self._direct_refs[ref] = list(_iter_local_refs(target))
+        return self._ref_hashes[ref]
+
+    def _reachable_refs(self, refs: List[str]) -> Dict[str, str]:
+        reachable: Dict[str, str] = {}
+        pending = list(refs)
+        while pending:
+            ref = pending.pop()
+            if ref in reachable:
+                continue
+            digest = self._ref_hash(ref)
+            if digest is None:
+                continue
+            reachable[ref] = digest
+            pending.extend(self._direct_refs.get(ref, []))
+        return reachable
+
+
+# Resolved request body schemas, keyed by (body hash, reachable refs)
+RESOLVED_SCHEMA_CACHE_SIZE = int(os.environ.get("RESOLVED_SCHEMA_CACHE_SIZE", "512"))
+_resolved_schema_cache: "OrderedDict[Tuple[str, Tuple[Tuple[str, str], ...]], Optional[Dict[str, Any]]]" = OrderedDict()
+_resolved_schema_cache_lock = threading.Lock()
+
+
+def resolve_request_body_schema(api_request: Any, db: Optional[Session] = None) -> Optional[Dict[str, Any]]:
+    """
+    Get the fully resolved request body schema of an API request.
+
+    Requests imported before component storage keep an inline request_body_schema, which is
+    returned as-is. Otherwise the stored component schemas are loaded and resolved on first
+    use, and the result is cached for every request sharing the same body and references.
+
+    Args:
+        api_request: An ApiRequest (or an object with the same attributes)
+        db: Database session; defaults to the session the API request belongs to
+
+    Returns:
+        The resolved schema, or None if the request has no body schema
+    """
+    body_hash = getattr(api_request, "request_body_schema_hash", None)
+    if not body_hash:
+        return getattr(api_request, "request_body_schema", None)
+
+    schema_refs = getattr(api_request, "schema_refs", None) or {}
+    cache_key = (body_hash, tuple(sorted(schema_refs.items())))
+
+    with _resolved_schema_cache_lock:
+        if cache_key in _resolved_schema_cache:
+            _resolved_schema_cache.move_to_end(cache_key)
+            return _resolved_schema_cache[cache_key]
+
+    session = db
+    if session is None:
+        try:
+            session = object_session(api_request)
+        except UnmappedInstanceError:
+            session = None
+    if session is None:
+        logger.warning(f"No session available to load component schemas for API request {getattr(api_request, 'id', None)}")
+        return None
+
+    hashes = set(schema_refs.values())
+    hashes.add(body_hash)
+    definitions = {
+        row.hash: row.definition
+        for row in session.query(ComponentSchema.hash, ComponentSchema.definition).filter(ComponentSchema.hash.in_(hashes))
+    }
+
+    if body_hash not in definitions:
+        logger.warning(f"Component schema {body_hash} not found for API request {getattr(api_request, 'id', None)}")
+        return None
+
+    # Rebuild just enough of the original spec for the references to resolve
+    partial_spec: Dict[str, Any] = {}
+    for ref, digest in schema_refs.items():
+        if digest not in definitions:
+            continue
+        parts = [part.replace('~1', '/').replace('~0', '~') for part in ref[2:].split('/')]
+        node = partial_spec
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = definitions[digest]
+
+    resolved = SchemaRefResolver(partial_spec).resolve(definitions[body_hash])
+
+    with _resolved_schema_cache_lock:
+        _resolved_schema_cache[cache_key] = resolved
+        while len(_resolved_schema_cache) > RESOLVED_SCHEMA_CACHE_SIZE:
+            _resolved_schema_cache.popitem(last=False)
+
+    return resolved
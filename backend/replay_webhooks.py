@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Replay captured WuzAPI webhook traffic against a (staging) backend instance.
+
+Capture on the source instance by setting WEBHOOK_CAPTURE_PATH, then:
+
+    # Stub WuzAPI and OpenAI for the staging backend
+    python replay_webhooks.py stub --port 8090 --latency-ms 800
+
+    # Start the staging backend with WUZAPI_BASE_URL=http://<stub>:8090 and
+    # OPENAI_BASE_URL=http://<stub>:8090/v1, then replay at 4x speed
+    python replay_webhooks.py replay capture.jsonl --target http://staging:8000 --speed 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, List
+
+import httpx
+
+from webhook_recorder import read_capture
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEBHOOK_PATH = "/wuzapi_webhook"
+
+
+async def replay(
+    capture_path: str,
+    target: str,
+    speed: float = 1.0,
+    token: str = "",
+    webhook_path: str = DEFAULT_WEBHOOK_PATH,
+    max_in_flight: int = 200,
+    limit: int = 0
+) -> Dict[str, Any]:
+    """
+    Feed a capture file back to a backend, preserving the recorded inter-arrival times.
+
+    Requests are sent open-loop: a slow backend does not slow down the schedule,
+    it builds up in-flight requests instead. Beyond max_in_flight, events wait for a
+    free slot before a request is even created, and that wait counts in their latency.
+
+    Args:
+        capture_path: Path to the capture file
+        target: Base URL of the backend (e.g. http://staging:8000)
+        speed: Replay speed multiplier (1.0 = real time, 0 = as fast as possible)
+        token: Token to send instead of the recorded pseudonym (the staging WuzAPI user token)
+        webhook_path: Path of the webhook endpoint
+        max_in_flight: Maximum number of concurrent requests
+        limit: Stop after this many events (0 = all)
+
+    Returns:
+        Summary statistics of the replay
+    """
+    url = f"{target.rstrip('/')}{webhook_path}"
+    semaphore = asyncio.Semaphore(max_in_flight)
+    latencies: List[float] = []
+    status_counts: Dict[str, int] = {}
+    tasks = []
+
+    async def send(client: httpx.AsyncClient, entry: Dict[str, Any], started: float) -> None:
+        # Holds the slot acquired by the scheduling loop
+        try:
+            response = await client.post(url, data={
+                "jsonData": json.dumps(entry.get("event", {}), ensure_ascii=False),
+                "token": token or entry.get("token", "")
+            })
+            key = str(response.status_code)
+        except httpx.HTTPError as e:
+            key = type(e).__name__
+        finally:
+            semaphore.release()
+        latencies.append(time.monotonic() - started)
+        status_counts[key] = status_counts.get(key, 0) + 1
+
+    replay_started = time.monotonic()
+    first_event_time = None
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0, connect=10.0)) as client:
+        for index, entry in enumerate(read_capture(capture_path)):
+            if limit and index >= limit:
+                break
+
+            event_time = entry.get("t", 0.0)
+            if first_event_time is None:
+                first_event_time = event_time
+
+            # Wait until this event's (scaled) offset from the first event
+            started = time.monotonic()
+            if speed > 0:
+                due = (event_time - first_event_time) / speed
+                delay = due - (started - replay_started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                # Latency counts from the due time, so waiting for a free slot shows up in it
+                started = replay_started + due
+
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(send(client, entry, started)))
+
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    elapsed = time.monotonic() - replay_started
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    return {
+        "events": len(tasks),
+        "elapsed_seconds": round(elapsed, 2),
+        "events_per_second": round(len(tasks) / elapsed, 2) if elapsed > 0 else 0.0,
+        "status_counts": status_counts,
+        "latency_p50_ms": round(percentile(0.50) * 1000, 1),
+        "latency_p95_ms": round(percentile(0.95) * 1000, 1),
+        "latency_p99_ms": round(percentile(0.99) * 1000, 1),
+        "latency_max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0
+    }
+
+
+def create_stub_app(latency_ms: int = 0):
+    """
+    Create a stub for the outbound services of the backend (WuzAPI and the OpenAI Responses API).
+
+    Args:
+        latency_ms: Artificial latency added to every stubbed call
+
+    Returns:
+        A FastAPI application
+    """
+    from fastapi import FastAPI, Request
+
+    app = FastAPI(title="ChatWithOats outbound stub")
+
+    async def simulate_latency() -> None:
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+
+    @app.post("/chat/send/{kind}")
+    async def send(kind: str):
+        await simulate_latency()
+        return {"success": True, "data": {"Id": f"STUB{uuid.uuid4().hex[:16].upper()}"}}
+
+    @app.post("/chat/presence")
+    async def presence():
+        return {"success": True, "data": {}}
+
+    @app.post("/chat/react")
+    async def react():
+        return {"success": True, "data": {}}
+
+    @app.get("/group/info")
+    async def group_info(groupJID: str):
+        await simulate_latency()
+        return {"success": True, "data": {"Name": f"Group {groupJID[:6]}", "Participants": []}}
+
+    @app.post("/v1/responses")
+    async def responses(request: Request):
+        await simulate_latency()
+        body = await request.json()
+        return {
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": body.get("model", "stub"),
+            "status": "completed",
+            "parallel_tool_calls": True,
+            "tool_choice": body.get("tool_choice") or "auto",
+            "tools": [],
+            "output": [{
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex}",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": "Stub reply.", "annotations": []}]
+            }]
+        }
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay captured WuzAPI webhook traffic")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    replay_parser = subparsers.add_parser("replay", help="Replay a capture file against a backend")
+    replay_parser.add_argument("capture", help="Capture file written with WEBHOOK_CAPTURE_PATH")
+    replay_parser.add_argument("--target", default="http://localhost:8000", help="Backend base URL")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="Speed multiplier (0 = as fast as possible)")
+    replay_parser.add_argument("--token", default="", help="Token to send instead of the recorded pseudonym")
+    replay_parser.add_argument("--path", default=DEFAULT_WEBHOOK_PATH, help="Webhook path on the backend")
+    replay_parser.add_argument("--max-in-flight", type=int, default=200, help="Maximum concurrent requests")
+    replay_parser.add_argument("--limit", type=int, default=0, help="Only replay the first N events")
+
+    stub_parser = subparsers.add_parser("stub", help="Serve stubbed WuzAPI/OpenAI endpoints")
+    stub_parser.add_argument("--host", default="0.0.0.0")
+    stub_parser.add_argument("--port", type=int, default=8090)
+    stub_parser.add_argument("--latency-ms", type=int, default=0, help="Artificial latency per stubbed call")
+
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        summary = asyncio.run(replay(
+            args.capture,
+            args.target,
+            speed=args.speed,
+            token=args.token,
+            webhook_path=args.path,
+            max_in_flight=args.max_in_flight,
+            limit=args.limit
+        ))
+        print(json.dumps(summary, indent=2))
+    else:
+        import uvicorn
+        uvicorn.run(create_stub_app(args.latency_ms), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
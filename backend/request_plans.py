@@ -0,0 +1,363 @@
+import os
+import re
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, urlparse
+
+from openapi_schema import resolve_request_body_schema, lookup_ref
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Number of compiled request plans kept in memory
+REQUEST_PLAN_CACHE_SIZE = int(os.environ.get("REQUEST_PLAN_CACHE_SIZE", "1024"))
+
+# {name} placeholders of OpenAPI path templates
+PATH_TEMPLATE_PATTERN = re.compile(r"\{([^{}/]+)\}")
+
+# Argument locations
+PATH = "path"
+QUERY = "query"
+HEADER = "header"
+BODY = "body"
+
+# Methods that send a JSON body
+BODY_METHODS = {"POST", "PUT", "PATCH"}
+
+
+class RequestPlanError(ValueError):
+    """Raised when an API request cannot be compiled or a call is missing required arguments."""
+
+
+class RequestPlan(NamedTuple):
+    """Everything needed to turn model arguments into an HTTP request, computed once per tool."""
+    api_request_id: str
+    method: str
+    url_parts: Tuple[str, ...]  # URL literals at even indexes, path parameter names at odd ones
+    routes: Dict[str, Tuple[str, str]]  # Argument name -> (location, name on the wire)
+    headers: Dict[str, str]  # Configured headers, sent with every call
+    constant_path: Dict[str, Any]
+    constant_query: Dict[str, Any]
+    constant_headers: Dict[str, str]
+    constant_body: Dict[str, Any]
+    openai_auth: bool  # Inject the OpenAI API key
+
+
+class PreparedRequest(NamedTuple):
+    method: str
+    url: str
+    headers: Dict[str, Any]
+    params: Dict[str, Any]
+    body: Dict[str, Any]
+
+
+def normalize_parameters(parameters: List[Dict[str, Any]], spec: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Reduce OpenAPI parameter objects to what request plans and function schemas need.
+
+    Local references (#/components/parameters/...) are followed; later parameters with the
+    same name and location override earlier ones, as operation parameters override path ones.
+
+    Args:
+        parameters: OpenAPI parameter objects (path level first, then operation level)
+        spec: The specification, to follow $refs
+
+    Returns:
+        List of {"name", "in", "required"} plus "schema" and "description" when given
+    """
+    normalized: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+    for parameter in parameters:
+        parameter = _follow_ref(parameter, spec)
+        if not isinstance(parameter, dict) or not parameter.get("name") or parameter.get("in") not in (PATH, QUERY, HEADER):
+            continue
+        entry = {
+            "name": parameter["name"],
+            "in": parameter["in"],
+            "required": bool(parameter.get("required")) or parameter["in"] == PATH
+        }
+        schema = _follow_ref(parameter.get("schema"), spec)
+        if isinstance(schema, dict):
+            entry["schema"] = schema
+        if parameter.get("description"):
+            entry["description"] = parameter["description"]
+        normalized[(entry["name"], entry["in"])] = entry
+    return list(normalized.values())
+
+
+def _follow_ref(value: Any, spec: Optional[Dict[str, Any]]) -> Any:
+    # Parameters and their schemas may be references to components; follow chains of them
+    for _ in range(8):
+        if not isinstance(value, dict) or "$ref" not in value or spec is None:
+            break
+        target = lookup_ref(spec, value["$ref"])
+        if target is None:
+            break
+        value = target
+    return value
+
+
+def _hidden_arguments(api_request: Any) -> FrozenSet[str]:
+    # Arguments the model never sees: skipped ones and those with constant values
+    skipped = getattr(api_request, "skip_parameters", None) or []
+    constants = getattr(api_request, "constant_parameters", None) or {}
+    return frozenset(skipped) | frozenset(constants)
+
+
+def build_parameters_schema(api_request: Any, request_body_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Build the function parameters schema the model sees for an API request.
+
+    Path, query and header parameters are merged with the request body properties;
+    skip_parameters and constant_parameters are left out.
+
+    Args:
+        api_request: An ApiRequest (or a snapshot with the same attributes)
+        request_body_schema: The resolved body schema; resolved from the request if not given
+
+    Returns:
+        JSON Schema object for the parameters
+    """
+    if request_body_schema is None:
+        request_body_schema = resolve_request_body_schema(api_request)
+    hidden = _hidden_arguments(api_request)
+    properties: Dict[str, Any] = {}
+    required: List[str] = []
+
+    for parameter in getattr(api_request, "parameters", None) or []:
+        name = parameter["name"]
+        if name in hidden or name in properties:
+            continue
+        schema = dict(parameter.get("schema") or {"type": "string"})
+        if parameter.get("description") and "description" not in schema:
+            schema["description"] = parameter["description"]
+        properties[name] = schema
+        if parameter.get("required"):
+            required.append(name)
+
+    if isinstance(request_body_schema, dict):
+        for name, schema in (request_body_schema.get("properties") or {}).items():
+            if name not in hidden and name not in properties:
+                properties[name] = schema
+        for name in request_body_schema.get("required") or []:
+            if name in properties and name not in required:
+                required.append(name)
+
+    return {"type": "object", "properties": properties, "required": required}
+
+
+def _server_url(tool: Any, api_request: Any) -> str:
+    # The tool's configured server wins over the API's
+    config = tool.configuration or {}
+    server_url = config.get("server_url", "")
+
+    # Legacy: requests that stored a full URL
+    legacy_url = getattr(api_request, "url", None)
+    if not server_url and legacy_url:
+        try:
+            url_parts = urlparse(legacy_url)
+            server_url = f"{url_parts.scheme}://{url_parts.netloc}"
+        except Exception as e:
+            logger.warning(f"Failed to parse URL from API request: {e}")
+
+    api = getattr(api_request, "api", None)
+    if not server_url and api is not None and api.server:
+        server_url = api.server
+    return server_url
+
+
+def tool_signature(tool: Any) -> Tuple[Any, ...]:
+    """
+    Get what a tool's compiled plan and formatted schema depend on.
+
+    Args:
+        tool: A Tool (or ToolSnapshot), with its api_request loaded
+
+    Returns:
+        (tool ID, API request ID, tool updated_at, API request updated_at)
+    """
+    api_request = tool.api_request
+    return (tool.id, tool.api_request_id, tool.updated_at, api_request.updated_at if api_request is not None else None)
+
+
+def compile_request_plan(tool: Any) -> RequestPlan:
+    """
+    Compile the request plan of an API tool.
+
+    Args:
+        tool: A Tool (or ToolSnapshot) with its api_request loaded
+
+    Returns:
+        The plan
+
+    Raises:
+        RequestPlanError: If the tool has no API request or no valid URL
+    """
+    api_request = tool.api_request
+    if api_request is None:
+        raise RequestPlanError(f"No API request associated with tool {tool.id} ({tool.name})")
+
+    config = tool.configuration or {}
+    method = (api_request.method or "GET").upper()
+    server_url = _server_url(tool, api_request)
+    endpoint = api_request.path or ""
+    url_template = f"{server_url}{endpoint}" if server_url else endpoint
+    if not url_template:
+        raise RequestPlanError(f"Could not determine URL for API request {api_request.id}")
+    if not url_template.startswith(("http://", "https://")):
+        raise RequestPlanError(f"Invalid URL {url_template}. URL must start with http:// or https://")
+
+    # Route every argument the model may send; earlier locations win on name clashes
+    routes: Dict[str, Tuple[str, str]] = {}
+    url_parts = tuple(PATH_TEMPLATE_PATTERN.split(url_template))
+    for name in url_parts[1::2]:
+        routes.setdefault(name, (PATH, name))
+    parameters = getattr(api_request, "parameters", None) or []
+    for location in (PATH, QUERY, HEADER):
+        for parameter in parameters:
+            if parameter["in"] == location:
+                routes.setdefault(parameter["name"], (location, parameter["name"]))
+    for name in config.get("params") or {}:
+        routes.setdefault(name, (QUERY, name))
+    body_schemas = [resolve_request_body_schema(api_request), config.get("body_schema")]
+    for schema in body_schemas:
+        if isinstance(schema, dict):
+            for name in schema.get("properties") or {}:
+                routes.setdefault(name, (BODY, name))
+
+    constants: Dict[str, Dict[str, Any]] = {PATH: {}, QUERY: {}, HEADER: {}, BODY: {}}
+    default_location = BODY if method in BODY_METHODS else QUERY
+    for name, value in (getattr(api_request, "constant_parameters", None) or {}).items():
+        location, wire_name = routes.get(name, (default_location, name))
+        constants[location][wire_name] = str(value) if location == HEADER else value
+
+    hidden = _hidden_arguments(api_request)
+    routes = {name: route for name, route in routes.items() if name not in hidden}
+
+    headers = {str(name): str(value) for name, value in (config.get("headers") or {}).items()}
+    openai_auth = (urlparse(url_template).hostname or "").endswith("openai.com")
+
+    return RequestPlan(
+        api_request_id=api_request.id,
+        method=method,
+        url_parts=url_parts,
+        routes=routes,
+        headers=headers,
+        constant_path=constants[PATH],
+        constant_query=constants[QUERY],
+        constant_headers=constants[HEADER],
+        constant_body=constants[BODY],
+        openai_auth=openai_auth
+    )
+
+
+def apply_request_plan(plan: RequestPlan, arguments: Dict[str, Any], api_key: Optional[str] = None) -> PreparedRequest:
+    """
+    Turn model arguments into an HTTP request.
+
+    Args:
+        plan: The tool's compiled plan
+        arguments: Arguments provided by the model
+        api_key: OpenAI API key, injected into calls to api.openai.com
+
+    Returns:
+        The request to send
+
+    Raises:
+        RequestPlanError: If a path parameter has no value
+    """
+    headers: Dict[str, Any] = dict(plan.headers)
+    params: Dict[str, Any] = {}
+    body: Dict[str, Any] = {}
+    path_values = dict(plan.constant_path)
+
+    for name, value in arguments.items():
+        route = plan.routes.get(name)
+        if route is None:
+            continue
+        location, wire_name = route
+        if location == BODY:
+            body[wire_name] = value
+        elif location == QUERY:
+            params[wire_name] = value
+        elif location == HEADER:
+            headers[wire_name] = str(value)
+        else:
+            path_values[wire_name] = value
+
+    params.update(plan.constant_query)
+    headers.update(plan.constant_headers)
+    body.update(plan.constant_body)
+
+    url_parts = list(plan.url_parts)
+    missing = []
+    for index in range(1, len(url_parts), 2):
+        name = url_parts[index]
+        if name not in path_values:
+            missing.append(name)
+            continue
+        url_parts[index] = quote(str(path_values[name]), safe="")
+    if missing:
+        raise RequestPlanError(f"Missing path parameter(s): {', '.join(missing)}")
+
+    if plan.openai_auth and api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+        if plan.method in ("POST", "PUT"):
+            headers["Content-Type"] = "application/json"
+
+    return PreparedRequest(plan.method, "".join(url_parts), headers, params, body)
+
+
+class RequestPlanCache:
+    """
+    LRU cache of compiled request plans, keyed by tool.
+
+    A plan is recompiled when the tool or its API request is updated, or the tool is
+    linked to another API request (see tool_signature); nothing needs to be invalidated,
+    so every worker process picks up an edit on its next use of the tool.
+    """
+
+    def __init__(self, max_entries: int = REQUEST_PLAN_CACHE_SIZE):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached plans
+        """
+        self.max_entries = max_entries
+        # tool ID -> (tool_signature(tool), plan)
+        self._plans: "OrderedDict[str, Tuple[Tuple[Any, ...], RequestPlan]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tool: Any) -> RequestPlan:
+        """
+        Get the plan of an API tool, compiling it on first use.
+
+        Args:
+            tool: A Tool (or ToolSnapshot) with its api_request loaded
+
+        Returns:
+            The plan
+
+        Raises:
+            RequestPlanError: If the plan cannot be compiled
+        """
+        signature = tool_signature(tool)
+        with self._lock:
+            cached = self._plans.get(tool.id)
+            if cached is not None and cached[0] == signature:
+                self._plans.move_to_end(tool.id)
+                return cached[1]
+
+        plan = compile_request_plan(tool)
+        with self._lock:
+            self._plans[tool.id] = (signature, plan)
+            self._plans.move_to_end(tool.id)
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+        return plan
+
+
+# Shared cache used by the API tool executor
+request_plan_cache = RequestPlanCache()
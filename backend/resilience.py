@@ -0,0 +1,417 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Mapping, NamedTuple, Optional, TypeVar
+
+import httpx
+import openai
+
+from deadline import Deadline
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Attempts per outbound call, including the first
+OUTBOUND_MAX_ATTEMPTS = int(os.environ.get("OUTBOUND_MAX_ATTEMPTS", "3"))
+# Backoff before retry n is a random delay up to min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2**n)
+RETRY_BASE_DELAY_SECONDS = float(os.environ.get("RETRY_BASE_DELAY_SECONDS", "0.5"))
+RETRY_MAX_DELAY_SECONDS = float(os.environ.get("RETRY_MAX_DELAY_SECONDS", "8"))
+# Longest Retry-After honoured; upstreams asking for more fail right away
+RETRY_AFTER_MAX_SECONDS = float(os.environ.get("RETRY_AFTER_MAX_SECONDS", "30"))
+# Consecutive failures that open an upstream's circuit, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.environ.get("CIRCUIT_RESET_SECONDS", "30"))
+# Seconds before a slow idempotent tool call gets a second, parallel attempt (0 disables hedging)
+TOOL_HEDGE_DELAY_SECONDS = float(os.environ.get("TOOL_HEDGE_DELAY_SECONDS", "2"))
+
+# Upstream names of the fixed services; tool APIs use their host name
+OPENAI_UPSTREAM = "openai"
+WUZAPI_UPSTREAM = "wuzapi"
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+T = TypeVar("T")
+
+
+class RetryPolicy(NamedTuple):
+    max_attempts: int
+    retry_statuses: FrozenSet[int]
+    unsent_only: bool  # Only retry failures where the request cannot have been processed (not idempotent)
+
+
+class Outcome(NamedTuple):
+    """How an attempt went: whether to retry it and whether it counts against the circuit."""
+    retryable: bool
+    failure: bool
+    retry_after: Optional[float] = None
+
+
+SUCCESS = Outcome(retryable=False, failure=False)
+# Errors that say nothing about the upstream (e.g. the call was never made); compared by identity
+NOT_SENT = Outcome(retryable=False, failure=False)
+
+# Idempotent calls: any transient failure is retried
+IDEMPOTENT_POLICY = RetryPolicy(OUTBOUND_MAX_ATTEMPTS, frozenset({408, 429, 500, 502, 503, 504}), unsent_only=False)
+# Calls with side effects (sending a message, POSTing to a tool): only retried when the upstream
+# refused the request (connection failed, 429, 503), so nothing is done twice
+UNSAFE_POLICY = RetryPolicy(OUTBOUND_MAX_ATTEMPTS, frozenset({429, 503}), unsent_only=True)
+# Model calls have no side effects but cost tokens; a 500 is retried, a timeout is the turn deadline
+OPENAI_POLICY = RetryPolicy(OUTBOUND_MAX_ATTEMPTS, frozenset({429, 500, 502, 503, 504}), unsent_only=True)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, upstream: str, retry_in: float):
+        super().__init__(f"{upstream} is temporarily unavailable (circuit open, retrying in {retry_in:.0f}s)")
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Stops calls to an upstream after consecutive failures.
+
+    Closed: calls go through. After failure_threshold consecutive failures the circuit opens
+    and calls fail right away with CircuitOpenError. After reset_seconds one trial call is
+    let through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        upstream: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = CIRCUIT_RESET_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the breaker.
+
+        Args:
+            upstream: Name of the upstream, for errors and stats
+            failure_threshold: Consecutive failures that open the circuit
+            reset_seconds: Seconds the circuit stays open before a trial call
+            clock: Monotonic clock, in seconds
+        """
+        self.upstream = upstream
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        """closed, open or half_open."""
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        """
+        Check that a call may go out.
+
+        Raises:
+            CircuitOpenError: If the circuit is open (or half-open with its trial call in flight)
+        """
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                self._stats["calls"] += 1
+                return
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._stats["calls"] += 1
+                return
+            self._stats["rejected"] += 1
+            retry_in = max(self.reset_seconds - (self._clock() - self._opened_at), 0.0)
+        raise CircuitOpenError(self.upstream, retry_in)
+
+    def record_success(self) -> None:
+        """Close the circuit and reset the failure count."""
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"[Resilience] Circuit of {self.upstream} closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a failure, opening the circuit at the threshold (or after a failed trial call)."""
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            if self._trial_in_flight or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = self._clock()
+                self._stats["opened"] += 1
+                logger.warning(f"[Resilience] Circuit of {self.upstream} opened after {self._failures} consecutive failures")
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """Let another trial call through after one that ended without an outcome (e.g. cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the state and counters."""
+        with self._lock:
+            return {"state": self._state(), "consecutive_failures": self._failures, **self._stats}
+
+
+class CircuitBreakerRegistry:
+    """One circuit breaker per upstream, created on first use."""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, upstream: str) -> CircuitBreaker:
+        """Get the breaker of an upstream."""
+        with self._lock:
+            breaker = self._breakers.get(upstream)
+            if breaker is None:
+                breaker = self._breakers[upstream] = CircuitBreaker(upstream)
+            return breaker
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get the state and counters of every breaker."""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.upstream: breaker.stats() for breaker in breakers}
+
+
+def backoff_delay(attempt: int, rng: Callable[[float, float], float] = random.uniform) -> float:
+    """
+    Get the jittered ("full jitter") delay before a retry.
+
+    Args:
+        attempt: Number of attempts made so far (1 after the first)
+        rng: Random number source
+
+    Returns:
+        Seconds to wait
+    """
+    return rng(0, min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2 ** attempt))
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """
+    Read how long an upstream asked us to wait (retry-after-ms, or Retry-After in seconds or as an HTTP date).
+
+    Args:
+        headers: Response headers
+
+    Returns:
+        Seconds, or None if not given
+    """
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def status_outcome(status_code: int, headers: Optional[Mapping[str, str]], policy: RetryPolicy) -> Outcome:
+    """
+    Classify an HTTP response status.
+
+    Args:
+        status_code: The response status
+        headers: The response headers, for Retry-After
+        policy: The call's retry policy
+
+    Returns:
+        The outcome; 5xx responses count against the circuit, 4xx ones (including 429) do not
+    """
+    if status_code < 400:
+        return SUCCESS
+    return Outcome(
+        retryable=status_code in policy.retry_statuses,
+        failure=status_code >= 500,
+        retry_after=retry_after_seconds(headers)
+    )
+
+
+def exception_outcome(error: BaseException, policy: RetryPolicy) -> Outcome:
+    """
+    Classify the exception of a failed attempt.
+
+    Args:
+        error: The exception
+        policy: The call's retry policy
+
+    Returns:
+        The outcome; unknown exceptions (NOT_SENT) are neither retried nor counted for or against the circuit
+    """
+    if isinstance(error, openai.APITimeoutError):
+        # The timeout is the caller's deadline, retrying cannot help
+        return Outcome(retryable=False, failure=True)
+    if isinstance(error, openai.APIConnectionError):
+        return Outcome(retryable=True, failure=True)
+    if isinstance(error, openai.RateLimitError) and getattr(error, "code", None) == "insufficient_quota":
+        return Outcome(retryable=False, failure=False)
+    if isinstance(error, openai.APIStatusError):
+        return status_outcome(error.status_code, error.response.headers, policy)
+    if isinstance(error, httpx.HTTPStatusError):
+        return status_outcome(error.response.status_code, error.response.headers, policy)
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        # The request never reached the upstream
+        return Outcome(retryable=True, failure=True)
+    if isinstance(error, httpx.TransportError):
+        return Outcome(retryable=not policy.unsent_only, failure=True)
+    return NOT_SENT
+
+
+async def call_with_retries(
+    attempt: Callable[[], Awaitable[T]],
+    upstream: str,
+    policy: RetryPolicy,
+    deadline: Optional[Deadline] = None,
+    classify_result: Optional[Callable[[T], Outcome]] = None,
+    breakers: Optional[CircuitBreakerRegistry] = None
+) -> T:
+    """
+    Make an outbound call with bounded, jittered retries behind the upstream's circuit breaker.
+
+    Retries honour Retry-After (up to RETRY_AFTER_MAX_SECONDS) and never sleep past the deadline.
+
+    Args:
+        attempt: Makes one attempt; raises on failure or returns a result
+        upstream: Name of the upstream, selecting its circuit breaker
+        policy: What is retried and how often
+        deadline: The turn's deadline, if the call is part of one
+        classify_result: Classifies returned results (e.g. error responses returned rather than raised)
+        breakers: The breaker registry (the shared one if not given)
+
+    Returns:
+        The result of the last attempt
+
+    Raises:
+        CircuitOpenError: If the upstream's circuit is open
+        Exception: The error of the last attempt
+    """
+    breaker = (breakers or circuit_breakers).get(upstream)
+    attempts = 0
+    while True:
+        breaker.before_call()
+        attempts += 1
+        error: Optional[BaseException] = None
+        result: Any = None
+        try:
+            result = await attempt()
+            outcome = classify_result(result) if classify_result else SUCCESS
+        except asyncio.CancelledError:
+            # Cancelled by the caller (deadline or hedge): neither success nor failure of the upstream
+            breaker.release_trial()
+            raise
+        except Exception as e:
+            error = e
+            outcome = exception_outcome(e, policy)
+
+        if outcome.failure:
+            breaker.record_failure()
+        elif outcome is NOT_SENT:
+            breaker.release_trial()
+        else:
+            breaker.record_success()
+
+        if not outcome.retryable or attempts >= policy.max_attempts:
+            if error is not None:
+                raise error
+            return result
+
+        delay = backoff_delay(attempts)
+        if outcome.retry_after is not None:
+            if outcome.retry_after > RETRY_AFTER_MAX_SECONDS:
+                logger.warning(f"[Resilience] {upstream} asked to retry in {outcome.retry_after:.0f}s, giving up")
+                if error is not None:
+                    raise error
+                return result
+            delay = max(delay, outcome.retry_after)
+        if deadline is not None and delay >= deadline.remaining():
+            logger.warning(f"[Resilience] No time left to retry {upstream}")
+            if error is not None:
+                raise error
+            return result
+
+        logger.info(f"[Resilience] Retrying {upstream} in {delay:.2f}s (attempt {attempts + 1}/{policy.max_attempts}): {error or 'retryable response'}")
+        await asyncio.sleep(delay)
+
+
+async def hedged(call: Callable[[], Awaitable[T]], hedge_delay: float, max_hedges: int = 1) -> T:
+    """
+    Run an idempotent call, starting a parallel attempt if the first is slow.
+
+    The first attempt to finish wins and the others are cancelled. An attempt that fails
+    before the hedge delay also starts the next one right away.
+
+    Args:
+        call: Makes the call (must be safe to run more than once)
+        hedge_delay: Seconds to wait before starting another attempt
+        max_hedges: Most extra attempts
+
+    Returns:
+        The result of the first attempt that succeeded
+
+    Raises:
+        Exception: The first error, if every attempt failed
+    """
+    if hedge_delay <= 0:
+        return await call()
+
+    loop = asyncio.get_running_loop()
+    pending = {loop.create_task(call())}
+    launched = 1
+    first_error: Optional[BaseException] = None
+    try:
+        while pending:
+            can_hedge = launched <= max_hedges
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=hedge_delay if can_hedge else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                first_error = first_error or task.exception()
+            if can_hedge and (not done or not pending):
+                if not done:
+                    logger.info(f"[Resilience] No response after {hedge_delay:g}s, sending a hedged request")
+                pending.add(loop.create_task(call()))
+                launched += 1
+        raise first_error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+# Shared breakers of all outbound calls
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,105 @@
+import os
+import logging
+from typing import AsyncIterator, Optional, Tuple
+
+from media_store import sniff_mime_type
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Largest tool response body read, for API requests without their own max_response_bytes
+TOOL_RESPONSE_MAX_BYTES = int(os.environ.get("TOOL_RESPONSE_MAX_BYTES", str(2 * 1024 * 1024)))
+# Largest error body read for the error message
+TOOL_ERROR_BODY_MAX_BYTES = 64 * 1024
+
+TEXT_MIME_TYPES = {
+    "application/json",
+    "application/xml",
+    "application/javascript",
+    "application/x-www-form-urlencoded",
+    "application/x-ndjson",
+}
+
+# Declared types that are binary whatever their first bytes look like
+BINARY_MIME_PREFIXES = ("image/", "audio/", "video/")
+
+
+def max_response_bytes_for(configured: Optional[int]) -> int:
+    """Get the body size limit of an API request (its max_response_bytes or the default)."""
+    return configured if configured and configured > 0 else TOOL_RESPONSE_MAX_BYTES
+
+
+def is_text_mime_type(mime_type: str) -> bool:
+    """Whether a declared MIME type (without parameters) is textual."""
+    return (
+        mime_type.startswith("text/")
+        or mime_type in TEXT_MIME_TYPES
+        or mime_type.endswith(("+json", "+xml"))
+    )
+
+
+def looks_like_text(head: bytes) -> bool:
+    """Whether the first bytes of a body of unknown type look like text rather than a known binary format."""
+    return b"\x00" not in head and sniff_mime_type(head) == "application/octet-stream"
+
+
+def is_binary_body(mime_type: str, head: bytes) -> bool:
+    """
+    Decide from the declared type and the first bytes whether a body is binary.
+
+    Args:
+        mime_type: Declared MIME type without parameters (may be empty)
+        head: The first chunk of the body (ignored for declared text types)
+
+    Returns:
+        True for files (images, audio, PDFs, ...), False for text the model can read
+    """
+    if is_text_mime_type(mime_type):
+        return False
+    if mime_type.startswith(BINARY_MIME_PREFIXES):
+        return True
+    return not looks_like_text(head)
+
+
+async def peek(chunks: AsyncIterator[bytes]) -> Tuple[bytes, AsyncIterator[bytes]]:
+    """
+    Read the first chunk of a stream without losing it.
+
+    Args:
+        chunks: The body stream
+
+    Returns:
+        Tuple of (first chunk, stream still yielding every chunk including the first)
+    """
+    head = b""
+    async for head in chunks:
+        break
+
+    async def replay() -> AsyncIterator[bytes]:
+        if head:
+            yield head
+        async for chunk in chunks:
+            yield chunk
+
+    return head, replay()
+
+
+async def read_capped(chunks: AsyncIterator[bytes], max_bytes: int) -> Tuple[bytes, bool]:
+    """
+    Read a body stream up to max_bytes, leaving the rest unread.
+
+    Args:
+        chunks: The body stream
+        max_bytes: Most bytes kept
+
+    Returns:
+        Tuple of (the body or its first max_bytes, whether it was cut)
+    """
+    buffer = bytearray()
+    async for chunk in chunks:
+        room = max_bytes - len(buffer)
+        if len(chunk) > room:
+            buffer += chunk[:room]
+            return bytes(buffer), True
+        buffer += chunk
+    return bytes(buffer), False
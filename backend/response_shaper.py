@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Longest API tool result stored and sent back to the model, in characters
+TOOL_RESPONSE_MAX_CHARS = int(os.environ.get("TOOL_RESPONSE_MAX_CHARS", "8000"))
+
+# One step of a path: .name, ['name'], [3] or [*]
+PATH_TOKEN = re.compile(r"\.([A-Za-z_$@][\w$@-]*)|\[\s*'([^']*)'\s*\]|\[\s*\"([^\"]*)\"\s*\]|\[\s*(-?\d+)\s*\]|\[\s*\*\s*\]|\.\*")
+
+# Marker for values a path did not match
+_MISSING = object()
+
+
+def parse_path(path: str) -> Tuple[Any, ...]:
+    """
+    Parse a JSONPath-style expression such as "$.forecast.forecastday[*].day.maxtemp_c".
+
+    Supported steps are .name, ['name'], [index] (negative counts from the end) and
+    [*] / .* (every element). The leading "$" is optional.
+
+    Args:
+        path: The path expression
+
+    Returns:
+        Tuple of steps: strings (keys), ints (indexes) and None (wildcards)
+
+    Raises:
+        ValueError: If the expression cannot be parsed
+    """
+    expression = path.strip()
+    if expression.startswith("$"):
+        expression = expression[1:]
+    elif expression and not expression.startswith((".", "[")):
+        expression = "." + expression
+
+    steps: List[Any] = []
+    position = 0
+    while position < len(expression):
+        match = PATH_TOKEN.match(expression, position)
+        if not match:
+            raise ValueError(f"Invalid path {path!r} at position {position + 1}")
+        name, single_quoted, double_quoted, index = match.groups()
+        if name is not None:
+            steps.append(name)
+        elif single_quoted is not None:
+            steps.append(single_quoted)
+        elif double_quoted is not None:
+            steps.append(double_quoted)
+        elif index is not None:
+            steps.append(int(index))
+        else:
+            steps.append(None)
+        position = match.end()
+    return tuple(steps)
+
+
+def _select(value: Any, steps: Tuple[Any, ...]) -> Any:
+    for position, step in enumerate(steps):
+        if step is None:
+            items = value.values() if isinstance(value, dict) else value if isinstance(value, list) else None
+            if items is None:
+                return _MISSING
+            rest = steps[position + 1:]
+            # Nested wildcards flatten into one list, like JSONPath
+            flatten = None in rest
+            selected: List[Any] = []
+            for item in items:
+                value = _select(item, rest)
+                if value is _MISSING:
+                    continue
+                if flatten:
+                    selected.extend(value)
+                else:
+                    selected.append(value)
+            return selected
+        if isinstance(step, int):
+            if not isinstance(value, list) or not -len(value) <= step < len(value):
+                return _MISSING
+            value = value[step]
+        else:
+            if not isinstance(value, dict) or step not in value:
+                return _MISSING
+            value = value[step]
+    return value
+
+
+def project(data: Any, mapping: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Apply a response mapping: every output key gets the value selected by its path.
+
+    Keys whose path matches nothing are left out; invalid paths are logged and skipped.
+
+    Args:
+        data: The decoded JSON response
+        mapping: Output key -> path expression
+
+    Returns:
+        The projected object
+    """
+    projected: Dict[str, Any] = {}
+    for key, path in mapping.items():
+        try:
+            steps = parse_path(path)
+        except ValueError as e:
+            logger.warning(f"[Response Shaper] Skipping response mapping {key!r}: {e}")
+            continue
+        value = _select(data, steps)
+        if value is not _MISSING:
+            projected[key] = value
+    return projected
+
+
+def compact_json(value: Any) -> str:
+    """Serialize without whitespace, keeping non-ASCII text readable."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def cap_text(text: str, max_chars: int = TOOL_RESPONSE_MAX_CHARS) -> str:
+    """
+    Cut a text to max_chars, noting the original length.
+
+    Args:
+        text: The text to cap
+        max_chars: Maximum length of the result
+
+    Returns:
+        The text, or its beginning followed by a truncation note
+    """
+    if len(text) <= max_chars:
+        return text
+    note = f"... [truncated, {len(text)} characters in total]"
+    return text[:max(max_chars - len(note), 0)] + note
+
+
+def _fit_list(items: List[Any], max_chars: int) -> Optional[str]:
+    # Largest prefix of the list that fits, wrapped so the model knows items are missing
+    low, high = 0, len(items)
+    best = None
+    while low <= high:
+        middle = (low + high) // 2
+        candidate = compact_json({"items": items[:middle], "returned": middle, "total": len(items)})
+        if len(candidate) <= max_chars:
+            best = candidate
+            low = middle + 1
+        else:
+            high = middle - 1
+    return best
+
+
+def shape_json(data: Any, mapping: Optional[Dict[str, str]] = None, max_chars: int = TOOL_RESPONSE_MAX_CHARS) -> str:
+    """
+    Shape a decoded JSON response for the model: project it, compact it and cap its size.
+
+    Lists that are too long keep as many leading items as fit (at the top level, or under
+    the only key of an object). Anything else that is too long is cut with a note.
+
+    Args:
+        data: The decoded JSON response
+        mapping: Optional output key -> path expression projection (ApiToolConfig.response_mapping)
+        max_chars: Maximum length of the result
+
+    Returns:
+        Compact JSON (or a truncated prefix of it)
+    """
+    if mapping:
+        data = project(data, mapping)
+
+    text = compact_json(data)
+    if len(text) <= max_chars:
+        return text
+
+    items = data
+    if isinstance(data, dict) and len(data) == 1:
+        items = next(iter(data.values()))
+    if isinstance(items, list):
+        fitted = _fit_list(items, max_chars)
+        if fitted is not None:
+            logger.info(f"[Response Shaper] Kept a prefix of a {len(items)} item list to fit {max_chars} characters")
+            return fitted
+
+    logger.info(f"[Response Shaper] Truncating a {len(text)} character response to {max_chars}")
+    return cap_text(text, max_chars)
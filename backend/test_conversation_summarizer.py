@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import conversation_summarizer
+from conversation_summarizer import ConversationSummarizer, fold_summary, format_transcript, summarize_conversation, SUMMARY_MAX_CHARS
+from db import Base
+from models import MessageType, Message, ConversationSummary
+from turn_context import load_message_history, HISTORY_MAX_MESSAGES
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Row = namedtuple("Row", "type role sender_name content openai_function_name function_arguments function_result")
+
+# Sample data for tests
+def create_sample_messages():
+    return [
+        Row(MessageType.TEXT, "user", "Dana", "What's the weather in Haifa tomorrow?", None, None, None),
+        Row(MessageType.TOOL_CALL, "assistant", None, None, "api_weather_get", '{"q": "Haifa"}', None),
+        Row(MessageType.TOOL_RESULT, "tool", None, None, "api_weather_get", None, '{"temp_c": 24}'),
+        Row(MessageType.TEXT, "assistant", None, "Sunny, 24°C.", None, None, None),
+    ]
+
+def test_transcript_lists_messages_and_tool_calls():
+    """Test that the transcript names speakers and summarizes tool calls and results"""
+    transcript = format_transcript(create_sample_messages())
+
+    assert transcript.splitlines() == [
+        "Dana: What's the weather in Haifa tomorrow?",
+        '[Oats called api_weather_get({"q": "Haifa"})]',
+        '[api_weather_get returned: {"temp_c": 24}]',
+        "Oats: Sunny, 24°C.",
+    ]
+
+    logger.info(f"✓ Transcript formatted: {transcript}")
+
+def test_fold_passes_previous_summary_to_stub_model():
+    """Test that folding sends the current summary and the new messages to the model"""
+    requests = []
+
+    def stub_model(instructions, text):
+        requests.append(text)
+        return "  Dana asked about the weather in Haifa; it will be sunny.  "
+
+    summary = fold_summary("Dana is planning a trip.", create_sample_messages(), stub_model)
+
+    assert summary == "Dana asked about the weather in Haifa; it will be sunny."
+    assert requests[0].startswith("Current summary:\nDana is planning a trip.")
+    assert "Dana: What's the weather in Haifa tomorrow?" in requests[0]
+
+    logger.info("✓ Summary folded with stub model")
+
+def test_fold_caps_summary_length():
+    """Test that an overly long model answer is cut to SUMMARY_MAX_CHARS"""
+    summary = fold_summary(None, create_sample_messages(), lambda instructions, text: "x" * (SUMMARY_MAX_CHARS + 100))
+
+    assert len(summary) == SUMMARY_MAX_CHARS
+
+    logger.info("✓ Summary length capped")
+
+def test_messages_beyond_message_limit_are_folded():
+    """Test that short messages pushed out of the window by its message limit are folded, not lost"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Message.__table__, ConversationSummary.__table__])
+    db = sessionmaker(bind=engine)()
+    start = datetime(2026, 1, 1)
+    total = HISTORY_MAX_MESSAGES + 50
+    for i in range(total):
+        db.add(Message(
+            id=f"msg-{i:04d}", chatid="chat-1", type=MessageType.TEXT, role="user",
+            content=f"ok {i}", token_count=5, created_at=start + timedelta(seconds=i)
+        ))
+    db.commit()
+
+    summary = summarize_conversation(db, "chat-1", keep_tokens=6000, summarize=lambda instructions, text: "Short chat.")
+    window = load_message_history(db, "chat-1", token_budget=6000)
+
+    assert summary.message_count == total - HISTORY_MAX_MESSAGES
+    assert summary.last_message_id == f"msg-{total - HISTORY_MAX_MESSAGES - 1:04d}"
+    assert window[0].id == f"msg-{total - HISTORY_MAX_MESSAGES:04d}"
+
+    logger.info(f"✓ {summary.message_count} messages beyond the message limit folded")
+
+def test_schedule_runs_once_per_conversation(monkeypatch):
+    """Test that a second schedule for a conversation with a run in flight is skipped"""
+    runs = []
+
+    def fake_summarize_conversation(db, chat_id, keep_tokens, summarize):
+        runs.append((chat_id, keep_tokens))
+
+    class FakeSession:
+        def rollback(self):
+            pass
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(conversation_summarizer, "summarize_conversation", fake_summarize_conversation)
+    summarizer = ConversationSummarizer(session_factory=FakeSession)
+
+    async def schedule_twice():
+        first = summarizer.schedule("chat-1", 500)
+        second = summarizer.schedule("chat-1", 500)
+        await first
+        return second
+
+    assert asyncio.run(schedule_twice()) is None
+    assert runs == [("chat-1", 500)]
+
+    logger.info("✓ One background run per conversation")
+
+if __name__ == "__main__":
+    test_transcript_lists_messages_and_tool_calls()
+    test_fold_passes_previous_summary_to_stub_model()
+    test_fold_caps_summary_length()
+    test_messages_beyond_message_limit_are_folded()
+    logger.info("All tests passed!")
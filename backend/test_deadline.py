@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import logging
+from deadline import Deadline, DeadlineExceeded, TurnMetrics, partial_answer, default_turn_timeout, TOOLS, MODEL, PORTAL_TURN_TIMEOUT_SECONDS
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+def test_deadline_hands_out_remaining_time():
+    """Test that timeouts shrink as time passes and check() fails once the budget is used up"""
+    clock = FakeClock()
+    deadline = Deadline(10, clock=clock)
+
+    assert deadline.timeout() == 10
+    assert deadline.timeout(cap=4) == 4
+    clock.now += 7
+    assert deadline.timeout(cap=4) == 3
+    deadline.check(MODEL)
+
+    clock.now += 5
+    assert deadline.expired
+    assert deadline.timeout() == 0.001
+    try:
+        deadline.check(TOOLS)
+        assert False, "check should fail after the deadline"
+    except DeadlineExceeded as e:
+        assert e.stage == TOOLS
+
+    assert default_turn_timeout("PORTAL") == PORTAL_TURN_TIMEOUT_SECONDS
+
+    logger.info("✓ Deadline budget handed out")
+
+def test_partial_answers_and_metrics():
+    """Test the fallback text and the deadline counters"""
+    metrics = TurnMetrics()
+    for _ in range(4):
+        metrics.record_turn()
+    metrics.record_deadline_exceeded(TOOLS)
+    metrics.record_tool_call_cancelled()
+
+    stats = metrics.stats()
+    assert stats["deadline_exceeded"] == 1 and stats["tool_calls_cancelled"] == 1
+    assert stats["deadline_exceeded_by_stage"] == {TOOLS: 1}
+    assert stats["deadline_exceeded_rate"] == 0.25
+    answer = partial_answer(TOOLS, [("weather_lookup", "Sunny, 24°C"), ("web_page", "x" * 5000)])
+    assert "weather_lookup:\nSunny, 24°C" in answer
+    assert "truncated, 5000 characters" in answer and len(answer) < 1500
+    assert partial_answer("unknown") == partial_answer(MODEL)
+
+    logger.info("✓ Partial answers and metrics")
+
+if __name__ == "__main__":
+    test_deadline_hands_out_remaining_time()
+    test_partial_answers_and_metrics()
+    logger.info("All tests passed!")
@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 import json
 import logging
-from models import Tool, ToolType, ApiRequest, Api
+from models import Tool, ToolType, ApiRequest, Api, ChatSettings
 from openai_helper import OpenAIHelper
 import pytest
 from typing import Dict, Any, List
 import uuid
+from datetime import datetime
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -201,6 +202,42 @@ def test_mixed_tools():
     
     logger.info(f"✓ Multiple tool types correctly formatted")
 
+def test_tools_payload_cached_per_settings():
+    """Test that the tools payload of shared settings is built once and rebuilt when a tool changes"""
+    helper = OpenAIHelper("fake-api-key")
+    function_tool = create_sample_function_tool()
+    settings = ChatSettings(id=str(uuid.uuid4()), name="Template", system_prompt="", model="gpt-4o-mini", is_template=True)
+    settings.tools = [create_sample_web_search_tool(), function_tool]
+    
+    first = helper._get_tools_for_chat("chat-1", settings)
+    function_name = first[1]["name"]
+    
+    # Another settings overwrites the name mapping; a cache hit must restore it
+    helper._tool_name_to_id_map[function_name] = "other-tool"
+    second = helper._get_tools_for_chat("chat-2", settings)
+    
+    assert second is first
+    assert helper._get_tool_id_by_name(function_name) == function_tool.id
+    
+    function_tool.updated_at = datetime.utcnow()
+    third = helper._get_tools_for_chat("chat-3", settings)
+    
+    assert third is not first
+    assert third == first
+    
+    # Editing an API request rebuilds the payload with its new schema
+    api_tool = create_sample_api_linked_tool()
+    settings.tools = [api_tool]
+    before = helper._get_tools_for_chat("chat-4", settings)
+    api_tool.api_request.request_body_schema = {"type": "object", "properties": {"city": {"type": "string"}}}
+    api_tool.api_request.updated_at = datetime.utcnow()
+    after = helper._get_tools_for_chat("chat-4", settings)
+    
+    assert "city" in after[0]["parameters"]["properties"]
+    assert "city" not in before[0]["parameters"]["properties"]
+    
+    logger.info("✓ Tools payload cached per chat settings")
+
 if __name__ == "__main__":
     test_format_web_search_tool()
     test_format_function_tool()
@@ -208,4 +245,5 @@ if __name__ == "__main__":
     test_missing_params()
     test_api_linked_tool()
     test_mixed_tools()
+    test_tools_payload_cached_per_settings()
     logger.info("All tests passed!") 
\ No newline at end of file
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+import json
+import time
+import asyncio
+import logging
+from local_tools import LocalToolRegistry, LocalToolError, local_tools
+import builtin_local_tools  # Registers the built-in local tools
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def hang(seconds):
+    """Process tool that outlives its timeout (module-level, so the pool can import it)"""
+    time.sleep(seconds)
+    return "woke up"
+
+def test_builtin_tools_run_in_their_pools():
+    """Test that thread and process tools return JSON results and errors become LocalToolError"""
+    async def run():
+        converted = json.loads(await local_tools.run("convert_units", {"value": 5, "from_unit": "km", "to_unit": "mi"}))
+        assert abs(converted["result"] - 3.1068559612) < 1e-9
+
+        shifted = json.loads(await local_tools.run("date_calculator", {"start_date": "2024-02-27", "days": 3}))
+        assert shifted["date"] == "2024-03-01" and shifted["weekday"] == "Friday"
+
+        calculated = json.loads(await local_tools.run("calculate", {"expression": "(3 + 4) * 2 ** 3"}))
+        assert calculated["result"] == 56
+
+        for name, arguments in (
+            ("calculate", {"expression": "__import__('os')"}),
+            ("calculate", {"expression": "99 ** 9999"}),
+            ("calculate", {"expression": "(10 ** 10000) ** 10000"}),
+            ("calculate", {"expression": "factorial(9999)"}),
+            ("convert_units", {"value": 1, "from_unit": "kg", "to_unit": "km"}),
+            ("convert_units", {"value": 1, "unit": "kg"}),
+            ("missing_tool", {}),
+        ):
+            try:
+                await local_tools.run(name, arguments)
+                assert False, f"{name} should have failed"
+            except LocalToolError as e:
+                logger.info(f"Expected error: {e}")
+
+    try:
+        asyncio.run(run())
+    finally:
+        local_tools.shutdown()
+
+    logger.info("✓ Built-in tools run")
+
+def test_timeouts_and_concurrency_limits():
+    """Test that slow calls time out and calls beyond max_concurrency wait for a slot"""
+    registry = LocalToolRegistry(thread_workers=4)
+    running = {"now": 0, "peak": 0}
+
+    @registry.register("slow", "Sleeps", timeout_seconds=0.2)
+    def slow():
+        time.sleep(1)
+
+    @registry.register("limited", "Counts concurrent calls", max_concurrency=2)
+    async def limited():
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.05)
+        running["now"] -= 1
+        return "done"
+
+    @registry.register("circular", "Returns a value that cannot be formatted as JSON")
+    def circular():
+        value = []
+        value.append(value)
+        return value
+
+    async def run():
+        # Results that cannot be formatted fail like any other tool error
+        try:
+            await registry.run("circular", {})
+            assert False, "circular should have failed"
+        except LocalToolError as e:
+            assert "circular failed" in str(e)
+
+        started = time.monotonic()
+        try:
+            await registry.run("slow", {})
+            assert False, "slow should have timed out"
+        except LocalToolError as e:
+            assert "timed out" in str(e)
+        assert time.monotonic() - started < 0.9
+
+        results = await asyncio.gather(*(registry.run("limited", {}) for _ in range(6)))
+        assert results == ["done"] * 6
+        assert running["peak"] == 2
+
+    try:
+        asyncio.run(run())
+    finally:
+        registry.shutdown()
+    assert registry.get("limited").executor == "async"
+
+    logger.info("✓ Timeouts and concurrency limits enforced")
+
+def test_timed_out_calls_keep_their_slot():
+    """Test that a timed out thread call holds its slot until it ends and a hung process call is killed"""
+    registry = LocalToolRegistry(thread_workers=4, process_workers=1)
+    starts = []
+
+    @registry.register("stuck", "Sleeps past its timeout", timeout_seconds=0.1, max_concurrency=1)
+    def stuck():
+        starts.append(time.monotonic())
+        time.sleep(0.5)
+
+    registry.register("hang", "Hangs in a pool process", executor="process", timeout_seconds=5, max_concurrency=1)(hang)
+
+    async def run():
+        for _ in range(2):
+            try:
+                await registry.run("stuck", {})
+                assert False, "stuck should have timed out"
+            except LocalToolError as e:
+                assert "timed out" in str(e)
+        # The second call only started once the first worker had finished
+        assert starts[1] - starts[0] >= 0.45
+
+        started = time.monotonic()
+        try:
+            await registry.run("hang", {"seconds": 60})
+            assert False, "hang should have timed out"
+        except LocalToolError as e:
+            assert "timed out" in str(e)
+        # The hung process was killed: its slot is free and a new pool serves the next call
+        assert await asyncio.wait_for(registry.run("hang", {"seconds": 0}), timeout=10) == "woke up"
+        assert time.monotonic() - started < 20
+
+    try:
+        asyncio.run(run())
+    finally:
+        registry.shutdown()
+
+    logger.info("✓ Slots held until timed out calls end")
+
+if __name__ == "__main__":
+    test_builtin_tools_run_in_their_pools()
+    test_timeouts_and_concurrency_limits()
+    test_timed_out_calls_keep_their_slot()
+    logger.info("All tests passed!")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+import os
+import time
+import base64
+import asyncio
+import logging
+import pytest
+from media_store import MediaStore, MediaTooLargeError, offload_binary_fields, find_media_refs, sniff_mime_type
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sample data for tests
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 40
+
+def test_store_dedupes_by_content(tmp_path):
+    """Test that identical content is stored once and resolves to one file"""
+    store = MediaStore(str(tmp_path))
+
+    first = store.put_bytes(PNG_BYTES)
+    second = store.put_bytes(PNG_BYTES, "image/png")
+
+    assert first == second and first.endswith(".png")
+    path = store.resolve(first)
+    with open(path, "rb") as f:
+        assert f.read() == PNG_BYTES
+    assert sum(len(files) for _, _, files in os.walk(tmp_path)) == 1
+
+    logger.info(f"✓ Stored once as {first}")
+
+def test_offload_replaces_base64_fields(tmp_path):
+    """Test that base64 blobs and data URIs are replaced by media references"""
+    store = MediaStore(str(tmp_path))
+    encoded = base64.b64encode(PNG_BYTES).decode("ascii")
+    response = {
+        "created": 1700000000,
+        "data": [{"b64_json": encoded, "revised_prompt": "A cat"}],
+        "preview": f"data:image/png;base64,{encoded}"
+    }
+
+    offloaded = offload_binary_fields(response, store, min_chars=1000)
+
+    ref = offloaded["data"][0]["b64_json"]
+    assert ref.startswith("media://") and offloaded["preview"] == ref
+    assert offloaded["data"][0]["revised_prompt"] == "A cat"
+    assert response["data"][0]["b64_json"] == encoded  # the original is not modified
+    assert find_media_refs(f"Result: {offloaded}") == [ref]
+
+    logger.info(f"✓ Offloaded to {ref}")
+
+def test_short_and_non_base64_strings_are_kept(tmp_path):
+    """Test that ordinary text is never offloaded"""
+    store = MediaStore(str(tmp_path))
+    response = {"text": "word " * 2000, "id": "abc123"}
+
+    assert offload_binary_fields(response, store, min_chars=1000) is response
+
+    logger.info("✓ Text kept")
+
+async def _chunks(data, size=1000):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+def test_stream_is_hashed_and_deduped(tmp_path):
+    """Test that a streamed file gets the same reference as the same bytes stored at once"""
+    store = MediaStore(str(tmp_path))
+    audio = b"ID3\x04\x00" + bytes(range(256)) * 20
+
+    streamed = asyncio.run(store.put_stream(_chunks(audio)))
+    again = asyncio.run(store.put_stream(_chunks(audio, 7), "audio/mpeg"))
+
+    assert streamed == again == store.put_bytes(audio) and streamed.endswith(".mp3")
+    with open(store.resolve(streamed), "rb") as f:
+        assert f.read() == audio
+    assert store.usage()["files"] == 1  # no temporary files left behind
+
+    logger.info(f"✓ Streamed once as {streamed}")
+
+def test_oversized_stream_is_rejected(tmp_path):
+    """Test that a stream over the per-file limit raises and stores nothing"""
+    store = MediaStore(str(tmp_path), max_file_bytes=1500)
+
+    with pytest.raises(MediaTooLargeError):
+        asyncio.run(store.put_stream(_chunks(PNG_BYTES)))
+
+    assert store.usage()["files"] == 0
+
+    logger.info("✓ Oversized stream rejected")
+
+def test_eviction_by_size_and_age(tmp_path):
+    """Test that the least recently used file goes when over quota and unused files expire"""
+    store = MediaStore(str(tmp_path), max_bytes=2 * len(PNG_BYTES) + 10, max_age_seconds=3600)
+    first = store.put_bytes(PNG_BYTES)
+    second = store.put_bytes(PNG_BYTES + b"2")
+    past = time.time() - 60
+    os.utime(store.resolve(second), (past, past))
+    store.resolve(first)  # first is now the most recently used
+
+    third = store.put_bytes(PNG_BYTES + b"3")
+
+    assert store.resolve(second) is None
+    assert store.resolve(first) and store.resolve(third)
+
+    expired = time.time() - 7200
+    os.utime(store.resolve(first), (expired, expired))
+    assert store.evict() == 1
+    assert store.resolve(first) is None and store.resolve(third)
+
+    logger.info(f"✓ Evicted by size and age: {store.usage()}")
+
+def test_sniff_mime_type():
+    """Test content sniffing of common formats"""
+    assert sniff_mime_type(PNG_BYTES[:16]) == "image/png"
+    assert sniff_mime_type(b"ID3\x04\x00") == "audio/mpeg"
+    assert sniff_mime_type(b"%PDF-1.7") == "application/pdf"
+    assert sniff_mime_type(b"plain text") == "application/octet-stream"
+
+    logger.info("✓ MIME types sniffed")
+
+if __name__ == "__main__":
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        test_store_dedupes_by_content(directory)
+    with tempfile.TemporaryDirectory() as directory:
+        test_offload_replaces_base64_fields(directory)
+    with tempfile.TemporaryDirectory() as directory:
+        test_short_and_non_base64_strings_are_kept(directory)
+    with tempfile.TemporaryDirectory() as directory:
+        test_stream_is_hashed_and_deduped(directory)
+    with tempfile.TemporaryDirectory() as directory:
+        test_oversized_stream_is_rejected(directory)
+    with tempfile.TemporaryDirectory() as directory:
+        test_eviction_by_size_and_age(directory)
+    test_sniff_mime_type()
+    logger.info("All tests passed!")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+from openai_limiter import (
+    KeySlot, OpenAIRateLimiter, RateLimitQueueTimeout, parse_api_keys, parse_reset_duration,
+    PRIORITY_FOLLOW_UP, PRIORITY_TURN, PRIORITY_BACKGROUND, OPENAI_INITIAL_CONCURRENCY
+)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+def quota_headers(remaining_requests, remaining_tokens, limit_requests=100, limit_tokens=10000):
+    return {
+        "x-ratelimit-limit-requests": str(limit_requests),
+        "x-ratelimit-remaining-requests": str(remaining_requests),
+        "x-ratelimit-reset-requests": "6m0s",
+        "x-ratelimit-limit-tokens": str(limit_tokens),
+        "x-ratelimit-remaining-tokens": str(remaining_tokens),
+        "x-ratelimit-reset-tokens": "120ms",
+    }
+
+def test_parsing():
+    """Test the key pool and reset duration formats"""
+    assert parse_api_keys("sk-a, sk-b:proj_1,", "sk-default") == [("sk-a", None), ("sk-b", "proj_1")]
+    assert parse_api_keys("", "sk-default") == [("sk-default", None)]
+    assert parse_reset_duration("6m0s") == 360
+    assert parse_reset_duration("1.5s") == 1.5
+    assert abs(parse_reset_duration("120ms") - 0.12) < 1e-9
+    assert parse_reset_duration(None) is None
+
+    logger.info("✓ Keys and durations parsed")
+
+def test_limit_tracks_quota():
+    """Test additive increase with room, multiplicative decrease when low or rate limited"""
+    clock = FakeClock()
+    slot = KeySlot(client=None, label="sk-a...", clock=clock)
+    start = slot.limit
+
+    for _ in range(OPENAI_INITIAL_CONCURRENCY):
+        slot.observe(quota_headers(90, 9000), 200)
+    assert start + 0.9 < slot.limit < start + 1.1
+
+    # Remaining requests cap the in-flight calls until the window resets
+    slot.observe(quota_headers(2, 9000), 200)
+    assert slot.capacity() == 2
+    clock.now += 360
+    assert slot.capacity() == int(slot.limit)
+
+    grown = slot.limit
+    slot.observe(quota_headers(50, 500), 200)
+    assert slot.limit == grown * 0.75
+
+    slot.observe({"retry-after": "2"}, 429)
+    assert slot.limit == grown * 0.75 * 0.5
+    assert slot.capacity() == 0
+    clock.now += 2
+    assert slot.capacity() >= 1
+    assert slot.stats()["rate_limited"] == 1
+
+    logger.info("✓ Concurrency limit tracked the quota")
+
+def test_queue_serves_by_priority_across_keys():
+    """Test that calls wait for capacity instead of failing, served by priority on whichever key frees up"""
+    clock = FakeClock()
+    limiter = OpenAIRateLimiter([("client-a", "a"), ("client-b", "b")], clock=clock)
+    for slot in limiter.slots:
+        slot.limit = 1
+
+    async def run():
+        first = await limiter.acquire(PRIORITY_TURN)
+        second = await limiter.acquire(PRIORITY_TURN)
+        assert {first.label, second.label} == {"a", "b"}
+
+        served = []
+
+        async def waiter(name, priority):
+            slot = await limiter.acquire(priority)
+            served.append(name)
+            limiter.release(slot)
+
+        tasks = [
+            asyncio.ensure_future(waiter("summary", PRIORITY_BACKGROUND)),
+            asyncio.ensure_future(waiter("new turn", PRIORITY_TURN)),
+            asyncio.ensure_future(waiter("follow-up", PRIORITY_FOLLOW_UP)),
+        ]
+        await asyncio.sleep(0)
+        assert limiter.stats()["queue_length"] == 3
+
+        try:
+            await limiter.acquire(PRIORITY_TURN, timeout=0.01)
+            assert False, "no capacity should be free"
+        except RateLimitQueueTimeout:
+            pass
+
+        limiter.release(first)
+        await asyncio.gather(*tasks)
+        limiter.release(second)
+        return served
+
+    assert asyncio.run(run()) == ["follow-up", "new turn", "summary"]
+    stats = limiter.stats()
+    assert stats["queue_length"] == 0 and stats["queue_timeouts"] == 1
+    assert all(key["in_flight"] == 0 for key in stats["keys"].values())
+
+    logger.info("✓ Queue served by priority")
+
+if __name__ == "__main__":
+    test_parsing()
+    test_limit_tracks_quota()
+    test_queue_serves_by_priority_across_keys()
+    logger.info("All tests passed!")
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+import json
+import logging
+from openapi_schema import SchemaRefResolver, ComponentCatalog, schema_hash, resolve_request_body_schema
+from models import ApiRequest
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sample data for tests
+def create_sample_spec():
+    return {
+        "openapi": "3.0.0",
+        "components": {
+            "schemas": {
+                "Location": {
+                    "type": "object",
+                    "properties": {
+                        "city": {"type": "string"},
+                        "country": {"type": "string"}
+                    }
+                },
+                "Forecast": {
+                    "type": "object",
+                    "properties": {
+                        "location": {"$ref": "#/components/schemas/Location"},
+                        "origin": {"$ref": "#/components/schemas/Location"}
+                    }
+                },
+                "TreeNode": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string"},
+                        "children": {
+                            "type": "array",
+                            "items": {"$ref": "#/components/schemas/TreeNode"}
+                        }
+                    }
+                },
+                "Level1": {"type": "object", "properties": {"next": {"$ref": "#/components/schemas/Level2"}}},
+                "Level2": {"type": "object", "properties": {"next": {"$ref": "#/components/schemas/Level3"}}},
+                "Level3": {"type": "object", "properties": {"value": {"type": "string"}}}
+            }
+        }
+    }
+
+def test_resolves_nested_references():
+    """Test that nested references are fully resolved"""
+    resolver = SchemaRefResolver(create_sample_spec())
+
+    resolved = resolver.resolve({"$ref": "#/components/schemas/Forecast"})
+
+    assert resolved["properties"]["location"]["properties"]["city"] == {"type": "string"}
+    assert "$ref" not in json.dumps(resolved)
+
+    logger.info(f"✓ Nested references resolved: {json.dumps(resolved)}")
+
+def test_components_are_resolved_once():
+    """Test that a component referenced several times is resolved once and shared"""
+    resolver = SchemaRefResolver(create_sample_spec())
+
+    first = resolver.resolve({"$ref": "#/components/schemas/Forecast"})
+    second = resolver.resolve({"$ref": "#/components/schemas/Forecast"})
+
+    assert first is second
+    assert first["properties"]["location"] is first["properties"]["origin"]
+
+    logger.info("✓ Repeated references share one resolved schema")
+
+def test_self_reference_gets_placeholder():
+    """Test that a self-referential schema terminates with a placeholder instead of recursing"""
+    resolver = SchemaRefResolver(create_sample_spec())
+
+    resolved = resolver.resolve({"$ref": "#/components/schemas/TreeNode"})
+
+    items = resolved["properties"]["children"]["items"]
+    assert items["type"] == "object"
+    assert "Recursive schema reference" in items["description"]
+
+    logger.info(f"✓ Self-referential schema resolved with placeholder: {json.dumps(resolved)}")
+
+def test_mutual_cycle_does_not_depend_on_resolution_order():
+    """Test that resolving A -> B -> A first does not leave B cached with A's placeholder"""
+    spec = {"components": {"schemas": {
+        "A": {"type": "object", "properties": {"b": {"$ref": "#/components/schemas/B"}}},
+        "B": {"type": "object", "properties": {"a": {"$ref": "#/components/schemas/A"}}},
+        "C": {"type": "object", "properties": {"b": {"$ref": "#/components/schemas/B"}}},
+    }}}
+    resolver = SchemaRefResolver(spec)
+
+    resolver.resolve({"$ref": "#/components/schemas/A"})
+    after_a = resolver.resolve({"$ref": "#/components/schemas/C"})
+    fresh = SchemaRefResolver(spec).resolve({"$ref": "#/components/schemas/C"})
+
+    assert after_a == fresh
+    # B reached from C expands A, whose reference back to B is the placeholder
+    nested_b = after_a["properties"]["b"]["properties"]["a"]["properties"]["b"]
+    assert nested_b["description"].startswith("Recursive schema reference: #/components/schemas/B")
+
+    logger.info("✓ Mutual cycle resolved independently of order")
+
+def create_dense_spec(count):
+    """Spec whose components each reference all the others"""
+    names = [f"Node{i}" for i in range(count)]
+    return {"components": {"schemas": {
+        name: {
+            "type": "object",
+            "properties": {other.lower(): {"$ref": f"#/components/schemas/{other}"} for other in names if other != name}
+        }
+        for name in names
+    }}}
+
+def test_densely_linked_components_stay_bounded():
+    """Test that components referencing each other are expanded once per root instead of exponentially"""
+    resolver = SchemaRefResolver(create_dense_spec(12))
+
+    sizes = [len(json.dumps(resolver.resolve({"$ref": f"#/components/schemas/Node{i}"}))) for i in range(12)]
+    fresh = SchemaRefResolver(create_dense_spec(12)).resolve({"$ref": "#/components/schemas/Node5"})
+
+    assert max(sizes) < 50000
+    assert len(json.dumps(fresh)) == sizes[5]
+    assert "Same structure as the #/components/schemas/" in json.dumps(fresh)
+
+    logger.info(f"✓ Densely linked spec resolved with at most {max(sizes)} bytes per schema")
+
+def test_node_budget_limits_expansion():
+    """Test that a resolved schema stops expanding references once the node budget is spent"""
+    schemas = {f"Level{i}": {"type": "object", "properties": {
+        "left": {"$ref": f"#/components/schemas/Level{i + 1}"},
+        "right": {"$ref": f"#/components/schemas/Level{i + 1}"}
+    }} for i in range(9)}
+    schemas["Level9"] = {"type": "object", "properties": {"value": {"type": "string"}}}
+    resolver = SchemaRefResolver({"components": {"schemas": schemas}}, max_nodes=200)
+
+    resolved = json.dumps(resolver.resolve({"$ref": "#/components/schemas/Level0"}))
+
+    assert "size limit reached" in resolved
+    assert resolved.count('"type": "object"') < 300
+
+    logger.info("✓ Expansion stops at the node budget")
+
+def test_max_depth_limits_expansion():
+    """Test that references nested deeper than max_depth become placeholders"""
+    resolver = SchemaRefResolver(create_sample_spec(), max_depth=2)
+
+    resolved = resolver.resolve({"$ref": "#/components/schemas/Level1"})
+
+    level2 = resolved["properties"]["next"]
+    assert "nesting limit reached" in level2["properties"]["next"]["description"]
+
+    logger.info("✓ Expansion stops at max_depth")
+
+def test_unresolvable_and_external_references():
+    """Test that missing and external references become descriptive placeholders"""
+    resolver = SchemaRefResolver(create_sample_spec())
+
+    missing = resolver.resolve({"$ref": "#/components/schemas/Missing"})
+    external = resolver.resolve({"$ref": "https://example.com/schemas/Thing.json"})
+
+    assert missing["type"] == "object" and "#/components/schemas/Missing" in missing["description"]
+    assert external["type"] == "object" and "External schema reference" in external["description"]
+
+    logger.info("✓ Missing and external references handled")
+
+def test_sibling_keys_are_merged():
+    """Test that keys next to a $ref are kept without modifying the shared resolved component"""
+    resolver = SchemaRefResolver(create_sample_spec())
+
+    described = resolver.resolve({"$ref": "#/components/schemas/Location", "description": "Where"})
+    plain = resolver.resolve({"$ref": "#/components/schemas/Location"})
+
+    assert described["description"] == "Where"
+    assert "description" not in plain
+
+    logger.info("✓ Sibling keys merged into a copy")
+
+def test_catalog_stores_shared_components_once():
+    """Test that request bodies referencing the same component share one stored schema"""
+    spec = create_sample_spec()
+    catalog = ComponentCatalog(spec)
+
+    first_hash, first_refs = catalog.add_schema({"$ref": "#/components/schemas/Forecast"})
+    second_hash, second_refs = catalog.add_schema({"$ref": "#/components/schemas/Forecast"})
+    inline_hash, inline_refs = catalog.add_schema({"type": "object", "properties": {"at": {"$ref": "#/components/schemas/Location"}}})
+
+    assert first_hash == second_hash == schema_hash(spec["components"]["schemas"]["Forecast"])
+    assert set(first_refs) == {"#/components/schemas/Forecast", "#/components/schemas/Location"}
+    assert list(inline_refs) == ["#/components/schemas/Location"]
+    assert inline_hash != first_hash
+    # Forecast, Location and the inline body
+    assert len(catalog.take_pending()) == 3
+    assert catalog.take_pending() == []
+
+    logger.info("✓ Shared components stored once")
+
+def test_catalog_handles_cycles_and_missing_refs():
+    """Test that reachable references terminate on cycles and skip unresolvable references"""
+    catalog = ComponentCatalog(create_sample_spec())
+
+    _, tree_refs = catalog.add_schema({"$ref": "#/components/schemas/TreeNode"})
+    _, missing_refs = catalog.add_schema({"type": "array", "items": {"$ref": "#/components/schemas/Missing"}})
+
+    assert list(tree_refs) == ["#/components/schemas/TreeNode"]
+    assert missing_refs == {}
+
+    logger.info("✓ Cycles and missing references handled")
+
+def test_legacy_inline_schema_is_returned_as_is():
+    """Test that API requests imported before component storage keep using their inline schema"""
+    inline = {"type": "object", "properties": {"city": {"type": "string"}}}
+    api_request = ApiRequest(id="legacy", path="/weather", method="POST", request_body_schema=inline)
+
+    assert resolve_request_body_schema(api_request) is inline
+
+    logger.info("✓ Legacy inline schema used")
+
+if __name__ == "__main__":
+    test_resolves_nested_references()
+    test_components_are_resolved_once()
+    test_self_reference_gets_placeholder()
+    test_mutual_cycle_does_not_depend_on_resolution_order()
+    test_densely_linked_components_stay_bounded()
+    test_node_budget_limits_expansion()
+    test_max_depth_limits_expansion()
+    test_unresolvable_and_external_references()
+    test_sibling_keys_are_merged()
+    test_catalog_stores_shared_components_once()
+    test_catalog_handles_cycles_and_missing_refs()
+    test_legacy_inline_schema_is_returned_as_is()
+    logger.info("All tests passed!")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import logging
+import pytest
+from types import SimpleNamespace
+from request_plans import (
+    RequestPlanCache, RequestPlanError, apply_request_plan, build_parameters_schema,
+    compile_request_plan, normalize_parameters
+)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sample data for tests
+def create_sample_tool(**api_request_fields):
+    api_request = SimpleNamespace(
+        id="req-1",
+        path="/v1/users/{user_id}/notes",
+        method="post",
+        request_body_schema={"type": "object", "properties": {"text": {"type": "string"}, "lang": {"type": "string"}}, "required": ["text"]},
+        parameters=[
+            {"name": "user_id", "in": "path", "required": True, "schema": {"type": "integer"}},
+            {"name": "notify", "in": "query", "required": False, "schema": {"type": "boolean"}},
+            {"name": "X-Trace", "in": "header", "required": False},
+        ],
+        skip_parameters=None,
+        constant_parameters=None,
+        updated_at=None,
+        api=SimpleNamespace(server="https://notes.example.com")
+    )
+    for name, value in api_request_fields.items():
+        setattr(api_request, name, value)
+    return SimpleNamespace(
+        id="tool-1", name="notes", updated_at=1, api_request_id="req-1",
+        configuration={"headers": {"X-Api-Key": "secret"}}, api_request=api_request
+    )
+
+def test_arguments_are_routed_by_location():
+    """Test path substitution (escaped), query, header and body routing; unknown arguments are dropped"""
+    plan = compile_request_plan(create_sample_tool())
+    request = apply_request_plan(plan, {"user_id": "a/b", "notify": True, "X-Trace": 7, "text": "hi", "extra": 1})
+
+    assert request.method == "POST"
+    assert request.url == "https://notes.example.com/v1/users/a%2Fb/notes"
+    assert request.params == {"notify": True}
+    assert request.headers == {"X-Api-Key": "secret", "X-Trace": "7"}
+    assert request.body == {"text": "hi"}
+
+    with pytest.raises(RequestPlanError):
+        apply_request_plan(plan, {"text": "hi"})
+
+    logger.info(f"✓ Routed: {request}")
+
+def test_constant_and_skipped_parameters():
+    """Test that constants are always sent, skipped arguments never, and both are hidden from the model"""
+    tool = create_sample_tool(constant_parameters={"lang": "he", "notify": False}, skip_parameters=["X-Trace"])
+    plan = compile_request_plan(tool)
+    request = apply_request_plan(plan, {"user_id": 5, "lang": "en", "notify": True, "X-Trace": "1", "text": "hi"})
+
+    assert request.body == {"text": "hi", "lang": "he"}
+    assert request.params == {"notify": False}
+    assert "X-Trace" not in request.headers
+
+    schema = build_parameters_schema(tool.api_request)
+    assert list(schema["properties"]) == ["user_id", "text"]
+    assert schema["required"] == ["user_id", "text"]
+
+    logger.info(f"✓ Constants and skips applied: {schema}")
+
+def test_openai_auth_is_injected():
+    """Test that calls to api.openai.com get the API key and a JSON content type"""
+    tool = create_sample_tool(api=SimpleNamespace(server="https://api.openai.com"), path="/v1/audio/speech", parameters=None)
+    request = apply_request_plan(compile_request_plan(tool), {"text": "hi"}, api_key="sk-test")
+
+    assert request.headers["Authorization"] == "Bearer sk-test"
+    assert request.headers["Content-Type"] == "application/json"
+
+    with pytest.raises(RequestPlanError):
+        compile_request_plan(create_sample_tool(api=None))
+
+    logger.info("✓ OpenAI auth injected")
+
+def test_parameters_are_normalized_from_the_spec():
+    """Test $ref parameters, operation overrides and implicit path requirement"""
+    spec = {"components": {"parameters": {"Limit": {"name": "limit", "in": "query", "schema": {"$ref": "#/components/schemas/Count"}}},
+                           "schemas": {"Count": {"type": "integer", "minimum": 1}}}}
+    parameters = normalize_parameters([
+        {"name": "id", "in": "path", "description": "Old"},
+        {"$ref": "#/components/parameters/Limit"},
+        {"name": "id", "in": "path", "description": "Item ID"},
+        {"name": "session", "in": "cookie"},
+    ], spec)
+
+    assert parameters == [
+        {"name": "id", "in": "path", "required": True, "description": "Item ID"},
+        {"name": "limit", "in": "query", "required": False, "schema": {"type": "integer", "minimum": 1}},
+    ]
+
+    logger.info("✓ Parameters normalized")
+
+def test_plans_are_cached_per_version():
+    """Test that a plan is compiled once per tool version and recompiled when its API request is edited"""
+    cache = RequestPlanCache()
+    tool = create_sample_tool()
+
+    first = cache.get(tool)
+    assert cache.get(tool) is first
+
+    tool.api_request.updated_at = 1
+    second = cache.get(tool)
+    assert second is not first
+
+    tool.updated_at = 2
+    assert cache.get(tool) is not second
+
+    logger.info("✓ Plans cached")
+
+if __name__ == "__main__":
+    test_arguments_are_routed_by_location()
+    test_constant_and_skipped_parameters()
+    test_openai_auth_is_injected()
+    test_parameters_are_normalized_from_the_spec()
+    test_plans_are_cached_per_version()
+    logger.info("All tests passed!")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+import httpx
+import resilience
+from resilience import (
+    CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError, RetryPolicy,
+    call_with_retries, hedged, retry_after_seconds, status_outcome, IDEMPOTENT_POLICY, UNSAFE_POLICY
+)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+def http_error(status_code, headers=None):
+    request = httpx.Request("GET", "https://api.example.com/weather")
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"HTTP {status_code}", request=request, response=response)
+
+def test_retry_after_and_status_classification():
+    """Test Retry-After parsing and which statuses are retried under each policy"""
+    assert retry_after_seconds({"retry-after": "2"}) == 2
+    assert retry_after_seconds({"retry-after-ms": "250"}) == 0.25
+    assert retry_after_seconds({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0
+    assert retry_after_seconds({"retry-after": "soon"}) is None
+    assert retry_after_seconds(None) is None
+
+    assert status_outcome(200, {}, IDEMPOTENT_POLICY) == resilience.SUCCESS
+    assert status_outcome(502, {}, IDEMPOTENT_POLICY).retryable
+    assert not status_outcome(502, {}, UNSAFE_POLICY).retryable
+    rate_limited = status_outcome(429, {"retry-after": "1"}, UNSAFE_POLICY)
+    assert rate_limited.retryable and not rate_limited.failure and rate_limited.retry_after == 1
+    assert not status_outcome(404, {}, IDEMPOTENT_POLICY).retryable
+
+    logger.info("✓ Retry-After parsed and statuses classified")
+
+def test_circuit_breaker_opens_and_recovers():
+    """Test that the breaker opens at the threshold, lets one trial call through, and closes on success"""
+    clock = FakeClock()
+    breaker = CircuitBreaker("tools.example.com", failure_threshold=2, reset_seconds=10, clock=clock)
+
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    try:
+        breaker.before_call()
+        assert False, "open circuit should reject calls"
+    except CircuitOpenError as e:
+        assert e.upstream == "tools.example.com" and e.retry_in == 10
+
+    clock.now += 10
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    try:
+        breaker.before_call()
+        assert False, "only one trial call should go through"
+    except CircuitOpenError:
+        pass
+
+    # A failed trial opens the circuit again, a successful one closes it
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 10
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats()["opened"] == 2 and breaker.stats()["rejected"] == 2
+
+    logger.info("✓ Circuit breaker opened and recovered")
+
+def test_call_with_retries(monkeypatch):
+    """Test that transient failures are retried, unsafe calls are not repeated, and open circuits fail fast"""
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(resilience.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(resilience, "backoff_delay", lambda attempt: 0.1)
+    breakers = CircuitBreakerRegistry()
+    calls = []
+
+    async def flaky():
+        calls.append("flaky")
+        if len(calls) == 1:
+            raise http_error(503, {"retry-after": "1"})
+        if len(calls) == 2:
+            raise httpx.ConnectError("connection refused")
+        return "sunny"
+
+    async def failing():
+        calls.append("failing")
+        raise http_error(502)
+
+    async def run():
+        assert await call_with_retries(flaky, "weather", IDEMPOTENT_POLICY, breakers=breakers) == "sunny"
+        # Retry-After wins over the shorter backoff
+        assert sleeps == [1, 0.1]
+
+        calls.clear()
+        try:
+            await call_with_retries(failing, "payments", UNSAFE_POLICY, breakers=breakers)
+            assert False, "502 should be raised"
+        except httpx.HTTPStatusError:
+            pass
+        assert calls == ["failing"]
+
+        policy = RetryPolicy(max_attempts=10, retry_statuses=frozenset({502}), unsent_only=False)
+        calls.clear()
+        try:
+            await call_with_retries(failing, "payments", policy, breakers=breakers)
+            assert False, "open circuit should be raised"
+        except CircuitOpenError:
+            pass
+        # The breaker opened after the threshold and stopped the retries
+        assert len(calls) == resilience.CIRCUIT_FAILURE_THRESHOLD - 1
+
+    asyncio.run(run())
+    assert breakers.stats()["weather"]["state"] == "closed"
+    assert breakers.stats()["payments"]["state"] == "open"
+
+    logger.info("✓ Retries bounded and circuit respected")
+
+def test_hedged_request_wins_over_slow_one():
+    """Test that a slow call is hedged, the faster attempt wins and the slow one is cancelled"""
+    started = []
+    cancelled = []
+
+    async def call():
+        attempt = len(started)
+        started.append(attempt)
+        try:
+            await asyncio.sleep(1 if attempt == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+        return f"attempt {attempt}"
+
+    async def run():
+        result = await hedged(call, hedge_delay=0.05)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == "attempt 1"
+    assert started == [0, 1] and cancelled == [0]
+
+    logger.info("✓ Hedged request won")
+
+if __name__ == "__main__":
+    test_retry_after_and_status_classification()
+    test_circuit_breaker_opens_and_recovers()
+    test_hedged_request_wins_over_slow_one()
+    logger.info("All tests passed!")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+from response_reader import read_capped, peek, is_binary_body, max_response_bytes_for, TOOL_RESPONSE_MAX_BYTES
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def _chunks(*parts):
+    for part in parts:
+        yield part
+
+def test_read_stops_at_the_cap():
+    """Test that reading keeps at most max_bytes and reports the cut"""
+    consumed = []
+
+    async def tracked():
+        for part in (b"abcd", b"efgh", b"ijkl", b"mnop"):
+            consumed.append(part)
+            yield part
+
+    body, truncated = asyncio.run(read_capped(tracked(), 6))
+    assert body == b"abcdef" and truncated
+    assert len(consumed) == 2  # the rest of the stream is never read
+
+    body, truncated = asyncio.run(read_capped(_chunks(b"abcd", b"ef"), 6))
+    assert body == b"abcdef" and not truncated
+
+    logger.info("✓ Reads capped")
+
+def test_peek_keeps_the_first_chunk():
+    """Test that peeking returns the first chunk and a stream that still includes it"""
+    async def run():
+        head, chunks = await peek(_chunks(b"%PDF-1.7", b" rest"))
+        return head, b"".join([chunk async for chunk in chunks])
+
+    assert asyncio.run(run()) == (b"%PDF-1.7", b"%PDF-1.7 rest")
+
+    logger.info("✓ Peeked")
+
+def test_binary_detection():
+    """Test that declared types win for text and media, and the first bytes decide otherwise"""
+    assert not is_binary_body("application/json", b"\x89PNG\r\n\x1a\n")
+    assert not is_binary_body("application/problem+json", b"{}")
+    assert is_binary_body("image/svg", b"<svg>")
+    assert is_binary_body("application/octet-stream", b"%PDF-1.7")
+    assert is_binary_body("", b"\x00\x01\x02")
+    assert not is_binary_body("", b'{"temp_c": 24}')
+    assert max_response_bytes_for(None) == TOOL_RESPONSE_MAX_BYTES and max_response_bytes_for(100) == 100
+
+    logger.info("✓ Binary bodies detected")
+
+if __name__ == "__main__":
+    test_read_stops_at_the_cap()
+    test_peek_keeps_the_first_chunk()
+    test_binary_detection()
+    logger.info("All tests passed!")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import json
+import logging
+import pytest
+from response_shaper import parse_path, project, shape_json, cap_text
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sample data for tests
+def create_sample_forecast():
+    return {
+        "location": {"name": "Haifa", "country": "Israel"},
+        "current": {"temp_c": 24.0, "condition": {"text": "Sunny"}},
+        "forecast": {
+            "forecastday": [
+                {"date": "2024-06-01", "day": {"maxtemp_c": 29.1}, "hour": [{"temp_c": 20 + h} for h in range(24)]},
+                {"date": "2024-06-02", "day": {"maxtemp_c": 27.4}, "hour": [{"temp_c": 18 + h} for h in range(24)]}
+            ]
+        }
+    }
+
+def test_parse_path_steps():
+    """Test that dotted, bracketed, index and wildcard steps are parsed"""
+    assert parse_path("$.forecast.forecastday[*].day.maxtemp_c") == ("forecast", "forecastday", None, "day", "maxtemp_c")
+    assert parse_path("location['name']") == ("location", "name")
+    assert parse_path("$.items[-1]") == ("items", -1)
+
+    with pytest.raises(ValueError):
+        parse_path("$.items[")
+
+    logger.info("✓ Paths parsed")
+
+def test_projection_selects_mapped_fields():
+    """Test that a response mapping keeps only the mapped values and skips missing paths"""
+    projected = project(create_sample_forecast(), {
+        "city": "$.location.name",
+        "now": "$.current.condition.text",
+        "max": "$.forecast.forecastday[*].day.maxtemp_c",
+        "first_hours": "$.forecast.forecastday[0].hour[*].temp_c",
+        "all_hours": "$.forecast.forecastday[*].hour[*].temp_c",
+        "missing": "$.alerts[0].headline"
+    })
+
+    assert projected["city"] == "Haifa"
+    assert projected["now"] == "Sunny"
+    assert projected["max"] == [29.1, 27.4]
+    assert len(projected["first_hours"]) == 24
+    assert len(projected["all_hours"]) == 48
+    assert "missing" not in projected
+
+    logger.info(f"✓ Projection: {json.dumps(projected)[:120]}")
+
+def test_shape_json_is_compact_and_capped():
+    """Test that shaped output has no whitespace and never exceeds the cap"""
+    data = create_sample_forecast()
+
+    compact = shape_json(data)
+    assert compact == json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+    capped = shape_json(data, max_chars=200)
+    assert len(capped) <= 200
+    assert "truncated" in capped
+
+    logger.info("✓ Compact and capped")
+
+def test_long_lists_keep_a_prefix():
+    """Test that an oversized list keeps as many whole items as fit, with the total"""
+    data = {"results": [{"id": i, "title": f"Result {i}"} for i in range(500)]}
+
+    shaped = json.loads(shape_json(data, max_chars=1000))
+
+    assert shaped["total"] == 500
+    assert 0 < shaped["returned"] == len(shaped["items"]) < 500
+    assert shaped["items"][0] == {"id": 0, "title": "Result 0"}
+
+    logger.info(f"✓ Kept {shaped['returned']} of {shaped['total']} items")
+
+def test_cap_text_notes_original_length():
+    """Test that capped text ends with a note carrying the original length"""
+    capped = cap_text("x" * 5000, max_chars=100)
+
+    assert len(capped) == 100
+    assert capped.endswith("[truncated, 5000 characters in total]")
+
+    logger.info("✓ Text capped")
+
+if __name__ == "__main__":
+    test_parse_path_steps()
+    test_projection_selects_mapped_fields()
+    test_shape_json_is_compact_and_capped()
+    test_long_lists_keep_a_prefix()
+    test_cap_text_notes_original_length()
+    logger.info("All tests passed!")
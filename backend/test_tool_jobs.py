@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import tool_jobs
+from db import Base
+from models import ToolJob
+from tool_jobs import ToolJobRunner, job_handle_result, parse_job_handle, job_result_prompt, SUCCEEDED, FAILED, RUNNING
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class FakeSession:
+    """Session holding jobs in a dict; commits are counted, nothing is persisted"""
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.commits = 0
+
+    def get(self, model, key):
+        return self.jobs.get(key)
+
+    def query(self, *columns):
+        # Filters are ignored: every job is returned, run_job decides what is left to do
+        return FakeQuery([(job.id, job.status, job.started_at) for job in self.jobs.values()])
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def filter(self, *criteria):
+        return self
+
+    def all(self):
+        return self.rows
+
+    def update(self, values, synchronize_session=None):
+        return 1
+
+def create_job(job_id):
+    return ToolJob(
+        id=job_id,
+        chatid="chat-1",
+        tool_id="tool-1",
+        tool_call_id="call_1",
+        tool_definition_name="generate_image",
+        openai_function_name="generate_image",
+        arguments={"prompt": "a cat"},
+        status="pending"
+    )
+
+def test_job_handle_round_trip():
+    """Test that job handles are recognised and ordinary results are not"""
+    handle = job_handle_result("job-1", "generate_image")
+
+    assert parse_job_handle(handle) == "job-1"
+    assert parse_job_handle('{"status": "ok"}') is None
+    assert parse_job_handle(None) is None
+
+    logger.info("✓ Job handles parsed")
+
+def test_run_job_records_outcome_and_delivers(monkeypatch):
+    """Test that jobs succeed, time out or fail, and that finished jobs are delivered once"""
+    jobs = {job_id: create_job(job_id) for job_id in ("ok", "slow", "broken")}
+    delivered = []
+    monkeypatch.setattr(tool_jobs, "load_turn_context", lambda db, chat_id: object())
+
+    async def execute(context, job):
+        if job.id == "slow":
+            await asyncio.sleep(1)
+        if job.id == "broken":
+            raise RuntimeError("upstream unavailable")
+        return f"Image for {job.arguments['prompt']}: media://abc.png"
+
+    async def deliver(db, job):
+        delivered.append(job.id)
+        return True
+
+    runner = ToolJobRunner(execute=execute, session_factory=lambda: FakeSession(jobs), timeout_seconds=0.1)
+    runner.set_delivery(deliver)
+
+    async def run_all():
+        await asyncio.gather(*(runner.schedule(job_id) for job_id in jobs))
+        # Finished jobs are not run again
+        await runner.run_job("ok")
+
+    asyncio.run(run_all())
+
+    assert jobs["ok"].status == SUCCEEDED and "media://abc.png" in jobs["ok"].result
+    assert jobs["slow"].status == FAILED and "Timed out" in jobs["slow"].error
+    assert jobs["broken"].status == FAILED and jobs["broken"].error == "upstream unavailable"
+    assert sorted(delivered) == ["broken", "ok", "slow"]
+    assert all(job.delivered_at is not None for job in jobs.values())
+    assert "upstream unavailable" in job_result_prompt(jobs["broken"])
+
+    logger.info("✓ Job outcomes recorded and delivered")
+
+def test_resume_delivers_finished_but_undelivered_jobs():
+    """Test that jobs finished by a previous process but never delivered are delivered at startup, without running again"""
+    jobs = {job_id: create_job(job_id) for job_id in ("undelivered", "delivered")}
+    for job in jobs.values():
+        job.status = SUCCEEDED
+        job.result = "media://abc.png"
+    jobs["delivered"].delivered_at = datetime.utcnow()
+    executed, delivered = [], []
+
+    async def execute(context, job):
+        executed.append(job.id)
+        return "again"
+
+    async def deliver(db, job):
+        delivered.append(job.id)
+        return True
+
+    runner = ToolJobRunner(execute=execute, session_factory=lambda: FakeSession(jobs))
+    runner.set_delivery(deliver)
+
+    async def resume():
+        assert runner.resume_pending() == 2
+        await asyncio.gather(*runner._tasks)
+
+    asyncio.run(resume())
+
+    assert executed == []
+    assert delivered == ["undelivered"]
+    assert jobs["undelivered"].delivered_at is not None and jobs["undelivered"].result == "media://abc.png"
+
+    logger.info("✓ Undelivered jobs delivered on resume")
+
+def test_delivery_waits_for_the_turn_that_started_the_job(monkeypatch):
+    """Test that a job failing right away is delivered only after its turn has stored the acknowledgement"""
+    jobs = {"fast": create_job("fast")}
+    events = []
+    monkeypatch.setattr(tool_jobs, "load_turn_context", lambda db, chat_id: object())
+
+    async def execute(context, job):
+        raise RuntimeError("circuit open")
+
+    async def deliver(db, job):
+        events.append(f"deliver {job.id}")
+        return True
+
+    runner = ToolJobRunner(execute=execute, session_factory=lambda: FakeSession(jobs))
+    runner.set_delivery(deliver)
+
+    async def turn():
+        async with runner.turn():
+            task = runner.schedule("fast")
+            # The second model call of the acknowledging turn is still running
+            await asyncio.sleep(0.05)
+            events.append("ack stored")
+        await task
+
+    asyncio.run(turn())
+
+    assert jobs["fast"].status == FAILED
+    assert events == ["ack stored", "deliver fast"]
+
+    logger.info("✓ Job outcome delivered after the acknowledgement")
+
+def test_resume_claims_each_job_once():
+    """Test that two processes resuming at the same time run each pending or orphaned job only once"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[ToolJob.__table__])
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    # "interrupted" was left running by a dead process, "elsewhere" is still running in a live one
+    for job_id, status, started_at in (
+        ("pending", "pending", None),
+        ("interrupted", RUNNING, datetime(2026, 1, 1)),
+        ("elsewhere", RUNNING, datetime.utcnow())
+    ):
+        job = create_job(job_id)
+        job.status = status
+        job.started_at = started_at
+        db.add(job)
+    db.commit()
+    db.close()
+
+    executed = []
+
+    async def execute(context, job):
+        executed.append(job.id)
+        return "done"
+
+    runners = [ToolJobRunner(execute=execute, session_factory=Session) for _ in range(2)]
+
+    async def resume_both():
+        scheduled = [runner.resume_pending() for runner in runners]
+        # Let the claims settle, the check of the live job keeps waiting for its timeout
+        await asyncio.sleep(0.2)
+        for runner in runners:
+            for task in runner._tasks:
+                task.cancel()
+        return scheduled
+
+    original_load = tool_jobs.load_turn_context
+    tool_jobs.load_turn_context = lambda db, chat_id: object()
+    try:
+        scheduled = asyncio.run(resume_both())
+    finally:
+        tool_jobs.load_turn_context = original_load
+
+    assert scheduled == [3, 3]
+    assert sorted(executed) == ["interrupted", "pending"]
+
+    logger.info("✓ Interrupted jobs claimed by one process")
+
+if __name__ == "__main__":
+    test_job_handle_round_trip()
+    test_resume_delivers_finished_but_undelivered_jobs()
+    logger.info("All tests passed!")
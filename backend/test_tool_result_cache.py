@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+import time
+from tool_result_cache import ToolResultCache, tool_result_key, cache_ttl_for, TOOL_RESULT_CACHE_DEFAULT_TTL
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def test_key_ignores_argument_order():
+    """Test that the same call with reordered arguments maps to one key"""
+    first = tool_result_key("req-1", "get", "https://api.example.com/forecast", {"X-Key": "k"}, {"q": "Haifa", "days": 3}, {})
+    second = tool_result_key("req-1", "GET", "https://api.example.com/forecast", {"x-key": "k"}, {"days": 3, "q": "Haifa"}, {})
+    other = tool_result_key("req-1", "GET", "https://api.example.com/forecast", {"X-Key": "k"}, {"q": "Eilat", "days": 3}, {})
+
+    assert first == second
+    assert first != other
+
+    logger.info("✓ Keys normalised")
+
+def test_ttl_opt_out_for_non_idempotent_methods():
+    """Test that only GET/HEAD are cached by default and explicit TTLs win"""
+    assert cache_ttl_for("GET", None) == TOOL_RESULT_CACHE_DEFAULT_TTL
+    assert cache_ttl_for("POST", None) == 0
+    assert cache_ttl_for("POST", 30) == 30
+    assert cache_ttl_for("GET", 0) == 0
+
+    logger.info("✓ Method-based TTLs")
+
+def test_entries_expire_and_evict():
+    """Test TTL expiry, LRU eviction and the hit/miss counters"""
+    cache = ToolResultCache(max_entries=2)
+    cache.put("a", "A", ttl=60)
+    cache.put("b", "B", ttl=60)
+    assert cache.get("a") == "A"
+    cache.put("c", "C", ttl=60)  # evicts "b", the least recently used
+
+    assert cache.get("b") is None
+    assert cache.get("c") == "C"
+
+    cache._entries["a"] = (time.monotonic() - 1, "A")
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 2
+    assert stats["evictions"] == 1 and stats["expirations"] == 1 and stats["size"] == 1
+
+    logger.info(f"✓ Expiry and eviction: {stats}")
+
+def test_concurrent_calls_share_one_fetch():
+    """Test that identical concurrent calls make one upstream request and failures are not cached"""
+    cache = ToolResultCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "sunny", True
+
+    async def failing_fetch():
+        calls.append(1)
+        return "Error code: 503", False
+
+    async def run():
+        results = await asyncio.gather(*(cache.get_or_fetch("k", 60, fetch) for _ in range(3)))
+        again = await cache.get_or_fetch("k", 60, fetch)
+        await cache.get_or_fetch("f", 60, failing_fetch)
+        await cache.get_or_fetch("f", 60, failing_fetch)
+        return results, again
+
+    results, again = asyncio.run(run())
+
+    assert results == ["sunny"] * 3 and again == "sunny"
+    assert len(calls) == 3  # one shared fetch, two uncached failures
+
+    logger.info("✓ Single flight and no caching of failures")
+
+def test_cancelled_owner_does_not_cancel_waiters():
+    """Test that a turn joining a fetch still gets the result when the turn that started it is cancelled"""
+    cache = ToolResultCache()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "sunny", True
+
+    async def run():
+        owner = asyncio.ensure_future(cache.get_or_fetch("k", 60, fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.get_or_fetch("k", 60, fetch))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        result = await waiter
+        return owner, result
+
+    owner, result = asyncio.run(run())
+
+    assert owner.cancelled()
+    assert result == "sunny"
+    assert cache.get("k") == "sunny"
+
+    logger.info("✓ Cancelled owner left the waiters alone")
+
+if __name__ == "__main__":
+    test_key_ignores_argument_order()
+    test_ttl_opt_out_for_non_idempotent_methods()
+    test_entries_expire_and_evict()
+    test_concurrent_calls_share_one_fetch()
+    test_cancelled_owner_does_not_cancel_waiters()
+    logger.info("All tests passed!")
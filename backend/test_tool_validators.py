@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import json
+import logging
+from tool_validators import ArgumentValidator, to_json_schema, validation_error_result
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sample data for tests
+SPEECH_PARAMETERS = {
+    "type": "object",
+    "properties": {
+        "input": {"type": "string", "maxLength": 4096},
+        "voice": {"type": "string", "enum": ["alloy", "echo", "nova"]},
+        "speed": {"type": "number", "minimum": 0.25, "maximum": 4.0, "default": 1.0, "nullable": True},
+    },
+    "required": ["input", "voice"]
+}
+
+def test_valid_arguments_pass_unchanged():
+    """Test that valid arguments (including OpenAPI nullable values) pass and defaults are not filled in"""
+    validator = ArgumentValidator("api_audio_speech_post", SPEECH_PARAMETERS)
+    arguments = {"input": "Shalom", "voice": "nova"}
+
+    assert validator.validate(arguments) is None
+    assert validator.validate({"input": "Shalom", "voice": "nova", "speed": None}) is None
+    assert arguments == {"input": "Shalom", "voice": "nova"}
+
+    logger.info("✓ Valid arguments accepted")
+
+def test_invalid_arguments_give_structured_errors():
+    """Test that missing, mistyped and out-of-enum arguments are reported with field and rule"""
+    validator = ArgumentValidator("api_audio_speech_post", SPEECH_PARAMETERS)
+
+    missing = validator.validate({"input": "Shalom"})
+    assert missing["rule"] == "required" and missing["message"].startswith("arguments must contain")
+
+    wrong_voice = validator.validate({"input": "Shalom", "voice": "bob"})
+    assert wrong_voice["field"] == "voice" and wrong_voice["expected"] == ["alloy", "echo", "nova"]
+
+    result = json.loads(validation_error_result(validator.validate({"input": 3, "voice": "nova"})))
+    assert result["error"] == "invalid_arguments" and result["field"] == "input" and "hint" in result
+
+    logger.info(f"✓ Structured errors: {result}")
+
+def test_uncompilable_schema_disables_validation():
+    """Test that a schema with an unresolved reference does not block the tool"""
+    validator = ArgumentValidator("broken", {"type": "object", "properties": {"x": {"$ref": "#/components/schemas/Missing"}}})
+
+    assert validator.validate({"x": 1}) is None
+    assert to_json_schema({"type": "string", "nullable": True}) == {"type": ["string", "null"]}
+
+    logger.info("✓ Uncompilable schema skipped")
+
+if __name__ == "__main__":
+    test_valid_arguments_pass_unchanged()
+    test_invalid_arguments_give_structured_errors()
+    test_uncompilable_schema_disables_validation()
+    logger.info("All tests passed!")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import json
+import logging
+from webhook_recorder import WebhookRecorder, read_capture
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BOT_NUMBER = "972543857242"
+
+def create_sample_event():
+    return {
+        "type": "Message",
+        "event": {
+            "Info": {
+                "Chat": "120363041234567890@g.us",
+                "Sender": "972501234567:12@s.whatsapp.net",
+                "SenderAlt": "98765432101234@lid",
+                "PushName": "Dana",
+            },
+            "Message": {
+                "conversation": "call me at home",
+                "extendedTextMessage": {
+                    "contextInfo": {"participant": f"{BOT_NUMBER}@s.whatsapp.net", "remoteJid": "972501234567-1612345678@g.us"}
+                },
+                "imageMessage": {"JPEGThumbnail": "/9j/4AAQSkZJRg=="},
+            },
+        },
+    }
+
+def test_numbers_and_text_are_redacted():
+    """Test that every number in a JID is pseudonymized (legacy group IDs included), the bot's number is kept, and text and blobs are masked"""
+    recorder = WebhookRecorder(salt="test-salt", preserve_numbers=[BOT_NUMBER])
+    redacted = recorder.redact(create_sample_event())
+    info = redacted["event"]["Info"]
+    context = redacted["event"]["Message"]["extendedTextMessage"]["contextInfo"]
+    dumped = json.dumps(redacted)
+
+    for number in ("120363041234567890", "972501234567", "98765432101234", "1612345678"):
+        assert number not in dumped, f"{number} leaked"
+
+    # Same length, same server, device suffix kept
+    assert info["Chat"].endswith("@g.us") and len(info["Chat"]) == len("120363041234567890@g.us")
+    assert info["Sender"].endswith(":12@s.whatsapp.net")
+    assert info["SenderAlt"].endswith("@lid")
+
+    # A legacy group ID keeps its shape, and its creator maps to the creator's own pseudonym
+    creator, timestamp = context["remoteJid"][:-len("@g.us")].split("-")
+    assert creator == info["Sender"].split(":")[0] and len(timestamp) == 10
+
+    assert context["participant"] == f"{BOT_NUMBER}@s.whatsapp.net"
+    assert info["PushName"].startswith("user-") and "Dana" not in dumped
+    assert redacted["event"]["Message"]["conversation"] == "xxxx xx xx xxxx"
+    assert redacted["event"]["Message"]["imageMessage"]["JPEGThumbnail"] == "[binary:16]"
+
+    logger.info(f"✓ Event redacted: {dumped}")
+
+def test_numbers_in_free_text_are_redacted():
+    """Test that phone numbers outside JIDs are pseudonymized in any string, with text masking off too"""
+    recorder = WebhookRecorder(salt="test-salt", redact_text=False, preserve_numbers=[BOT_NUMBER])
+    vcard = "BEGIN:VCARD\nFN:Dana\nTEL;type=CELL;waid=972501234567:+972 50-123-4567\nEND:VCARD"
+    redacted = recorder.redact({
+        "contactMessage": {"displayName": "Dana 0501234567", "vcard": vcard},
+        "note": f"Reach me on +972 50-123-4567 or the bot at {BOT_NUMBER}",
+        "Timestamp": "2026-01-01T10:00:00+02:00",
+        "ID": "3EB0C431C26A1D0F4B5A"
+    })
+    dumped = json.dumps(redacted)
+
+    for number in ("972501234567", "0501234567", "123-4567"):
+        assert number not in dumped, f"{number} leaked"
+    assert redacted["note"].startswith("Reach me on +") and redacted["note"].endswith(f"the bot at {BOT_NUMBER}")
+    assert redacted["Timestamp"] == "2026-01-01T10:00:00+02:00"
+    assert redacted["ID"] == "3EB0C431C26A1D0F4B5A"
+    assert redacted["contactMessage"]["displayName"].startswith("user-")
+
+    logger.info(f"✓ Free text redacted: {dumped}")
+
+def test_pseudonyms_are_stable_per_salt(tmp_path):
+    """Test that recorders with the same salt agree across runs, different salts do not, and captures read back"""
+    event = create_sample_event()
+    first = WebhookRecorder(salt="prod").redact(event)
+    second = WebhookRecorder(salt="prod").redact(event)
+    other = WebhookRecorder(salt="staging").redact(event)
+
+    assert first == second
+    assert first["event"]["Info"]["Chat"] != other["event"]["Info"]["Chat"]
+
+    path = tmp_path / "capture.jsonl"
+    recorder = WebhookRecorder(path=str(path), salt="prod")
+    recorder.record(json.dumps(event), "client-token")
+    recorder.record("not json", "client-token")
+    recorder.flush()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("{broken\n")
+
+    events = list(read_capture(str(path)))
+    assert len(events) == 1
+    assert events[0]["event"] == first
+    assert events[0]["token"] != "client-token" and len(events[0]["token"]) == 16
+
+    logger.info("✓ Pseudonyms stable per salt")
+
+if __name__ == "__main__":
+    test_numbers_and_text_are_redacted()
+    test_numbers_in_free_text_are_redacted()
+    logger.info("All tests passed!")
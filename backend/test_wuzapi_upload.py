@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import json
+import base64
+import asyncio
+import logging
+from wuzapi_upload import DataUriJsonBody, EncodedPayloadCache, build_file_body, encoded_length, ENCODE_CHUNK_BYTES
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sample data for tests: not a multiple of the chunk size, so the last chunk is padded
+FILE_BYTES = bytes(range(256)) * (ENCODE_CHUNK_BYTES // 128) + b"tail"
+
+def _read_body(body):
+    async def collect():
+        return b"".join([chunk async for chunk in body])
+    return asyncio.run(collect())
+
+def _write_sample(directory):
+    path = f"{directory}/voice.ogg"
+    with open(path, "wb") as f:
+        f.write(FILE_BYTES)
+    return path
+
+def test_streamed_body_is_the_json_payload(tmp_path):
+    """Test that the incrementally built body is the same JSON send_file used to post"""
+    path = _write_sample(tmp_path)
+    fields = {"Phone": "972500000000", "Caption": "Shalom \"friend\""}
+    body = DataUriJsonBody(fields, "Audio", path, "audio/ogg", len(FILE_BYTES))
+
+    raw = _read_body(body)
+
+    assert len(raw) == body.content_length
+    assert json.loads(raw) == {**fields, "Audio": "data:audio/ogg;base64," + base64.b64encode(FILE_BYTES).decode("ascii")}
+    assert encoded_length(len(FILE_BYTES)) == len(base64.b64encode(FILE_BYTES))
+
+    logger.info(f"✓ Streamed {body.content_length} byte body")
+
+def test_repeated_sends_reuse_the_encoding(tmp_path):
+    """Test that a second send of the same file is served from the payload cache"""
+    path = _write_sample(tmp_path)
+    cache = EncodedPayloadCache(max_bytes=10 * len(FILE_BYTES), max_file_bytes=len(FILE_BYTES))
+
+    first = build_file_body({"Phone": "1"}, "Audio", path, "audio/ogg", "media://abc.ogg", cache)
+    second = build_file_body({"Phone": "2"}, "Audio", path, "audio/ogg", "media://abc.ogg", cache)
+
+    assert second.data_uri is first.data_uri
+    assert json.loads(_read_body(second))["Phone"] == "2"
+    assert cache.stats()["hits"] == 1
+
+    logger.info(f"✓ Encoding reused: {cache.stats()}")
+
+def test_large_files_are_streamed_and_cache_is_bounded(tmp_path):
+    """Test that files over the cache limit bypass the cache and the cache evicts by size"""
+    path = _write_sample(tmp_path)
+    cache = EncodedPayloadCache(max_bytes=25, max_file_bytes=len(FILE_BYTES) - 1)
+
+    body = build_file_body({"Phone": "1"}, "Audio", path, "audio/ogg", "big", cache)
+    assert body.data_uri is None and cache.stats()["entries"] == 0
+
+    cache.put("a", b"x" * 10)
+    cache.put("b", b"y" * 10)
+    cache.get("a")
+    cache.put("c", b"z" * 10)  # evicts "b", the least recently used
+
+    assert cache.get("b") is None and cache.get("a") and cache.get("c")
+    assert cache.stats()["bytes"] == 20
+
+    logger.info("✓ Large files streamed, cache bounded")
+
+if __name__ == "__main__":
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        test_streamed_body_is_the_json_payload(directory)
+    with tempfile.TemporaryDirectory() as directory:
+        test_repeated_sends_reuse_the_encoding(directory)
+    with tempfile.TemporaryDirectory() as directory:
+        test_large_files_are_streamed_and_cache_is_bounded(directory)
+    logger.info("All tests passed!")
@@ -0,0 +1,73 @@
+import os
+import logging
+from typing import Any, Optional
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Longest tool result / function arguments loaded into the history of a turn, in characters
+HISTORY_FIELD_MAX_CHARS = int(os.environ.get("HISTORY_FIELD_MAX_CHARS", "4000"))
+# Tokenizer used for the cached message token counts (tiktoken encoding name)
+TOKENIZER_ENCODING = os.environ.get("TOKENIZER_ENCODING", "o200k_base")
+
+# Roughly what the API adds per input item (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding: Any = None
+_encoding_loaded = False
+
+
+def _get_encoding() -> Optional[Any]:
+    """Load the tiktoken encoding once; None if tiktoken or its data is unavailable."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            logger.warning(f"Tokenizer {TOKENIZER_ENCODING} unavailable, estimating tokens from length: {e}")
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """
+    Count the tokens of a text with the local tokenizer.
+
+    Falls back to an estimate of one token per four characters when tiktoken is not installed.
+
+    Args:
+        text: The text to count
+
+    Returns:
+        Number of tokens
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def message_token_count(message: Any) -> int:
+    """
+    Count the tokens a message contributes to the model input when it is part of the history.
+
+    Tool results and function arguments are counted as loaded into the history, i.e. cut
+    to HISTORY_FIELD_MAX_CHARS.
+
+    Args:
+        message: A Message (or an object with the same attributes)
+
+    Returns:
+        Number of tokens
+    """
+    return (
+        MESSAGE_OVERHEAD_TOKENS
+        + count_tokens(message.content)
+        + count_tokens(message.openai_function_name)
+        + count_tokens((message.function_arguments or "")[:HISTORY_FIELD_MAX_CHARS])
+        + count_tokens((message.function_result or "")[:HISTORY_FIELD_MAX_CHARS])
+    )
@@ -0,0 +1,374 @@
+import os
+import json
+import uuid
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from db import SessionLocal
+from models import ToolJob
+from turn_context import TurnContext, load_turn_context
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Seconds a background tool job may run before it is failed
+TOOL_JOB_TIMEOUT_SECONDS = float(os.environ.get("TOOL_JOB_TIMEOUT_SECONDS", "600"))
+# Tool jobs running at once in this process; further jobs wait for a slot
+TOOL_JOB_CONCURRENCY = int(os.environ.get("TOOL_JOB_CONCURRENCY", "4"))
+
+# Seconds past the job timeout after which a running job is taken for orphaned by a dead process
+RUNNING_JOB_GRACE_SECONDS = 60
+
+# Job statuses
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATUSES = {SUCCEEDED, FAILED}
+
+# Set while a turn is producing its reply; jobs it starts are delivered only after it is done
+_current_turn: ContextVar[Optional[asyncio.Event]] = ContextVar("tool_job_turn", default=None)
+
+# execute(context, job) -> tool result
+ExecuteFn = Callable[[TurnContext, ToolJob], Awaitable[str]]
+# deliver(db, job) -> whether the follow-up reply was sent
+DeliverFn = Callable[[Session, ToolJob], Awaitable[bool]]
+
+
+def job_handle_result(job_id: str, tool_name: str) -> str:
+    """
+    Format the immediate tool result of a call that runs as a background job.
+
+    Args:
+        job_id: The job ID
+        tool_name: Name of the tool, for the model
+
+    Returns:
+        JSON telling the model the result will follow
+    """
+    return json.dumps({
+        "status": "started",
+        "job_id": job_id,
+        "tool": tool_name,
+        "note": "This tool runs in the background. Tell the user it has started; its result will be sent to them automatically when ready."
+    }, ensure_ascii=False)
+
+
+def parse_job_handle(function_result: Optional[str]) -> Optional[str]:
+    """
+    Get the job ID from a tool result made by job_handle_result.
+
+    Args:
+        function_result: A stored tool result
+
+    Returns:
+        The job ID, or None for ordinary tool results
+    """
+    if not function_result or not function_result.startswith('{"status": "started"'):
+        return None
+    try:
+        return json.loads(function_result).get("job_id")
+    except (ValueError, AttributeError):
+        return None
+
+
+def job_result_prompt(job: ToolJob) -> str:
+    """
+    Build the note the follow-up model turn answers, once a job has finished.
+
+    Args:
+        job: The finished job
+
+    Returns:
+        The note text
+    """
+    tool_name = job.tool_definition_name or job.openai_function_name
+    if job.status == SUCCEEDED:
+        return f"[Background job {job.id}: {tool_name} finished. Result:\n{job.result}\nTell the user the outcome.]"
+    return f"[Background job {job.id}: {tool_name} failed: {job.error}\nLet the user know.]"
+
+
+async def _execute_with_openai_helper(context: TurnContext, job: ToolJob) -> str:
+    # Imported here to avoid a circular import (openai_helper starts the jobs)
+    from openai_helper import openai_helper
+    if job.tool_id:
+        openai_helper._register_tool_name_mapping(job.openai_function_name, job.tool_id)
+    return await openai_helper._execute_tool(context, job.openai_function_name, job.arguments or {})
+
+
+class ToolJobRunner:
+    """
+    Runs calls of long-running tools in the background.
+
+    The turn that made the call gets a job handle as the tool result and replies right
+    away; the job then runs with its own database session, and once it has finished the
+    delivery callback (set by the WhatsApp handler) runs a follow-up model turn and sends
+    the reply. Jobs started inside turn() are delivered only after that turn has stored and
+    sent its own reply. Job state is stored in tool_jobs, so the portal can poll it and jobs
+    interrupted by a restart are claimed and picked up again by resume_pending().
+    """
+
+    def __init__(
+        self,
+        execute: Optional[ExecuteFn] = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+        max_concurrency: int = TOOL_JOB_CONCURRENCY,
+        timeout_seconds: float = TOOL_JOB_TIMEOUT_SECONDS
+    ):
+        """
+        Initialize the runner.
+
+        Args:
+            execute: Runs the tool of a job; defaults to the OpenAI helper's tool executor
+            session_factory: Creates the database session of a job
+            max_concurrency: Jobs running at once
+            timeout_seconds: Seconds a job may run
+        """
+        self.execute = execute or _execute_with_openai_helper
+        self.session_factory = session_factory
+        self.max_concurrency = max(max_concurrency, 1)
+        self.timeout_seconds = timeout_seconds
+        self.deliver: Optional[DeliverFn] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def set_delivery(self, deliver: DeliverFn) -> None:
+        """Set the callback that sends the follow-up reply of a finished job."""
+        self.deliver = deliver
+
+    @asynccontextmanager
+    async def turn(self) -> AsyncIterator[None]:
+        """
+        Wrap the code that produces and stores a turn's reply. Jobs scheduled inside it
+        wait for it to finish before their follow-up reply is delivered.
+        """
+        done = asyncio.Event()
+        token = _current_turn.set(done)
+        try:
+            yield
+        finally:
+            _current_turn.reset(token)
+            done.set()
+
+    def create_job(
+        self,
+        db: Session,
+        chat_id: str,
+        tool_id: Optional[str],
+        tool_call_id: str,
+        tool_definition_name: str,
+        openai_function_name: str,
+        arguments: Dict[str, Any]
+    ) -> ToolJob:
+        """
+        Store a pending job for a tool call.
+
+        Args:
+            db: Database session
+            chat_id: The conversation ID
+            tool_id: The tool called
+            tool_call_id: Linking ID of the tool call (call_...)
+            tool_definition_name: Canonical tool name
+            openai_function_name: Function name the model called
+            arguments: Arguments of the call
+
+        Returns:
+            The committed job
+        """
+        job = ToolJob(
+            id=str(uuid.uuid4()),
+            chatid=chat_id,
+            tool_id=tool_id,
+            tool_call_id=tool_call_id,
+            tool_definition_name=tool_definition_name,
+            openai_function_name=openai_function_name,
+            arguments=arguments,
+            status=PENDING
+        )
+        db.add(job)
+        db.commit()
+        logger.info(f"[Tool Jobs] Created job {job.id} for {openai_function_name} in {chat_id}")
+        return job
+
+    def schedule(self, job_id: str) -> asyncio.Task:
+        """
+        Run a job in the background. Called inside turn(), its result is delivered
+        only once that turn is done.
+
+        Args:
+            job_id: The job ID
+
+        Returns:
+            The background task
+        """
+        return self._track(self._run_with_slot(job_id, _current_turn.get()))
+
+    def _track(self, coro: Awaitable[Any]) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coro)
+        # Keep a reference until done, the loop only holds weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run_with_slot(
+        self,
+        job_id: str,
+        after_turn: Optional[asyncio.Event] = None,
+        claimed: bool = False
+    ) -> Optional[ToolJob]:
+        if self._semaphore is None:
+            # Created on first use, inside the event loop that runs the jobs
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await self.run_job(job_id, after_turn, claimed)
+
+    async def run_job(
+        self,
+        job_id: str,
+        after_turn: Optional[asyncio.Event] = None,
+        claimed: bool = False
+    ) -> Optional[ToolJob]:
+        """
+        Execute a job, record its outcome and deliver the follow-up reply.
+
+        A pending job is claimed first, so it runs in one process only; a job running
+        elsewhere is left alone. A job that already finished is not run again, only
+        delivered if it was not yet.
+
+        Args:
+            job_id: The job ID
+            after_turn: Set once the turn that started the job is done; delivery waits for it
+            claimed: Whether the caller already claimed the running job
+
+        Returns:
+            The job, or None if it does not exist
+        """
+        db = self.session_factory()
+        try:
+            job = db.get(ToolJob, job_id)
+            if job is None:
+                return None
+            if job.status in FINISHED_STATUSES:
+                if job.delivered_at is None:
+                    await self._deliver(db, job)
+                return job
+            if not claimed:
+                if job.status != PENDING:
+                    logger.info(f"[Tool Jobs] Job {job_id} is already running, skipping")
+                    return job
+                if not self._claim(db, job_id, PENDING, job.started_at):
+                    return job
+
+            job.status = RUNNING
+            job.started_at = datetime.utcnow()
+            db.commit()
+
+            try:
+                context = load_turn_context(db, job.chatid)
+                if context is None:
+                    raise ValueError(f"Conversation {job.chatid} not found")
+                job.result = await asyncio.wait_for(self.execute(context, job), timeout=self.timeout_seconds)
+                job.status = SUCCEEDED
+            except asyncio.TimeoutError:
+                job.status = FAILED
+                job.error = f"Timed out after {self.timeout_seconds:g} seconds"
+            except Exception as e:
+                db.rollback()
+                job.status = FAILED
+                job.error = str(e) or type(e).__name__
+            job.finished_at = datetime.utcnow()
+            db.commit()
+            logger.info(f"[Tool Jobs] Job {job.id} {job.status} after {(job.finished_at - job.started_at).total_seconds():.1f}s")
+
+            if after_turn is not None and not after_turn.is_set():
+                # The acknowledgement of the call has to be stored and sent before its outcome
+                await after_turn.wait()
+            await self._deliver(db, job)
+            return job
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[Tool Jobs] Error running job {job_id}: {e}")
+            return None
+        finally:
+            db.close()
+
+    async def _deliver(self, db: Session, job: ToolJob) -> None:
+        # Mark the job delivered only once the follow-up reply went out
+        if self.deliver is None:
+            return
+        try:
+            # The follow-up is a turn too: jobs it starts are delivered after its reply
+            async with self.turn():
+                delivered = await self.deliver(db, job)
+            if delivered:
+                job.delivered_at = datetime.utcnow()
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[Tool Jobs] Error delivering job {job.id}: {e}")
+
+    def resume_pending(self) -> int:
+        """
+        Schedule the jobs left unfinished or undelivered by a previous process (at startup).
+
+        Pending jobs are claimed when they run. A running job may still be running in
+        another process, so it is only claimed and run again once it has been running
+        for longer than the job timeout plus RUNNING_JOB_GRACE_SECONDS.
+
+        Returns:
+            Number of jobs scheduled
+        """
+        db = self.session_factory()
+        try:
+            candidates = db.query(ToolJob.id, ToolJob.status, ToolJob.started_at).filter(or_(
+                ToolJob.status.in_([PENDING, RUNNING]),
+                and_(ToolJob.status.in_(list(FINISHED_STATUSES)), ToolJob.delivered_at.is_(None))
+            )).all()
+        finally:
+            db.close()
+        for job_id, status, started_at in candidates:
+            if status == RUNNING:
+                self._track(self._resume_when_orphaned(job_id, started_at))
+            else:
+                self.schedule(job_id)
+        if candidates:
+            logger.info(f"[Tool Jobs] Resumed {len(candidates)} unfinished or undelivered job(s)")
+        return len(candidates)
+
+    async def _resume_when_orphaned(self, job_id: str, started_at: Optional[datetime]) -> Optional[ToolJob]:
+        if started_at is not None:
+            now = datetime.now(timezone.utc) if started_at.tzinfo else datetime.utcnow()
+            wait = self.timeout_seconds + RUNNING_JOB_GRACE_SECONDS - (now - started_at).total_seconds()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        db = self.session_factory()
+        try:
+            claimed = self._claim(db, job_id, RUNNING, started_at)
+        finally:
+            db.close()
+        if not claimed:
+            return None
+        return await self._run_with_slot(job_id, claimed=True)
+
+    def _claim(self, db: Session, job_id: str, status: str, started_at: Optional[datetime]) -> bool:
+        # Conditional update: only matches while no other process has claimed the job since it was read
+        claimed = db.query(ToolJob).filter(
+            ToolJob.id == job_id,
+            ToolJob.status == status,
+            ToolJob.started_at.is_(None) if started_at is None else ToolJob.started_at == started_at
+        ).update({ToolJob.status: RUNNING, ToolJob.started_at: datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            logger.info(f"[Tool Jobs] Job {job_id} was claimed by another process, skipping")
+        return bool(claimed)
+
+
+# Shared runner used by the tool call handler
+tool_job_runner = ToolJobRunner()
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import logging
+
+from db import get_db
+from models import Conversation, ToolJob, ToolJobResponse
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+@router.get("/tool-jobs/{job_id}", response_model=ToolJobResponse)
+async def get_tool_job(job_id: str, db: Session = Depends(get_db)):
+    """
+    Get a background tool job, to poll its status.
+
+    Args:
+        job_id: The job ID (the handle returned with the tool call)
+
+    Returns:
+        The job with its status and, once finished, its result or error
+    """
+    job = db.get(ToolJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Tool job not found")
+    return job
+
+@router.get("/conversations/{conversation_id}/tool-jobs", response_model=List[ToolJobResponse])
+async def get_tool_jobs_for_conversation(
+    conversation_id: str,
+    status: Optional[str] = Query(None, description="Only jobs with this status (pending, running, succeeded, failed)"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of jobs to list"),
+    db: Session = Depends(get_db)
+):
+    """
+    List the background tool jobs of a conversation, newest first.
+
+    Args:
+        conversation_id: The conversation ID
+        status: Optional status filter
+        limit: Maximum number of jobs
+
+    Returns:
+        The jobs
+    """
+    if not db.query(Conversation.chatid).filter(Conversation.chatid == conversation_id).first():
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    query = db.query(ToolJob).filter(ToolJob.chatid == conversation_id)
+    if status:
+        query = query.filter(ToolJob.status == status)
+    return query.order_by(ToolJob.created_at.desc()).limit(limit).all()
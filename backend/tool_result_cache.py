@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Maximum number of cached tool results
+TOOL_RESULT_CACHE_SIZE = int(os.environ.get("TOOL_RESULT_CACHE_SIZE", "1024"))
+# TTL for GET/HEAD API requests without their own cache_ttl_seconds (0 disables caching by default)
+TOOL_RESULT_CACHE_DEFAULT_TTL = int(os.environ.get("TOOL_RESULT_CACHE_DEFAULT_TTL", "60"))
+# Results longer than this (in characters) are not cached
+TOOL_RESULT_CACHE_MAX_ENTRY_CHARS = int(os.environ.get("TOOL_RESULT_CACHE_MAX_ENTRY_CHARS", "262144"))
+
+# Methods whose responses may be cached without an explicit per-request TTL
+IDEMPOTENT_METHODS = {"GET", "HEAD"}
+
+
+def cache_ttl_for(method: str, cache_ttl_seconds: Optional[int]) -> int:
+    """
+    Get the TTL to cache the result of an API request with.
+
+    GET and HEAD requests use their cache_ttl_seconds or the default TTL. Other methods
+    are never cached unless the API request explicitly sets a cache_ttl_seconds, and
+    0 always disables caching.
+
+    Args:
+        method: HTTP method of the request
+        cache_ttl_seconds: The API request's configured TTL, if any
+
+    Returns:
+        TTL in seconds, 0 if the result must not be cached
+    """
+    if cache_ttl_seconds is not None:
+        return max(cache_ttl_seconds, 0)
+    if method.upper() in IDEMPOTENT_METHODS:
+        return TOOL_RESULT_CACHE_DEFAULT_TTL
+    return 0
+
+
+def tool_result_key(
+    api_request_id: str,
+    method: str,
+    url: str,
+    headers: Dict[str, Any],
+    params: Dict[str, Any],
+    body: Dict[str, Any],
+    response_mapping: Optional[Dict[str, str]] = None
+) -> str:
+    """
+    Build the cache key of an API call.
+
+    The key covers everything that reaches the upstream API, with argument order
+    normalised, plus the response mapping the cached result was shaped with. Header
+    values (API keys) only enter the hash, they are never stored.
+
+    Returns:
+        Hex digest identifying the call
+    """
+    canonical = json.dumps(
+        [api_request_id, method.upper(), url, {k.lower(): v for k, v in headers.items()}, params, body, response_mapping],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ToolResultCache:
+    """
+    Size-bounded TTL cache of API tool results.
+
+    Entries expire after their TTL and the least recently used entry is evicted when the
+    cache is full. Concurrent calls for the same key share one upstream request.
+    """
+
+    def __init__(self, max_entries: int = TOOL_RESULT_CACHE_SIZE, max_entry_chars: int = TOOL_RESULT_CACHE_MAX_ENTRY_CHARS):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached results
+            max_entry_chars: Results longer than this are not cached
+        """
+        self.max_entries = max_entries
+        self.max_entry_chars = max_entry_chars
+        # key -> (expires at, result)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._in_flight: Dict[str, "asyncio.Task[str]"] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "shared": 0, "stores": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Get a cached result.
+
+        Args:
+            key: The cache key (see tool_result_key)
+
+        Returns:
+            The result, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key: str, result: str, ttl: int) -> None:
+        """
+        Cache a result.
+
+        Args:
+            key: The cache key
+            result: The tool result
+            ttl: Seconds until the entry expires
+        """
+        if ttl <= 0 or len(result) > self.max_entry_chars:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, result)
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    async def get_or_fetch(self, key: str, ttl: int, fetch: Callable[[], Awaitable[Tuple[str, bool]]]) -> str:
+        """
+        Get a cached result, or fetch and cache it.
+
+        Args:
+            key: The cache key
+            ttl: Seconds to keep a fetched result
+            fetch: Makes the upstream call; returns (result, whether it may be cached)
+
+        Returns:
+            The tool result
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            # The same call is already on its way upstream
+            self._stats["shared"] += 1
+            return await asyncio.shield(in_flight)
+
+        async def fetch_and_store() -> str:
+            result, cacheable = await fetch()
+            if cacheable:
+                self.put(key, result, ttl)
+            return result
+
+        def finished(task: "asyncio.Task[str]") -> None:
+            self._in_flight.pop(key, None)
+            if not task.cancelled():
+                # Only waiters should see the exception, not the event loop
+                task.exception()
+
+        # The fetch runs as its own task: a turn cancelled at its deadline stops waiting,
+        # but the fetch goes on for the other turns waiting on it
+        task = asyncio.get_running_loop().create_task(fetch_and_store())
+        self._in_flight[key] = task
+        task.add_done_callback(finished)
+        return await asyncio.shield(task)
+
+    def clear(self) -> None:
+        """Drop all cached results."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get hit/miss counters.
+
+        Returns:
+            Counters plus the current size and hit rate
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# Shared cache used by the API tool executor
+tool_result_cache = ToolResultCache()
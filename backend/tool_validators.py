@@ -0,0 +1,118 @@
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import fastjsonschema
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+def to_json_schema(schema: Any) -> Any:
+    """
+    Convert OpenAPI 3.0 schema keywords to their JSON Schema equivalents.
+
+    "nullable: true" becomes a "null" member of the type, so null arguments the upstream
+    API accepts are not rejected. Other keywords are kept as they are.
+
+    Args:
+        schema: An OpenAPI (or JSON Schema) schema
+
+    Returns:
+        A converted copy
+    """
+    if isinstance(schema, list):
+        return [to_json_schema(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    converted = {key: to_json_schema(value) for key, value in schema.items() if key != "nullable"}
+    if schema.get("nullable") is True and isinstance(schema.get("type"), str):
+        converted["type"] = [schema["type"], "null"]
+    return converted
+
+
+class ArgumentValidator:
+    """
+    Validates the arguments of one tool against its parameters schema.
+
+    The schema is compiled into a fastjsonschema validator on first use, so building a
+    tools payload stays cheap and only tools the model actually calls are compiled.
+    Schemas that cannot be compiled (e.g. unresolved references) disable validation
+    for the tool instead of failing its calls.
+    """
+
+    def __init__(self, tool_name: str, parameters_schema: Dict[str, Any]):
+        """
+        Initialize the validator.
+
+        Args:
+            tool_name: Function name of the tool, for error messages
+            parameters_schema: The tool's parameters as sent to the model
+        """
+        self.tool_name = tool_name
+        self.parameters_schema = parameters_schema
+        self._compiled: Optional[Callable[[Any], Any]] = None
+        self._unavailable = False
+        self._lock = threading.Lock()
+
+    def _get_compiled(self) -> Optional[Callable[[Any], Any]]:
+        if self._compiled is None and not self._unavailable:
+            with self._lock:
+                if self._compiled is None and not self._unavailable:
+                    try:
+                        # use_default=False: validation must never change the arguments
+                        self._compiled = fastjsonschema.compile(to_json_schema(self.parameters_schema), use_default=False)
+                    except Exception as e:
+                        logger.warning(f"[Tool Validators] Not validating arguments of {self.tool_name}: {e}")
+                        self._unavailable = True
+        return self._compiled
+
+    def validate(self, arguments: Any) -> Optional[Dict[str, Any]]:
+        """
+        Check arguments against the schema.
+
+        Args:
+            arguments: The decoded arguments of a tool call
+
+        Returns:
+            None if the arguments are valid (or cannot be checked), else a structured error
+        """
+        compiled = self._get_compiled()
+        if compiled is None:
+            return None
+        try:
+            compiled(arguments)
+        except fastjsonschema.JsonSchemaValueException as e:
+            field = ".".join(str(part) for part in (e.path or [])[1:])
+            # fastjsonschema names the validated value "data"
+            message = e.message
+            if message.startswith("data."):
+                message = message[len("data."):]
+            elif message.startswith("data "):
+                message = "arguments " + message[len("data "):]
+            error: Dict[str, Any] = {
+                "error": "invalid_arguments",
+                "tool": self.tool_name,
+                "message": message,
+                "rule": e.rule,
+            }
+            if field:
+                error["field"] = field
+            if isinstance(e.rule_definition, (str, int, float, bool, list)):
+                error["expected"] = e.rule_definition
+            return error
+        return None
+
+
+def validation_error_result(error: Dict[str, Any]) -> str:
+    """
+    Format a validation error as the tool result sent back to the model.
+
+    Args:
+        error: The error from ArgumentValidator.validate
+
+    Returns:
+        JSON the model can use to correct its call
+    """
+    return json.dumps({**error, "hint": "The call was not executed. Fix the arguments and call the tool again."}, ensure_ascii=False)
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from typing import List, Dict, Any, Optional
 import logging
 import uuid
@@ -9,8 +10,14 @@ import json
 from pydantic import BaseModel
 
 from db import get_db
-from models import Tool, ToolCreate, ToolUpdate, ToolResponse, ChatSettings, ToolType, ApiToolConfig, OpenAIToolConfig, MessageToolConfig, Conversation, ApiRequest, Api
+from models import Tool, ToolCreate, ToolUpdate, ToolResponse, ChatSettings, ToolType, ApiToolConfig, OpenAIToolConfig, MessageToolConfig, Conversation, ApiRequest, ApiRequestUpdate, Api, ComponentSchema, chat_settings_tools
 from openai_helper import openai_helper
+from openapi_schema import SchemaRefResolver, ComponentCatalog, resolve_request_body_schema
+from tool_result_cache import tool_result_cache
+from request_plans import build_parameters_schema, normalize_parameters
+from local_tools import local_tools, LOCAL_TOOL_CONFIG_KEY
+from resilience import circuit_breakers
+from chat_settings_router import ensure_settings_editable
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -57,20 +64,8 @@ async def create_tool(tool: ToolCreate, db: Session = Depends(get_db)):
             
             # Build parameters schema from API request if not provided
             if not tool.function_schema:
-                parameters_schema = {
-                    "type": "object",
-                    "properties": {},
-                    "required": []
-                }
-                
-                # Use request_body_schema if available
-                if api_request.request_body_schema:
-                    if isinstance(api_request.request_body_schema, dict):
-                        schema = api_request.request_body_schema
-                        if "properties" in schema:
-                            parameters_schema["properties"] = schema["properties"]
-                        if "required" in schema:
-                            parameters_schema["required"] = schema["required"]
+                # Path/query/header parameters plus the request body, without skipped or constant ones
+                parameters_schema = build_parameters_schema(api_request, resolve_request_body_schema(api_request, db))
                 
                 # Create the complete function schema
                 function_schema = {
@@ -149,6 +144,7 @@ async def create_tool(tool: ToolCreate, db: Session = Depends(get_db)):
         function_schema=function_schema,
         configuration={},  # Empty configuration for new tools
         skip_params=tool.skip_params,
+        long_running=tool.long_running,
         created_at=datetime.utcnow()
     )
     
@@ -213,11 +209,10 @@ async def update_tool(tool_id: str, tool: ToolUpdate, db: Session = Depends(get_
     if tool.description is not None:
         db_tool.description = tool.description
     if tool.configuration is not None:
-        # Merge the configurations
-        current_config = db_tool.configuration
-        for key, value in tool.configuration.items():
-            current_config[key] = value
-        db_tool.configuration = current_config
+        # Merge the configurations (into a new dict, so the JSON column is marked as changed)
+        db_tool.configuration = {**(db_tool.configuration or {}), **tool.configuration}
+    if tool.long_running is not None:
+        db_tool.long_running = tool.long_running
     
     # Update timestamp
     db_tool.updated_at = datetime.utcnow()
@@ -295,6 +290,7 @@ def get_openai_tools_for_chat(chat_id: str, db: Session = Depends(get_db)):
 async def update_tools_for_chat_settings(
     settings_id: str, 
     tool_ids: List[str],
+    apply_to_template: bool = Query(False, description="Allow changing a template shared by many conversations"),
     db: Session = Depends(get_db)
 ):
     # Check if chat settings exists
@@ -303,6 +299,9 @@ async def update_tools_for_chat_settings(
         logger.warning(f"Chat settings with ID {settings_id} not found.")
         raise HTTPException(status_code=404, detail="Chat settings not found")
     
+    # Editing a template changes it for every conversation sharing it
+    ensure_settings_editable(chat_settings, apply_to_template)
+    
     # Verify all tools exist
     tools = db.query(Tool).filter(Tool.id.in_(tool_ids)).all()
     if len(tools) != len(tool_ids):
@@ -311,51 +310,11 @@ async def update_tools_for_chat_settings(
         logger.warning(f"Some tools not found: {missing_ids}")
         raise HTTPException(status_code=404, detail=f"Tools not found: {missing_ids}")
     
-    # Get current tools for comparison
-    current_tool_ids = [t.id for t in chat_settings.tools]
-    
-    # Prepare the list of tools to associate
-    final_tools = []
-    final_tool_ids = []
-    
-    for tool in tools:
-        # For API-linked tools, check if it's already associated or needs to be copied
-        if tool.api_request_id and tool.id not in current_tool_ids:
-            # Generate a new UUID for the copy
-            new_tool_id = str(uuid.uuid4())
-            
-            # Create a new tool with the same API request but customized for this chat settings
-            tool_copy = Tool(
-                id=new_tool_id,
-                name=f"{tool.name} ({settings_id[:8]})",  # Add identifier to the name
-                description=tool.description,
-                type=ToolType.FUNCTION,
-                tool_type=ToolType.FUNCTION,
-                api_request_id=tool.api_request_id,
-                function_schema=tool.function_schema.copy() if tool.function_schema else None,
-                configuration={},  # Empty configuration for modern tools
-                skip_params=tool.skip_params,
-                created_at=datetime.utcnow()
-            )
-            
-            # Add to database
-            db.add(tool_copy)
-            db.commit()
-            db.refresh(tool_copy)
-            
-            logger.info(f"Created copy of API-linked tool {tool.id} with ID: {new_tool_id} for chat settings {settings_id}")
-            
-            # Use the copy
-            final_tools.append(tool_copy)
-            final_tool_ids.append(new_tool_id)
-        else:
-            # Use the original tool for non-API tools or already associated API tools
-            final_tools.append(tool)
-            final_tool_ids.append(tool.id)
-    
-    # Associate tools with chat settings
+    # Associate the tools themselves; API-linked tools are shared between settings and
+    # only copied when one settings customizes them (see update_api_tool_headers)
+    tools_by_id = {t.id: t for t in tools}
+    final_tools = [tools_by_id[tid] for tid in dict.fromkeys(tool_ids)]
     chat_settings.tools = final_tools
-    chat_settings.enabled_tools = final_tool_ids  # For backward compatibility
     
     # Save changes
     db.add(chat_settings)
@@ -369,6 +328,7 @@ async def update_tools_for_chat_settings(
 async def add_tool_to_chat_settings(
     settings_id: str,
     tool_id: str,
+    apply_to_template: bool = Query(False, description="Allow changing a template shared by many conversations"),
     db: Session = Depends(get_db)
 ):
     # Check if chat settings exists
@@ -377,42 +337,15 @@ async def add_tool_to_chat_settings(
         logger.warning(f"Chat settings with ID {settings_id} not found.")
         raise HTTPException(status_code=404, detail="Chat settings not found")
     
+    # Editing a template changes it for every conversation sharing it
+    ensure_settings_editable(chat_settings, apply_to_template)
+    
     # Check if tool exists
     tool = db.query(Tool).filter(Tool.id == tool_id).first()
     if not tool:
         logger.warning(f"Tool with ID {tool_id} not found.")
         raise HTTPException(status_code=404, detail="Tool not found")
     
-    # For API-linked tools, create a copy instead of using the original
-    if tool.api_request_id:
-        # Generate a new UUID for the copy
-        new_tool_id = str(uuid.uuid4())
-        
-        # Create a new tool with the same API request but customized for this chat settings
-        tool_copy = Tool(
-            id=new_tool_id,
-            name=f"{tool.name} ({settings_id[:8]})",  # Add identifier to the name
-            description=tool.description,
-            type=ToolType.FUNCTION,
-            tool_type=ToolType.FUNCTION,
-            api_request_id=tool.api_request_id,
-            function_schema=tool.function_schema.copy() if tool.function_schema else None,
-            configuration={},  # Empty configuration for modern tools
-            skip_params=tool.skip_params,
-            created_at=datetime.utcnow()
-        )
-        
-        # Add to database
-        db.add(tool_copy)
-        db.commit()
-        db.refresh(tool_copy)
-        
-        logger.info(f"Created copy of API-linked tool {tool_id} with ID: {new_tool_id} for chat settings {settings_id}")
-        
-        # Use the copy instead of the original
-        tool = tool_copy
-        tool_id = new_tool_id
-    
     # Check if tool is already associated with chat settings
     if tool in chat_settings.tools:
         logger.info(f"Tool {tool_id} is already associated with chat settings {settings_id}")
@@ -432,6 +365,7 @@ async def add_tool_to_chat_settings(
 async def remove_tool_from_chat_settings(
     settings_id: str,
     tool_id: str,
+    apply_to_template: bool = Query(False, description="Allow changing a template shared by many conversations"),
     db: Session = Depends(get_db)
 ):
     # Check if chat settings exists
@@ -440,6 +374,9 @@ async def remove_tool_from_chat_settings(
         logger.warning(f"Chat settings with ID {settings_id} not found.")
         raise HTTPException(status_code=404, detail="Chat settings not found")
     
+    # Editing a template changes it for every conversation sharing it
+    ensure_settings_editable(chat_settings, apply_to_template)
+    
     # Check if tool exists
     tool = db.query(Tool).filter(Tool.id == tool_id).first()
     if not tool:
@@ -462,6 +399,7 @@ async def update_api_tool_headers(
     settings_id: str,
     tool_id: str,
     headers: Dict[str, str],
+    apply_to_template: bool = Query(False, description="Allow changing a template shared by many conversations"),
     db: Session = Depends(get_db)
 ):
     """
@@ -471,6 +409,7 @@ async def update_api_tool_headers(
         settings_id: The chat settings ID
         tool_id: The tool ID
         headers: A dictionary of header name to header value
+        apply_to_template: Whether to allow changing a shared settings template
         db: Database session
         
     Returns:
@@ -482,6 +421,9 @@ async def update_api_tool_headers(
         logger.warning(f"Chat settings with ID {settings_id} not found.")
         raise HTTPException(status_code=404, detail="Chat settings not found")
     
+    # Editing a template changes it for every conversation sharing it
+    ensure_settings_editable(chat_settings, apply_to_template)
+    
     # Find the tool in chat settings
     tool = None
     for t in chat_settings.tools:
@@ -494,7 +436,7 @@ async def update_api_tool_headers(
         raise HTTPException(status_code=404, detail="Tool not found in chat settings")
     
     # Verify it's an API tool
-    if tool.type != ToolType.API_TOOL:
+    if not tool.api_request_id:
         logger.warning(f"Tool {tool_id} is not an API tool")
         raise HTTPException(status_code=400, detail="Only API tools can have headers updated")
     
@@ -511,11 +453,36 @@ async def update_api_tool_headers(
         for header_name, header_value in headers.items():
             config["headers"][header_name] = header_value
         
-        logger.info(f"Updating headers for tool {tool_id}: {config['headers']}")
+        logger.info(f"Updating headers for tool {tool_id}: {list(config['headers'].keys())}")
         
-        # Update the tool configuration 
-        tool.configuration = config
-        tool.updated_at = datetime.utcnow()
+        # Copy-on-write: a tool shared with other chat settings is copied for this one
+        shared_with_others = db.query(chat_settings_tools.c.chat_settings_id).filter(
+            chat_settings_tools.c.tool_id == tool_id,
+            chat_settings_tools.c.chat_settings_id != settings_id
+        ).first() is not None
+        
+        if shared_with_others:
+            tool_copy = Tool(
+                id=str(uuid.uuid4()),
+                name=tool.name,
+                description=tool.description,
+                type=tool.type,
+                tool_type=tool.tool_type,
+                api_request_id=tool.api_request_id,
+                function_schema=tool.function_schema.copy() if tool.function_schema else None,
+                configuration=config,
+                skip_params=tool.skip_params,
+                created_at=datetime.utcnow()
+            )
+            db.add(tool_copy)
+            chat_settings.tools = [tool_copy if t.id == tool_id else t for t in chat_settings.tools]
+            logger.info(f"Copied shared tool {tool_id} to {tool_copy.id} for chat settings {settings_id}")
+            tool = tool_copy
+            tool_id = tool_copy.id
+        else:
+            # Update the tool configuration 
+            tool.configuration = config
+            tool.updated_at = datetime.utcnow()
         
         # Save changes
         db.add(tool)
@@ -534,27 +501,122 @@ async def update_api_tool_headers(
         logger.error(f"Error updating headers for API tool {tool_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Error updating tool headers: {str(e)}")
 
+# Number of API request rows sent per executemany batch during OpenAPI import
+OPENAPI_IMPORT_BATCH_SIZE = 500
+
+# OpenAPI path item fields that are not operations
+NON_OPERATION_FIELDS = ['parameters', 'summary', 'description', 'servers']
+
 class OpenAPIImportResponse(BaseModel):
     api_id: str
     api_name: str
     api_requests_created: int
-    api_requests: List[Dict[str, Any]]
+    # Only populated when include_requests=true, one page at a time
+    api_requests: Optional[List[Dict[str, Any]]] = None
+    offset: int = 0
+    limit: Optional[int] = None
+
+def _iter_api_request_rows(spec: Dict[str, Any], api_id: str, catalog: ComponentCatalog):
+    """
+    Yield one API request row per operation in an OpenAPI spec, without touching the database.
+    
+    Request body schemas are not resolved here: they are registered in the catalog and the
+    row only references them by hash (see resolve_request_body_schema).
+    
+    Args:
+        spec: The parsed OpenAPI specification
+        api_id: ID of the API record the rows belong to
+        catalog: Component catalog of the spec, collecting the schemas to store
+        
+    Yields:
+        Tuples of (row dict for the api_requests table, summary dict for the import response)
+    """
+    for path, path_item in spec.get('paths', {}).items():
+        # Get path parameters if any
+        path_parameters = path_item.get('parameters', [])
+        
+        # Process each operation (GET, POST, etc.)
+        for method, operation in path_item.items():
+            # Skip non-operation fields like 'parameters'
+            if method in NON_OPERATION_FIELDS:
+                continue
+            
+            # Get operation details
+            operation_id = operation.get('operationId')
+            if not operation_id:
+                # Create a sanitized operation ID if not provided
+                sanitized_path = path.replace('/', '_').replace('{', '').replace('}', '')
+                operation_id = f"{method}{sanitized_path}"
+            
+            summary = operation.get('summary', f"{method.upper()} {path}")
+            description = operation.get('description', summary)
+            
+            # Combine path parameters with operation parameters (operation ones override)
+            parameters = normalize_parameters(path_parameters + operation.get('parameters', []), spec)
+            
+            # Get request body schema if exists
+            request_body = operation.get('requestBody', {})
+            request_content = request_body.get('content', {})
+            request_schema_hash = None
+            schema_refs = None
+            
+            for content_type, content_obj in request_content.items():
+                if 'schema' in content_obj:
+                    # Store the schema (and every component it references) by content hash
+                    request_schema_hash, schema_refs = catalog.add_schema(content_obj['schema'])
+                    break
+            
+            api_request_id = str(uuid.uuid4())
+            
+            row = {
+                "id": api_request_id,
+                "api_id": api_id,
+                "path": path,
+                "method": method.upper(),
+                "description": description,
+                "request_body_schema": None,
+                "request_body_schema_hash": request_schema_hash,
+                "schema_refs": schema_refs or None,
+                "response_schema": None,
+                "parameters": parameters or None,
+                "skip_parameters": None,
+                "constant_parameters": None
+            }
+            summary_entry = {
+                "id": api_request_id,
+                "path": path,
+                "method": method.upper(),
+                "description": description,
+                "operation_id": operation_id
+            }
+            yield row, summary_entry
 
 @router.post("/tools/import-openapi", response_model=OpenAPIImportResponse)
 async def import_openapi_spec(
     file: UploadFile = File(...),
+    include_requests: bool = Query(False, description="Include a page of the created API requests in the response"),
+    offset: int = Query(0, ge=0, description="Offset of the first API request to list"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of API requests to list"),
     db: Session = Depends(get_db)
 ):
     """
     Import an OpenAPI specification (JSON or YAML) and create API and API request records.
     This does NOT automatically create tools - you need to explicitly create tools from the API requests.
     
+    API requests are bulk-inserted in batches of OPENAPI_IMPORT_BATCH_SIZE rows (executemany)
+    inside a single transaction, without building ORM objects. Request body schemas and the
+    components they reference are stored once in component_schemas, keyed by content hash,
+    and shared with every other request (and API) using the same schema.
+    
     Args:
         file: The OpenAPI spec file (JSON or YAML)
+        include_requests: Whether to list the created API requests
+        offset: Offset of the first listed API request
+        limit: Maximum number of listed API requests
         db: Database session
     
     Returns:
-        OpenAPIImportResponse with the number of API requests created and their details
+        OpenAPIImportResponse with the number of API requests created and, optionally, a page of their details
     """
     try:
         # Read file content
@@ -576,6 +638,9 @@ async def import_openapi_spec(
             logger.error(f"Error parsing OpenAPI spec: {e}")
             raise HTTPException(status_code=400, detail=f"Invalid OpenAPI specification: {str(e)}")
         
+        # The raw bytes are no longer needed once parsed
+        del content
+        
         # Validate that it's an OpenAPI spec
         if 'openapi' not in spec:
             raise HTTPException(status_code=400, detail="File is not a valid OpenAPI specification")
@@ -595,102 +660,64 @@ async def import_openapi_spec(
             if 'url' in server_obj:
                 server_url = server_obj['url']
         
-        # Create the API record
-        db_api = Api(
-            id=api_id,
-            server=server_url,
-            service=api_title,
-            provider=spec.get('info', {}).get('contact', {}).get('name', 'Unknown'),
-            version=api_version,
-            description=api_description,
-            processed=True
-        )
-        
-        # Add to database
-        db.add(db_api)
-        db.commit()
-        db.refresh(db_api)
-        
-        logger.info(f"Created API record with ID: {api_id}")
-        
-        # List to store created API requests
-        api_requests = []
-        
-        # Process paths and operations
-        for path, path_item in spec.get('paths', {}).items():
-            # Get path parameters if any
-            path_parameters = path_item.get('parameters', [])
+        try:
+            # Create the API record (same transaction as its requests)
+            db.execute(Api.__table__.insert().values(
+                id=api_id,
+                server=server_url,
+                service=api_title,
+                provider=spec.get('info', {}).get('contact', {}).get('name', 'Unknown'),
+                version=api_version,
+                description=api_description,
+                processed=True
+            ))
             
-            # Process each operation (GET, POST, etc.)
-            for method, operation in path_item.items():
-                # Skip non-operation fields like 'parameters'
-                if method in ['parameters', 'summary', 'description', 'servers']:
-                    continue
-                
-                # Get operation details
-                operation_id = operation.get('operationId')
-                if not operation_id:
-                    # Create a sanitized operation ID if not provided
-                    sanitized_path = path.replace('/', '_').replace('{', '').replace('}', '')
-                    operation_id = f"{method}{sanitized_path}"
-                
-                summary = operation.get('summary', f"{method.upper()} {path}")
-                description = operation.get('description', summary)
-                
-                # Combine path parameters with operation parameters
-                parameters = path_parameters.copy()
-                parameters.extend(operation.get('parameters', []))
-                
-                # Get request body schema if exists
-                request_body = operation.get('requestBody', {})
-                request_content = request_body.get('content', {})
-                request_schema = None
-                
-                for content_type, content_obj in request_content.items():
-                    if 'schema' in content_obj:
-                        schema = content_obj['schema']
-                        # Resolve the schema if it's a reference
-                        request_schema = resolve_schema_reference_from_spec(schema, spec)
-                        break
-                
-                # Create a UUID for the API request
-                api_request_id = str(uuid.uuid4())
-                
-                # Create API request record
-                db_api_request = ApiRequest(
-                    id=api_request_id,
-                    api_id=api_id,
-                    path=path,
-                    method=method.upper(),
-                    description=description,
-                    request_body_schema=request_schema,
-                    skip_parameters=None,
-                    constant_parameters=None
-                )
+            # Stream API request rows into the database in batches
+            api_request_insert = ApiRequest.__table__.insert()
+            # Components may already exist from an earlier import of the same (or another) spec
+            component_insert = pg_insert(ComponentSchema.__table__).on_conflict_do_nothing(index_elements=["hash"])
+            catalog = ComponentCatalog(spec)
+            batch = []
+            created_count = 0
+            listed_requests = []
+            
+            def flush(rows: List[Dict[str, Any]]) -> None:
+                # Components first, the requests reference them
+                components = catalog.take_pending()
+                if components:
+                    db.execute(component_insert, components)
+                db.execute(api_request_insert, rows)
+            
+            for row, summary_entry in _iter_api_request_rows(spec, api_id, catalog):
+                if include_requests and offset <= created_count < offset + limit:
+                    listed_requests.append(summary_entry)
                 
-                # Add to database
-                db.add(db_api_request)
+                batch.append(row)
+                created_count += 1
                 
-                # Add to the list of created API requests
-                api_requests.append({
-                    "id": api_request_id,
-                    "path": path,
-                    "method": method.upper(),
-                    "description": description,
-                    "operation_id": operation_id
-                })
-        
-        # Commit all to the database
-        db.commit()
+                if len(batch) >= OPENAPI_IMPORT_BATCH_SIZE:
+                    flush(batch)
+                    batch = []
+            
+            if batch:
+                flush(batch)
+            
+            # Commit the API and all of its requests at once
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
         
-        logger.info(f"Created {len(api_requests)} API requests from OpenAPI spec")
+        logger.info(f"Created API record with ID: {api_id} and {created_count} API requests from OpenAPI spec ({len(catalog.components)} distinct schemas)")
         
-        # Return response with API requests info
+        # Return a compact summary, with a page of the created requests if asked for
         return OpenAPIImportResponse(
             api_id=api_id,
             api_name=api_title,
-            api_requests_created=len(api_requests),
-            api_requests=api_requests
+            api_requests_created=created_count,
+            api_requests=listed_requests if include_requests else None,
+            offset=offset,
+            limit=limit if include_requests else None
         )
         
     except HTTPException as e:
@@ -701,78 +728,25 @@ async def import_openapi_spec(
         logger.error(f"Error importing OpenAPI spec: {e}")
         raise HTTPException(status_code=500, detail=f"Error importing OpenAPI spec: {str(e)}")
 
-def resolve_schema_reference_from_spec(schema: Dict[str, Any], spec: Dict[str, Any]) -> Dict[str, Any]:
+def resolve_schema_reference_from_spec(
+    schema: Dict[str, Any],
+    spec: Dict[str, Any],
+    resolver: Optional[SchemaRefResolver] = None
+) -> Dict[str, Any]:
     """
-    Recursively resolve schema references from the OpenAPI spec.
+    Resolve schema references from the OpenAPI spec.
     
     Args:
         schema: The schema object which might contain references
         spec: The complete OpenAPI specification
+        resolver: Resolver to reuse across calls for the same spec, so each component is resolved only once
         
     Returns:
-        The fully resolved schema
+        The resolved schema (recursive and overly deep references become placeholder schemas)
     """
-    if not isinstance(schema, dict):
-        return schema
-    
-    # Make a copy to avoid modifying the original
-    result = {}
-    
-    # If this is a reference, resolve it
-    if "$ref" in schema:
-        ref = schema["$ref"]
-        
-        # Extract reference path - for example "#/components/schemas/CreateSpeechRequest"
-        if ref.startswith('#/'):
-            path_parts = ref[2:].split('/')
-            current = spec
-            
-            # Navigate through the reference path
-            for part in path_parts:
-                if part in current:
-                    current = current[part]
-                else:
-                    logger.warning(f"Could not resolve reference {ref}")
-                    # If we can't resolve, return with a description of the reference
-                    return {
-                        "type": "object",
-                        "description": f"Schema reference: {ref}. Check API documentation for details."
-                    }
-            
-            # Recursively resolve any nested references
-            resolved = resolve_schema_reference_from_spec(current, spec)
-            
-            # Merge any additional properties from the original reference
-            for key, value in schema.items():
-                if key != "$ref":
-                    if key not in resolved:
-                        resolved[key] = value
-            
-            return resolved
-        else:
-            # External references not supported in this implementation
-            logger.warning(f"External reference not supported: {ref}")
-            return {
-                "type": "object", 
-                "description": f"External schema reference: {ref}. Check API documentation for details."
-            }
-    
-    # Process all fields in the schema
-    for key, value in schema.items():
-        if isinstance(value, dict):
-            # Recursively resolve nested objects
-            result[key] = resolve_schema_reference_from_spec(value, spec)
-        elif isinstance(value, list):
-            # Recursively resolve items in arrays
-            result[key] = [
-                resolve_schema_reference_from_spec(item, spec) if isinstance(item, dict) else item
-                for item in value
-            ]
-        else:
-            # Copy primitive values as is
-            result[key] = value
-    
-    return result 
+    if resolver is None:
+        resolver = SchemaRefResolver(spec)
+    return resolver.resolve(schema)
 
 @router.get("/tools/find-settings-by-group-name/{group_name}")
 async def find_settings_by_group_name(group_name: str, db: Session = Depends(get_db)):
@@ -815,22 +789,37 @@ class ToolExecuteRequest(BaseModel):
     arguments: Dict[str, Any]
 
 @router.get("/api-requests", response_model=List[Dict[str, Any]])
-async def get_api_requests(db: Session = Depends(get_db)):
+async def get_api_requests(
+    resolve_schemas: bool = Query(False, description="Include the fully resolved request body schema of every request"),
+    db: Session = Depends(get_db)
+):
     """
     Get all API requests in the database.
     
+    Request body schemas are returned by hash (see GET /api/component-schemas/{hash}) unless
+    resolve_schemas is set. Requests imported before component storage still return their
+    inline request_body_schema.
+    
+    Args:
+        resolve_schemas: Whether to include the resolved request body schemas
+        db: Database session
+    
     Returns:
         List of API requests
     """
     try:
-        # Get all API requests
-        api_requests = db.query(ApiRequest).all()
+        # Get all API requests with their API in one query
+        api_requests = db.query(ApiRequest).options(joinedload(ApiRequest.api)).all()
         
         # Convert to response format
         response = []
         for req in api_requests:
-            # Get the API details
-            api = db.query(Api).filter(Api.id == req.api_id).first()
+            api = req.api
+            
+            if resolve_schemas:
+                request_body_schema = resolve_request_body_schema(req, db)
+            else:
+                request_body_schema = req.request_body_schema
             
             response.append({
                 "id": req.id,
@@ -841,7 +830,13 @@ async def get_api_requests(db: Session = Depends(get_db)):
                 "service": api.service if api else None,
                 "server": api.server if api else None,
                 "provider": api.provider if api else None,
-                "request_body_schema": req.request_body_schema
+                "request_body_schema": request_body_schema,
+                "request_body_schema_hash": req.request_body_schema_hash,
+                "parameters": req.parameters,
+                "skip_parameters": req.skip_parameters,
+                "constant_parameters": req.constant_parameters,
+                "cache_ttl_seconds": req.cache_ttl_seconds,
+                "max_response_bytes": req.max_response_bytes
             })
         
         logger.info(f"Fetched {len(response)} API requests")
@@ -850,6 +845,198 @@ async def get_api_requests(db: Session = Depends(get_db)):
         logger.error(f"Error getting API requests: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching API requests: {str(e)}")
 
+@router.put("/api-requests/{api_request_id}", response_model=Dict[str, Any])
+async def update_api_request(api_request_id: str, api_request_update: ApiRequestUpdate, db: Session = Depends(get_db)):
+    """
+    Update an API request.
+    
+    cache_ttl_seconds controls the tool result cache: GET/HEAD requests are cached for
+    TOOL_RESULT_CACHE_DEFAULT_TTL unless set, other methods only when set, and 0 disables it.
+    max_response_bytes caps the response body read from the API (TOOL_RESPONSE_MAX_BYTES
+    unless set). skip_parameters are hidden from the model and never sent;
+    constant_parameters are hidden and always sent with their fixed value.
+    
+    Args:
+        api_request_id: The ID of the API request
+        api_request_update: The fields to update
+        db: Database session
+    
+    Returns:
+        The updated API request
+    """
+    api_request = db.query(ApiRequest).filter(ApiRequest.id == api_request_id).first()
+    if not api_request:
+        raise HTTPException(status_code=404, detail="API request not found")
+    
+    if api_request_update.path is not None:
+        api_request.path = api_request_update.path
+    if api_request_update.method is not None:
+        api_request.method = api_request_update.method.upper()
+    if api_request_update.description is not None:
+        api_request.description = api_request_update.description
+    if api_request_update.request_body_schema is not None:
+        # An explicit inline schema replaces the stored component reference
+        api_request.request_body_schema = api_request_update.request_body_schema
+        api_request.request_body_schema_hash = None
+        api_request.schema_refs = None
+    if api_request_update.response_schema is not None:
+        api_request.response_schema = api_request_update.response_schema
+    if api_request_update.parameters is not None:
+        api_request.parameters = normalize_parameters(api_request_update.parameters)
+    if api_request_update.skip_parameters is not None:
+        api_request.skip_parameters = api_request_update.skip_parameters
+    if api_request_update.constant_parameters is not None:
+        api_request.constant_parameters = api_request_update.constant_parameters
+    if api_request_update.cache_ttl_seconds is not None:
+        if api_request_update.cache_ttl_seconds < 0:
+            raise HTTPException(status_code=400, detail="cache_ttl_seconds must be 0 or greater")
+        api_request.cache_ttl_seconds = api_request_update.cache_ttl_seconds
+    if api_request_update.max_response_bytes is not None:
+        if api_request_update.max_response_bytes < 1:
+            raise HTTPException(status_code=400, detail="max_response_bytes must be 1 or greater")
+        api_request.max_response_bytes = api_request_update.max_response_bytes
+    
+    # Tools calling this request recompile their request plan and schema on next use, in every worker
+    api_request.updated_at = datetime.utcnow()
+    db.commit()
+    db.refresh(api_request)
+    
+    logger.info(f"Updated API request {api_request_id}")
+    return {
+        "id": api_request.id,
+        "api_id": api_request.api_id,
+        "path": api_request.path,
+        "method": api_request.method,
+        "description": api_request.description,
+        "request_body_schema": api_request.request_body_schema,
+        "request_body_schema_hash": api_request.request_body_schema_hash,
+        "parameters": api_request.parameters,
+        "skip_parameters": api_request.skip_parameters,
+        "constant_parameters": api_request.constant_parameters,
+        "cache_ttl_seconds": api_request.cache_ttl_seconds,
+        "max_response_bytes": api_request.max_response_bytes,
+        "updated_at": api_request.updated_at
+    }
+
+@router.get("/tool-result-cache/stats", response_model=Dict[str, Any])
+async def get_tool_result_cache_stats():
+    """
+    Get the hit/miss counters of the API tool result cache.
+    
+    Returns:
+        Cache counters, size and hit rate
+    """
+    return tool_result_cache.stats()
+
+@router.get("/circuit-breakers", response_model=Dict[str, Any])
+async def get_circuit_breakers():
+    """
+    Get the circuit breakers of the outbound calls (OpenAI, WuzAPI and each tool API host).
+    
+    Returns:
+        State and counters per upstream
+    """
+    return circuit_breakers.stats()
+
+@router.get("/openai-rate-limits", response_model=Dict[str, Any])
+async def get_openai_rate_limits():
+    """
+    Get the OpenAI call queue and, per pooled API key, its adaptive concurrency limit and last known quota.
+    
+    Returns:
+        Queue length and wait times, and the state of each key
+    """
+    return openai_helper.rate_limiter.stats()
+
+@router.delete("/tool-result-cache", status_code=204)
+async def clear_tool_result_cache():
+    """
+    Drop all cached API tool results.
+    """
+    tool_result_cache.clear()
+    logger.info("Cleared the tool result cache")
+    return None
+
+@router.get("/local-tools", response_model=List[Dict[str, Any]])
+async def get_local_tools():
+    """
+    List the registered local tools function tools can run.
+    
+    Returns:
+        Name, description, parameters schema and runtime limits of each tool
+    """
+    return [
+        {
+            "name": local_tool.name,
+            "description": local_tool.description,
+            "parameters": local_tool.parameters,
+            "executor": local_tool.executor,
+            "timeout_seconds": local_tool.timeout_seconds,
+            "max_concurrency": local_tool.max_concurrency,
+            "memory_limit_mb": local_tool.memory_limit_mb
+        }
+        for local_tool in local_tools.list_tools()
+    ]
+
+@router.post("/local-tools/{name}/tool", response_model=ToolResponse)
+async def create_local_function_tool(name: str, db: Session = Depends(get_db)):
+    """
+    Create a function tool that runs a registered local tool.
+    
+    Args:
+        name: The local tool name
+        
+    Returns:
+        The new tool
+    """
+    local_tool = local_tools.get(name)
+    if local_tool is None:
+        raise HTTPException(status_code=404, detail=f"Local tool {name} not found")
+    
+    tool_id = str(uuid.uuid4())
+    db_tool = Tool(
+        id=tool_id,
+        name=local_tool.name,
+        description=local_tool.description,
+        type=str(ToolType.FUNCTION),
+        tool_type=ToolType.FUNCTION,
+        function_schema={
+            "name": local_tool.name,
+            "description": local_tool.description,
+            "parameters": local_tool.parameters
+        },
+        configuration={LOCAL_TOOL_CONFIG_KEY: local_tool.name},
+        created_at=datetime.utcnow()
+    )
+    db.add(db_tool)
+    db.commit()
+    db.refresh(db_tool)
+    
+    logger.info(f"Created function tool {tool_id} for local tool {name}")
+    return db_tool
+
+@router.get("/component-schemas/{schema_hash}", response_model=Dict[str, Any])
+async def get_component_schema(schema_hash: str, db: Session = Depends(get_db)):
+    """
+    Get a stored (unresolved) component schema by its content hash.
+    
+    Args:
+        schema_hash: The sha256 content hash of the schema
+        db: Database session
+    
+    Returns:
+        The component schema with its name and definition
+    """
+    component = db.query(ComponentSchema).filter(ComponentSchema.hash == schema_hash).first()
+    if not component:
+        raise HTTPException(status_code=404, detail="Component schema not found")
+    
+    return {
+        "hash": component.hash,
+        "name": component.name,
+        "definition": component.definition
+    }
+
 @router.post("/tools/execute")
 async def execute_tool(request: ToolExecuteRequest, db: Session = Depends(get_db)):
     """
@@ -866,7 +1053,7 @@ async def execute_tool(request: ToolExecuteRequest, db: Session = Depends(get_db
     logger.info(f"Executing tool {tool.name} ({tool.id})")
     
     # Execute the tool based on its type
-    if tool.type == ToolType.API_TOOL:
+    if tool.api_request_id:
         # Execute the API tool
         result_data = await openai_helper.execute_api_tool(tool, request.arguments)
         return {"result": result_data}
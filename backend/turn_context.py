@@ -0,0 +1,299 @@
+import os
+import logging
+from functools import lru_cache
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import func, select, bindparam
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from models import Conversation, ChatSettings, Tool, ApiRequest, Message, MessageType
+from openapi_schema import resolve_request_body_schema
+from token_counter import HISTORY_FIELD_MAX_CHARS, MESSAGE_OVERHEAD_TOKENS
+from deadline import default_turn_timeout
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Tokens of message history per turn for chat settings without their own history_token_budget
+DEFAULT_HISTORY_TOKEN_BUDGET = int(os.environ.get("DEFAULT_HISTORY_TOKEN_BUDGET", "6000"))
+# Upper bound on the number of messages in the history window, whatever the budget
+HISTORY_MAX_MESSAGES = int(os.environ.get("HISTORY_MAX_MESSAGES", "100"))
+
+
+# Immutable snapshots of the rows a turn needs. Attribute names match the ORM models,
+# so the helper code works on either, but snapshots never trigger lazy loads or refreshes.
+
+class ApiSnapshot(NamedTuple):
+    id: str
+    server: str
+    service: str
+
+
+class ApiRequestSnapshot(NamedTuple):
+    id: str
+    api_id: str
+    path: str
+    method: str
+    description: Optional[str]
+    request_body_schema: Optional[Dict[str, Any]]  # Already resolved
+    parameters: Optional[List[Dict[str, Any]]]
+    skip_parameters: Optional[List[str]]
+    constant_parameters: Optional[Dict[str, Any]]
+    cache_ttl_seconds: Optional[int]
+    max_response_bytes: Optional[int]
+    updated_at: Optional[datetime]
+    api: Optional[ApiSnapshot]
+
+
+class ToolSnapshot(NamedTuple):
+    id: str
+    name: Optional[str]
+    description: Optional[str]
+    type: str
+    tool_type: Optional[str]
+    api_request_id: Optional[str]
+    configuration: Dict[str, Any]
+    function_schema: Optional[Dict[str, Any]]
+    skip_params: Optional[List[str]]
+    long_running: bool
+    updated_at: Optional[datetime]
+    api_request: Optional[ApiRequestSnapshot]
+
+
+class ChatSettingsSnapshot(NamedTuple):
+    id: str
+    name: str
+    system_prompt: str
+    model: str
+    is_template: bool
+    history_token_budget: Optional[int]
+    turn_timeout_seconds: Optional[int]
+    tools: Tuple[ToolSnapshot, ...]
+
+
+class TurnContext(NamedTuple):
+    chatid: str
+    name: Optional[str]
+    is_group: bool
+    group_name: Optional[str]
+    source_type: str
+    portal_user_id: Optional[str]
+    chat_settings: Optional[ChatSettingsSnapshot]
+    summary: Optional[str] = None  # Rolling summary of the messages older than the history window
+
+    @property
+    def history_token_budget(self) -> int:
+        """Tokens of message history to send per turn."""
+        if self.chat_settings is not None and self.chat_settings.history_token_budget:
+            return self.chat_settings.history_token_budget
+        return DEFAULT_HISTORY_TOKEN_BUDGET
+
+    @property
+    def turn_timeout_seconds(self) -> float:
+        """Time budget of a turn, in seconds."""
+        if self.chat_settings is not None and self.chat_settings.turn_timeout_seconds:
+            return self.chat_settings.turn_timeout_seconds
+        return default_turn_timeout(self.source_type)
+
+    def find_tool(self, tool_id: str) -> Optional[ToolSnapshot]:
+        """Get an enabled tool by ID."""
+        if self.chat_settings is None:
+            return None
+        for tool in self.chat_settings.tools:
+            if tool.id == tool_id:
+                return tool
+        return None
+
+
+def _snapshot_api_request(api_request: ApiRequest, db: Session) -> ApiRequestSnapshot:
+    api = api_request.api
+    return ApiRequestSnapshot(
+        id=api_request.id,
+        api_id=api_request.api_id,
+        path=api_request.path,
+        method=api_request.method,
+        description=api_request.description,
+        # Resolved once here (cached per schema), so nothing needs the session later
+        request_body_schema=resolve_request_body_schema(api_request, db),
+        parameters=api_request.parameters,
+        skip_parameters=api_request.skip_parameters,
+        constant_parameters=api_request.constant_parameters,
+        cache_ttl_seconds=api_request.cache_ttl_seconds,
+        max_response_bytes=api_request.max_response_bytes,
+        updated_at=api_request.updated_at,
+        api=ApiSnapshot(id=api.id, server=api.server, service=api.service) if api else None
+    )
+
+
+def _snapshot_tool(tool: Tool, db: Session) -> ToolSnapshot:
+    return ToolSnapshot(
+        id=tool.id,
+        name=tool.name,
+        description=tool.description,
+        type=tool.type,
+        tool_type=tool.tool_type,
+        api_request_id=tool.api_request_id,
+        configuration=tool.configuration or {},
+        function_schema=tool.function_schema,
+        skip_params=tool.skip_params,
+        long_running=bool(tool.long_running),
+        updated_at=tool.updated_at,
+        api_request=_snapshot_api_request(tool.api_request, db) if tool.api_request else None
+    )
+
+
+def load_turn_context(db: Session, chat_id: str) -> Optional[TurnContext]:
+    """
+    Load everything a turn needs about a conversation in two queries: the conversation
+    joined with its chat settings and summary, then all enabled tools joined with their
+    API request and API.
+
+    Args:
+        db: Database session
+        chat_id: The conversation ID
+
+    Returns:
+        An immutable TurnContext, or None if the conversation does not exist
+    """
+    conversation = (
+        db.query(Conversation)
+        .options(
+            joinedload(Conversation.chat_settings)
+            .selectinload(ChatSettings.tools)
+            .joinedload(Tool.api_request)
+            .joinedload(ApiRequest.api),
+            joinedload(Conversation.summary)
+        )
+        .filter(Conversation.chatid == chat_id)
+        .first()
+    )
+    if conversation is None:
+        return None
+
+    settings = conversation.chat_settings
+    settings_snapshot = None
+    if settings is not None:
+        settings_snapshot = ChatSettingsSnapshot(
+            id=settings.id,
+            name=settings.name,
+            system_prompt=settings.system_prompt,
+            model=settings.model,
+            is_template=bool(settings.is_template),
+            history_token_budget=settings.history_token_budget,
+            turn_timeout_seconds=settings.turn_timeout_seconds,
+            tools=tuple(_snapshot_tool(tool, db) for tool in settings.tools)
+        )
+
+    return TurnContext(
+        chatid=conversation.chatid,
+        name=conversation.name,
+        is_group=conversation.is_group,
+        group_name=conversation.group_name,
+        source_type=conversation.source_type,
+        portal_user_id=conversation.portal_user_id,
+        chat_settings=settings_snapshot,
+        summary=conversation.summary.summary if conversation.summary else None
+    )
+
+
+class HistoryMessage(NamedTuple):
+    id: str
+    type: str
+    role: Optional[str]
+    sender: Optional[str]
+    content: Optional[str]
+    openai_tool_call_id: Optional[str]
+    tool_call_id: Optional[str]
+    openai_function_name: Optional[str]
+    function_arguments: Optional[str]  # Truncated to HISTORY_FIELD_MAX_CHARS
+    function_result: Optional[str]  # Truncated to HISTORY_FIELD_MAX_CHARS
+
+
+def _truncation_note(prefix: Optional[str], length: Optional[int]) -> Optional[str]:
+    if prefix is None or length is None or length <= len(prefix):
+        return prefix
+    return f"{prefix}\n... [truncated, {length} characters in total]"
+
+
+@lru_cache(maxsize=8)
+def _history_window_statement(max_field_chars: int) -> Any:
+    # Built once per cap; chat_id, history_limit and token_budget are bound per call
+    # Rows inserted before token counting fall back to a length estimate
+    tokens = func.coalesce(
+        Message.token_count,
+        func.coalesce(func.length(Message.content), 0) / 4 + MESSAGE_OVERHEAD_TOKENS
+    )
+    newest_first = (Message.created_at.desc(), Message.id.desc())
+    recent = (
+        select(
+            Message.id,
+            Message.type,
+            Message.role,
+            Message.sender,
+            Message.content,
+            Message.openai_tool_call_id,
+            Message.tool_call_id,
+            Message.openai_function_name,
+            func.substr(Message.function_arguments, 1, max_field_chars).label("function_arguments"),
+            func.length(Message.function_arguments).label("function_arguments_length"),
+            func.substr(Message.function_result, 1, max_field_chars).label("function_result"),
+            func.length(Message.function_result).label("function_result_length"),
+            Message.created_at,
+            func.sum(tokens).over(order_by=newest_first).label("running_tokens")
+        )
+        .where(Message.chatid == bindparam("chat_id"))
+        .order_by(*newest_first)
+        .limit(bindparam("history_limit"))
+        .subquery()
+    )
+    return (
+        select(*list(recent.c)[:12])
+        .where(recent.c.running_tokens <= bindparam("token_budget"))
+        .order_by(recent.c.created_at.desc(), recent.c.id.desc())
+    )
+
+
+def load_message_history(
+    db: Session,
+    chat_id: str,
+    token_budget: int = DEFAULT_HISTORY_TOKEN_BUDGET,
+    limit: int = HISTORY_MAX_MESSAGES,
+    max_field_chars: int = HISTORY_FIELD_MAX_CHARS
+) -> List[HistoryMessage]:
+    """
+    Load the most recent messages of a conversation that fit a token budget, oldest first,
+    as plain tuples.
+
+    The window is cut in SQL by a running sum of the token counts stored with each message
+    (newest first), so nothing is re-tokenized per turn. Only the columns needed to build
+    the model input are selected. Tool results and function arguments are cut to
+    max_field_chars by the database; a note with the original length is appended. Tool
+    results whose tool call fell outside the window are dropped.
+
+    Args:
+        db: Database session
+        chat_id: The conversation ID
+        token_budget: Maximum total tokens of the loaded messages
+        limit: Maximum number of messages to load
+        max_field_chars: Longest tool result / function arguments to load
+
+    Returns:
+        List of HistoryMessage in chronological order
+    """
+    rows = db.execute(
+        _history_window_statement(max_field_chars),
+        {"chat_id": chat_id, "history_limit": limit, "token_budget": token_budget}
+    ).all()
+
+    call_ids = {row[6] for row in rows if row[1] == MessageType.TOOL_CALL}
+    history = []
+    for row in reversed(rows):
+        if row[1] == MessageType.TOOL_RESULT and row[6] not in call_ids:
+            # The API rejects function_call_output items without their function_call
+            continue
+        history.append(HistoryMessage(
+            *row[:8],
+            function_arguments=_truncation_note(row[8], row[9]),
+            function_result=_truncation_note(row[10], row[11])
+        ))
+    return history
@@ -0,0 +1,218 @@
+import os
+import re
+import hmac
+import json
+import time
+import queue
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Iterable, Iterator, Optional, TextIO
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Capture is opt-in: nothing is recorded unless WEBHOOK_CAPTURE_PATH is set
+WEBHOOK_CAPTURE_PATH = os.environ.get("WEBHOOK_CAPTURE_PATH", "")
+# Replace message text with a same-length placeholder (set to "false" only for internal test traffic)
+WEBHOOK_CAPTURE_REDACT_TEXT = os.environ.get("WEBHOOK_CAPTURE_REDACT_TEXT", "true").lower() != "false"
+# Salt for the pseudonyms, so captures from different environments cannot be joined
+WEBHOOK_CAPTURE_SALT = os.environ.get("WEBHOOK_CAPTURE_SALT", "")
+
+# Events waiting to be written; when the writer falls this far behind, new events are dropped
+WEBHOOK_CAPTURE_QUEUE_SIZE = int(os.environ.get("WEBHOOK_CAPTURE_QUEUE_SIZE", "10000"))
+
+# Numbers pseudonymized in every string value:
+#   WhatsApp JIDs: "<number>[:<device>]@<server>", legacy group IDs "<creator number>-<timestamp>@g.us"
+#   international phone numbers ("+972 50-123-4567") and bare runs of 8 to 15 digits
+IDENTIFIER_PATTERN = re.compile(
+    r"(?P<jid_user>\d+(?:-\d+)*)(?P<jid_server>(?::\d+)?@(?:s\.whatsapp\.net|g\.us|lid|broadcast|c\.us))"
+    r"|(?P<phone>\+\d[\d\s().-]{5,}\d|(?<!\w)\d{8,15}(?!\w))"
+)
+NUMBER_PATTERN = re.compile(r"\d+")
+
+# Keys holding free text typed by users
+TEXT_KEYS = {"conversation", "text", "caption", "body", "Body", "Caption", "title", "description", "vcard"}
+# Keys holding display names
+NAME_KEYS = {"PushName", "Name", "pushName", "VerifiedName", "notify", "displayName"}
+# Keys holding media keys, hashes, thumbnails and other binary blobs
+BINARY_KEYS = {"JPEGThumbnail", "jpegThumbnail", "mediaKey", "fileSHA256", "fileEncSHA256", "directPath", "url", "URL", "waveform", "thumbnailSHA256", "thumbnailEncSHA256"}
+
+
+class WebhookRecorder:
+    """
+    Append-only recorder for raw WuzAPI webhook events.
+
+    Each event is written as one compact JSON line:
+    {"t": <unix time>, "token": <pseudonym>, "event": <redacted inner payload>}
+    Phone numbers and JIDs, wherever they appear in a string, are replaced by stable
+    pseudonyms (the same chat always maps to the same pseudonym), so the chat/group/DM
+    mix survives redaction. Pseudonyms are HMACs of the value, so nothing is kept per
+    number. Events are redacted in the webhook handler and written by a background
+    thread, so the handler never waits on the disk.
+    """
+
+    def __init__(
+        self,
+        path: str = "",
+        redact_text: bool = True,
+        salt: str = "",
+        preserve_numbers: Iterable[str] = ()
+    ):
+        """
+        Initialize the recorder.
+
+        Args:
+            path: File to append events to. Recording is disabled when empty.
+            redact_text: Whether to replace message text with placeholders
+            salt: Salt mixed into the pseudonym hashes
+            preserve_numbers: Numbers kept as-is (e.g. the bot's own number, so replays still skip it)
+        """
+        self.path = path
+        self.redact_text = redact_text
+        self.salt = salt
+        self.preserve_numbers = set(preserve_numbers)
+        self._key = salt.encode("utf-8")
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=WEBHOOK_CAPTURE_QUEUE_SIZE)
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._dropped = 0
+
+        if self.enabled:
+            logger.info(f"[Webhook Recorder] Capturing webhook events to {self.path} (redact_text={self.redact_text})")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def record(self, json_data: str, token: str) -> None:
+        """
+        Redact a single webhook event and queue it for writing. Never raises or blocks.
+
+        Args:
+            json_data: The raw jsonData form field sent by WuzAPI
+            token: The client token form field
+        """
+        if not self.enabled:
+            return
+
+        try:
+            payload = json.loads(json_data)
+            line = json.dumps(
+                {
+                    "t": round(time.time(), 3),
+                    "token": self._pseudonym(token or "", keep_digits=False),
+                    "event": self.redact(payload)
+                },
+                separators=(",", ":"),
+                ensure_ascii=False
+            )
+            self._start_writer()
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self._dropped += 1
+            if self._dropped == 1 or self._dropped % 1000 == 0:
+                logger.warning(f"[Webhook Recorder] Writer is behind, {self._dropped} event(s) dropped so far")
+        except Exception as e:
+            logger.error(f"[Webhook Recorder] Failed to record webhook event: {e}")
+
+    def flush(self) -> None:
+        """Wait until every queued event has been written."""
+        if self._writer is not None:
+            self._queue.join()
+
+    def _start_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="webhook-recorder", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self) -> None:
+        f: Optional[TextIO] = None
+        while True:
+            line = self._queue.get()
+            try:
+                if f is None:
+                    f = open(self.path, "a", encoding="utf-8")
+                f.write(line + "\n")
+                if self._queue.empty():
+                    f.flush()
+            except Exception as e:
+                logger.error(f"[Webhook Recorder] Failed to write webhook event: {e}")
+                if f is not None:
+                    f.close()
+                f = None
+            finally:
+                self._queue.task_done()
+
+    def redact(self, value: Any, key: Optional[str] = None) -> Any:
+        """
+        Recursively redact a decoded webhook payload.
+
+        Args:
+            value: The value to redact
+            key: The dict key the value was found under, if any
+
+        Returns:
+            A redacted copy of the value
+        """
+        if isinstance(value, dict):
+            return {k: self.redact(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.redact(item, key) for item in value]
+        if not isinstance(value, str):
+            return value
+
+        if key in BINARY_KEYS:
+            return f"[binary:{len(value)}]"
+        if key in NAME_KEYS:
+            return f"user-{self._pseudonym(value, keep_digits=False)[:8]}" if value else value
+        if key in TEXT_KEYS and self.redact_text:
+            # Keep the length so prompt sizes stay realistic; keep whitespace so word counts do too
+            return re.sub(r"\S", "x", value)
+
+        # Each number of a JID's local part or a phone number gets its own pseudonym, so a
+        # group's creator maps to the same pseudonym as that person's own JID
+        return IDENTIFIER_PATTERN.sub(self._redact_identifier, value)
+
+    def _redact_identifier(self, match: "re.Match[str]") -> str:
+        if match.group("jid_user") is not None:
+            number_part, suffix = match.group("jid_user"), match.group("jid_server")
+        else:
+            number_part, suffix = match.group("phone"), ""
+        return NUMBER_PATTERN.sub(lambda n: self._pseudonym(n.group(0)), number_part) + suffix
+
+    def _pseudonym(self, value: str, keep_digits: bool = True) -> str:
+        """
+        Map a value to a stable pseudonym. Numbers stay numeric and keep their length.
+        """
+        if not value or value in self.preserve_numbers:
+            return value
+
+        digest = hmac.new(self._key, value.encode("utf-8"), hashlib.sha256).hexdigest()
+        if keep_digits:
+            return str(int(digest, 16))[:len(value)].rjust(len(value), "0")
+        return digest[:16]
+
+
+def read_capture(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over the events of a capture file, skipping malformed lines.
+
+    Args:
+        path: Path to a file written by WebhookRecorder
+
+    Returns:
+        Iterator of {"t", "token", "event"} dicts in file order
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"[Webhook Recorder] Skipping malformed line {line_number} in {path}")
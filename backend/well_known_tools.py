@@ -0,0 +1,87 @@
+import uuid
+import logging
+from typing import Any, Dict
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models import Tool, ToolType
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Keys of the built-in tools
+WEB_SEARCH_TOOL_KEY = "web_search"
+
+# Definitions of the built-in tools, created once and shared by all chat settings
+WELL_KNOWN_TOOLS: Dict[str, Dict[str, Any]] = {
+    WEB_SEARCH_TOOL_KEY: {
+        "name": "Web Search",
+        "description": "Search the web for the latest information",
+        "type": ToolType.WEB_SEARCH.value,
+        "tool_type": ToolType.WEB_SEARCH.value,
+        "configuration": {
+            "type": "web_search_preview",
+            # Optionally add user_location and search_context_size here if needed
+            # "user_location": {"type": "approximate", "country": "US"},
+            # "search_context_size": "medium"
+        },
+    },
+}
+
+# builtin_key -> tool ID, filled at startup
+_well_known_tool_ids: Dict[str, str] = {}
+
+
+def ensure_well_known_tools(db: Session) -> Dict[str, str]:
+    """
+    Create any missing built-in tools and load their IDs into memory.
+
+    Creation is an upsert on the unique builtin_key, so concurrent workers
+    starting at the same time end up with the same rows.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Mapping of builtin_key to tool ID
+    """
+    rows = [
+        {"id": str(uuid.uuid4()), "builtin_key": key, **definition}
+        for key, definition in WELL_KNOWN_TOOLS.items()
+    ]
+    db.execute(pg_insert(Tool.__table__).on_conflict_do_nothing(index_elements=["builtin_key"]), rows)
+    db.commit()
+
+    resolved = dict(
+        db.query(Tool.builtin_key, Tool.id).filter(Tool.builtin_key.in_(list(WELL_KNOWN_TOOLS))).all()
+    )
+    _well_known_tool_ids.clear()
+    _well_known_tool_ids.update(resolved)
+
+    logger.info(f"Resolved well-known tools: {_well_known_tool_ids}")
+    return dict(_well_known_tool_ids)
+
+
+def get_well_known_tool(db: Session, key: str) -> Tool:
+    """
+    Get a built-in tool by its key, without scanning the tools table.
+
+    Args:
+        db: Database session
+        key: The builtin_key of the tool (e.g. WEB_SEARCH_TOOL_KEY)
+
+    Returns:
+        The tool
+    """
+    if key not in WELL_KNOWN_TOOLS:
+        raise KeyError(f"Unknown well-known tool: {key}")
+
+    tool_id = _well_known_tool_ids.get(key)
+    tool = db.get(Tool, tool_id) if tool_id else None
+
+    if tool is None:
+        # Not resolved yet, or deleted since startup
+        tool_id = ensure_well_known_tools(db)[key]
+        tool = db.get(Tool, tool_id)
+
+    return tool
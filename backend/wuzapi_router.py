@@ -5,23 +5,32 @@ import logging
 import json
 import os
 import httpx
-import base64
 import re
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import uuid
 
 from db import get_db
-from models import Conversation, ConversationParticipant, ConversationCreate, SourceType, Message, MessageType, ChatSettings
-from chat_settings_router import get_or_create_web_search_tool
+from models import Conversation, ConversationParticipant, ConversationCreate, SourceType, Message, MessageType, ChatSettings, ToolJob
+from chat_settings_router import get_or_create_settings_template
 from openai_helper import openai_helper
+from turn_context import load_turn_context
+from conversation_summarizer import conversation_summarizer
+from tool_jobs import tool_job_runner, parse_job_handle, job_result_prompt
+from deadline import Deadline, TOOL_CANCELLED_RESULT
+from openai_limiter import PRIORITY_BACKGROUND
+from resilience import call_with_retries, RetryPolicy, WUZAPI_UPSTREAM, IDEMPOTENT_POLICY, UNSAFE_POLICY
+from media_store import media_store, find_media_refs
+from wuzapi_upload import build_file_body, payload_cache, MEDIA_SIZE_LIMITS
+from webhook_recorder import WebhookRecorder, WEBHOOK_CAPTURE_PATH, WEBHOOK_CAPTURE_REDACT_TEXT, WEBHOOK_CAPTURE_SALT
 
 # Configure basic logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# WuzAPI details (Dev Docker )
-WUZAPI_BASE_URL = "http://wuzapi:8080" 
+# WuzAPI details (Dev Docker ) - override to point a staging instance at a stub
+WUZAPI_BASE_URL = os.environ.get("WUZAPI_BASE_URL", "http://wuzapi:8080")
 WEBHOOK_PATH = "/wuzapi_webhook" 
 
 # Bot's WhatsApp number - messages from this number should be ignored
@@ -32,6 +41,14 @@ known_chats: Set[str] = set()
 # Cache for group names to avoid repeated API calls
 group_info_cache: Dict[str, Dict[str, Any]] = {}
 
+# Opt-in capture of raw webhook traffic for record-and-replay (see replay_webhooks.py)
+webhook_recorder = WebhookRecorder(
+    path=WEBHOOK_CAPTURE_PATH,
+    redact_text=WEBHOOK_CAPTURE_REDACT_TEXT,
+    salt=WEBHOOK_CAPTURE_SALT,
+    preserve_numbers=[BOT_WHATSAPP_NUMBER]
+)
+
 # WuzAPI handler class
 class WuzapiHandler:
     def __init__(self):
@@ -43,6 +60,41 @@ class WuzapiHandler:
             "token": token
         }
         logger.info(f"Initialized WuzAPI handler with base URL: {self.base_url}")
+    
+    async def _post(
+        self,
+        url: str,
+        policy: RetryPolicy = UNSAFE_POLICY,
+        timeout: Optional[httpx.Timeout] = None,
+        **kwargs
+    ) -> httpx.Response:
+        """
+        POST to WuzAPI with retries behind the WuzAPI circuit breaker.
+        
+        Sends are only retried when WuzAPI refused them (connection failed, 429, 503),
+        so a message is never delivered twice.
+        
+        Args:
+            url: The request URL
+            policy: The retry policy (UNSAFE_POLICY unless repeating the request is harmless)
+            timeout: Request timeout (httpx's default if not given)
+            **kwargs: Arguments of httpx.AsyncClient.post
+            
+        Returns:
+            The successful response
+            
+        Raises:
+            httpx.HTTPStatusError: If the last attempt got an error response
+            CircuitOpenError: If WuzAPI's circuit is open
+        """
+        async def attempt() -> httpx.Response:
+            client_kwargs = {"timeout": timeout} if timeout is not None else {}
+            async with httpx.AsyncClient(**client_kwargs) as client:
+                response = await client.post(url, **kwargs)
+                response.raise_for_status()
+                return response
+        
+        return await call_with_retries(attempt, WUZAPI_UPSTREAM, policy)
         
     async def send_message(self, chat_id: str, message: str, context_info: Optional[Dict[str, Any]] = None) -> Optional[str]:
         """
@@ -74,19 +126,17 @@ class WuzapiHandler:
                     }
             
             # Make the request
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=self.headers, json=data)
-                response.raise_for_status()
-                
-                # Extract message ID from response
-                response_data = response.json()
-                if response_data.get("success"):
-                    msg_id = response_data.get("data", {}).get("Id")
-                    logger.info(f"Message sent successfully to {chat_id}, ID: {msg_id}")
-                    return msg_id
-                else:
-                    logger.error(f"Failed to send message: {response_data}")
-                    return None
+            response = await self._post(url, headers=self.headers, json=data)
+            
+            # Extract message ID from response
+            response_data = response.json()
+            if response_data.get("success"):
+                msg_id = response_data.get("data", {}).get("Id")
+                logger.info(f"Message sent successfully to {chat_id}, ID: {msg_id}")
+                return msg_id
+            else:
+                logger.error(f"Failed to send message: {response_data}")
+                return None
                     
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error sending message to {chat_id}: {e.response.status_code} - {e.response.text}")
@@ -108,7 +158,7 @@ class WuzapiHandler:
         
         Args:
             chat_id: The WhatsApp chat ID to send the file to
-            file_path: Path to the file to send
+            file_path: Path to the file to send, or a media:// reference from the media store
             caption: Optional caption for images
             display_name: Optional display name for documents
             context_info: Optional context info for replying to messages
@@ -119,9 +169,18 @@ class WuzapiHandler:
         try:
             # Determine file type
             image_extensions = ['jpg', 'jpeg', 'png', 'bmp', 'webp', 'gif']
-            audio_extensions = ['mp3', 'wav', 'ogg', 'webm', 'flac', 'aac']
+            audio_extensions = ['mp3', 'wav', 'ogg', 'opus', 'webm', 'flac', 'aac']
             document_extensions = ['pdf', 'doc', 'docx', 'ppt', 'pptx', 'xls', 'xlsx', 'txt', 'zip', 'rar']
             
+            cache_key = None
+            if file_path.startswith("media://"):
+                # Stored media is content-addressed, so the reference identifies the content
+                cache_key = file_path
+                file_path = media_store.resolve(cache_key)
+                if not file_path:
+                    logger.error(f"Media not stored (anymore): {cache_key}")
+                    return None
+            
             # Get file extension
             if not os.path.exists(file_path):
                 logger.error(f"File not found: {file_path}")
@@ -133,42 +192,43 @@ class WuzapiHandler:
             if not display_name:
                 display_name = os.path.basename(file_path)
             
-            # Encode file as base64
-            with open(file_path, "rb") as file_handler:
-                encoded_file = base64.b64encode(file_handler.read()).decode('utf-8')
-            
             # Determine URL and data based on file type
-            url = f"{self.base_url}/chat/send/"
-            data = {"Phone": chat_id}
-            
+            data: Dict[str, Any] = {"Phone": chat_id}
             if extension in image_extensions:
-                url += "image"
-                data["Image"] = f"data:image/{extension};base64,{encoded_file}"
+                kind, data_field, mime_type = "image", "Image", f"image/{extension}"
                 if caption:
                     data["Caption"] = caption
             elif extension in audio_extensions:
-                url += "audio"
-                data["Audio"] = f"data:audio/{extension};base64,{encoded_file}"
+                kind, data_field, mime_type = "audio", "Audio", f"audio/{extension}"
             else:
                 # Default to document
-                url += "document"
-                data["Document"] = f"data:application/octet-stream;base64,{encoded_file}"
+                kind, data_field, mime_type = "document", "Document", "application/octet-stream"
                 data["FileName"] = display_name
             
+            stat = os.stat(file_path)
+            if stat.st_size > MEDIA_SIZE_LIMITS[kind]:
+                logger.error(f"Not sending {file_path} to {chat_id}: {stat.st_size} bytes exceeds the {kind} limit of {MEDIA_SIZE_LIMITS[kind]} bytes")
+                return None
+            if cache_key is None:
+                cache_key = f"{os.path.abspath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+            
+            # The base64 body is streamed from disk (or a cached encoding), never built as one string
+            body = build_file_body(data, data_field, file_path, mime_type, cache_key, payload_cache)
+            headers = {**self.headers, "Content-Length": str(body.content_length)}
+            
             # Make the request
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=self.headers, json=data)
-                response.raise_for_status()
-                
-                # Extract message ID from response
-                response_data = response.json()
-                if response_data.get("success"):
-                    msg_id = response_data.get("data", {}).get("Id")
-                    logger.info(f"File sent successfully to {chat_id}, ID: {msg_id}")
-                    return msg_id
-                else:
-                    logger.error(f"Failed to send file: {response_data}")
-                    return None
+            timeout_config = httpx.Timeout(60.0, connect=10.0)
+            response = await self._post(f"{self.base_url}/chat/send/{kind}", timeout=timeout_config, headers=headers, content=body)
+            
+            # Extract message ID from response
+            response_data = response.json()
+            if response_data.get("success"):
+                msg_id = response_data.get("data", {}).get("Id")
+                logger.info(f"File sent successfully to {chat_id}, ID: {msg_id}")
+                return msg_id
+            else:
+                logger.error(f"Failed to send file: {response_data}")
+                return None
                     
         except Exception as e:
             logger.error(f"Error sending file to {chat_id}: {e}")
@@ -194,19 +254,17 @@ class WuzapiHandler:
                 "Body": reaction
             }
             
-            # Make the request
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=self.headers, json=data)
-                response.raise_for_status()
-                
-                # Check success
-                response_data = response.json()
-                if response_data.get("success"):
-                    logger.info(f"Reaction sent successfully to message {message_id}")
-                    return True
-                else:
-                    logger.error(f"Failed to send reaction: {response_data}")
-                    return False
+            # Make the request (reacting again just sets the same reaction)
+            response = await self._post(url, policy=IDEMPOTENT_POLICY, headers=self.headers, json=data)
+            
+            # Check success
+            response_data = response.json()
+            if response_data.get("success"):
+                logger.info(f"Reaction sent successfully to message {message_id}")
+                return True
+            else:
+                logger.error(f"Failed to send reaction: {response_data}")
+                return False
                     
         except Exception as e:
             logger.error(f"Error sending reaction to message {message_id}: {e}")
@@ -239,19 +297,17 @@ class WuzapiHandler:
             if media:
                 data["Media"] = "audio"
             
-            # Make the request
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=self.headers, json=data)
-                response.raise_for_status()
-                
-                # Check success
-                response_data = response.json()
-                if response_data.get("success"):
-                    logger.info(f"Chat presence set successfully for {chat_id}")
-                    return True
-                else:
-                    logger.error(f"Failed to set chat presence: {response_data}")
-                    return False
+            # Make the request (setting the same presence again is harmless)
+            response = await self._post(url, policy=IDEMPOTENT_POLICY, headers=self.headers, json=data)
+            
+            # Check success
+            response_data = response.json()
+            if response_data.get("success"):
+                logger.info(f"Chat presence set successfully for {chat_id}")
+                return True
+            else:
+                logger.error(f"Failed to set chat presence: {response_data}")
+                return False
                     
         except Exception as e:
             logger.error(f"Error setting chat presence for {chat_id}: {e}")
@@ -307,25 +363,29 @@ async def get_group_info(group_jid: str, user_token: str) -> Optional[Dict[str,
     }
     params = {"groupJID": group_jid}
     
-    try:
+    async def attempt() -> httpx.Response:
         async with httpx.AsyncClient() as client:
             response = await client.get(url, headers=headers, params=params)
             response.raise_for_status()
-            
-            response_data = response.json()
-            if response_data.get("success") and "data" in response_data:
-                group_details = response_data["data"]
-                group_name = group_details.get("Name")
-                participants = group_details.get("Participants", [])
-                if group_name:
-                    logger.info(f"Successfully fetched info for group {group_jid}: Name='{group_name}', Participants count: {len(participants)}")
-                    return {"name": group_name, "participants": participants}
-                else:
-                    logger.warning(f"Fetched info for group {group_jid}, but no 'Name' field found.")
-                    return None
+            return response
+    
+    try:
+        response = await call_with_retries(attempt, WUZAPI_UPSTREAM, IDEMPOTENT_POLICY)
+        
+        response_data = response.json()
+        if response_data.get("success") and "data" in response_data:
+            group_details = response_data["data"]
+            group_name = group_details.get("Name")
+            participants = group_details.get("Participants", [])
+            if group_name:
+                logger.info(f"Successfully fetched info for group {group_jid}: Name='{group_name}', Participants count: {len(participants)}")
+                return {"name": group_name, "participants": participants}
             else:
-                logger.warning(f"Failed to get group info for {group_jid}. WuzAPI success: {response_data.get('success')}, Data: {response_data.get('data')}")
+                logger.warning(f"Fetched info for group {group_jid}, but no 'Name' field found.")
                 return None
+        else:
+            logger.warning(f"Failed to get group info for {group_jid}. WuzAPI success: {response_data.get('success')}, Data: {response_data.get('data')}")
+            return None
     except httpx.HTTPStatusError as e:
         logger.error(f"HTTP error fetching group info for {group_jid}: {e.response.status_code} - {e.response.text}")
         return None
@@ -360,105 +420,137 @@ async def check_conversation_exists(chat_id: str, db: Session) -> Optional[Conve
 
 async def process_conversation(chat_id: str, is_group: bool, sender_jid: str, push_name: str, client_name: str, db: Session, group_name: Optional[str] = None, participants: Optional[List[str]] = None) -> Optional[Conversation]:
     """
-    Process a conversation - check if it exists, create if it doesn't.
+    Process a conversation - create it if it doesn't exist, in a single transaction.
+    
+    The conversation is inserted with INSERT ... ON CONFLICT DO NOTHING RETURNING, so two
+    concurrent first messages of the same chat cannot collide on the primary key: one
+    creates it and the other finds it. Participants are bulk-inserted; for an existing
+    group with a fresh participant list, membership is synced as a set difference.
     Returns the conversation object.
     """
     try:
-        # First check if conversation exists
-        conversation = await check_conversation_exists(chat_id, db)
+        # New chats share the default settings template (copied on first customization)
+        settings_id = (await get_or_create_settings_template(db, SourceType.WHATSAPP)).id
         
-        if not conversation:
-            # Create a new chat settings for this conversation
-            settings_id = str(uuid.uuid4())
-            
-            # Get or create web search tool
-            web_search_tool = await get_or_create_web_search_tool(db)
-            
-            # Create default chat settings with web search tool
-            db_chat_settings = ChatSettings(
-                id=settings_id,
-                name=f"Settings for {push_name if not is_group else group_name or 'Untitled Chat'}",
-                description="Auto-generated chat settings",
-                system_prompt="You are a friendly and laid back whatsapp assistant called Oats (Hebrew: אוטס).",
-                model="gpt-4o-mini",
-                enabled_tools=[web_search_tool.id]
-            )
-            
-            # Add to database
-            db.add(db_chat_settings)
-            
-            # Associate web search tool with chat settings
-            db_chat_settings.tools = [web_search_tool]
-            
-            # Create new conversation if it doesn't exist
-            # Generate a UUID for the chatid - using the original chat_id from WhatsApp instead
-            # Generate conversation data
-            conversation_data = ConversationCreate(
-                name=push_name if not is_group else group_name,
-                is_group=is_group,
-                group_name=group_name if is_group else None,
-                silent=False,  # Default to not silent
-                enabled_apis=[],  # Default to no APIs enabled
-                paths={},  # Default to empty paths
-                participants=[sender_jid] if not is_group and sender_jid else (participants or []),
-                source_type=SourceType.WHATSAPP,
-                chat_settings_id=settings_id  # Link to the chat settings
-            )
-            
-            # Create conversation object
-            db_conversation = Conversation(
-                chatid=chat_id,
-                name=conversation_data.name,
-                is_group=conversation_data.is_group,
-                group_name=conversation_data.group_name,
-                silent=conversation_data.silent,
-                enabled_apis=conversation_data.enabled_apis,
-                paths=conversation_data.paths,
-                source_type=conversation_data.source_type,
-                chat_settings_id=settings_id  # Link to the chat settings
-            )
-            
-            # Add to database
-            db.add(db_conversation)
-            
-            # Add participants if any
-            for participant_number in conversation_data.participants:
-                participant = ConversationParticipant(
-                    number=participant_number,
-                    chatid=chat_id
-                )
-                db.add(participant)
-            
-            # Commit the transaction
-            db.commit()
-            
-            # Refresh the conversation to get any database-generated values
-            db.refresh(db_conversation)
-            
+        conversation_insert = pg_insert(Conversation.__table__).values(
+            chatid=chat_id,
+            name=push_name if not is_group else group_name,
+            is_group=is_group,
+            group_name=group_name if is_group else None,
+            silent=False,  # Default to not silent
+            enabled_apis=[],  # Default to no APIs enabled
+            paths={},  # Default to empty paths
+            source_type=SourceType.WHATSAPP.value,
+            chat_settings_id=settings_id  # Link to the chat settings
+        ).on_conflict_do_nothing(index_elements=["chatid"]).returning(Conversation.__table__.c.chatid)
+        
+        created = db.execute(conversation_insert).first() is not None
+        
+        if created:
+            members = [sender_jid] if not is_group and sender_jid else (participants or [])
+            add_participants(db, chat_id, members)
+        elif is_group and participants is not None:
+            sync_participants(db, chat_id, participants)
+        
+        # Commit the transaction
+        db.commit()
+        
+        if created:
             logger.info(f"Created new conversation with ID: {chat_id}")
-            
-            # Add to known chats
-            known_chats.add(chat_id)
-            
-            return db_conversation
         
-        return conversation
+        # Add to known chats
+        known_chats.add(chat_id)
+        
+        return db.get(Conversation, chat_id)
                 
     except Exception as e:
+        db.rollback()
         logger.error(f"Error processing conversation for chat {chat_id}: {e}")
         return None
 
+def add_participants(db: Session, chat_id: str, numbers: List[str]) -> None:
+    """
+    Bulk-insert participants of a conversation, ignoring ones that already exist.
+    The caller commits.
+    """
+    rows = [{"number": number, "chatid": chat_id} for number in dict.fromkeys(numbers) if number]
+    if rows:
+        db.execute(pg_insert(ConversationParticipant.__table__).on_conflict_do_nothing(), rows)
+
+def remove_participants(db: Session, chat_id: str, numbers: List[str]) -> None:
+    """
+    Delete participants of a conversation in one statement. The caller commits.
+    """
+    numbers = [number for number in set(numbers) if number]
+    if numbers:
+        db.query(ConversationParticipant).filter(
+            ConversationParticipant.chatid == chat_id,
+            ConversationParticipant.number.in_(numbers)
+        ).delete(synchronize_session=False)
+
+def sync_participants(db: Session, chat_id: str, numbers: List[str]) -> None:
+    """
+    Make the stored participants of a conversation match the given list, touching only
+    the rows that differ. The caller commits.
+    """
+    current = {number for (number,) in db.query(ConversationParticipant.number).filter(ConversationParticipant.chatid == chat_id)}
+    target = {number for number in numbers if number}
+    
+    joined = target - current
+    left = current - target
+    if joined or left:
+        logger.info(f"Syncing participants of {chat_id}: {len(joined)} joined, {len(left)} left")
+    add_participants(db, chat_id, list(joined))
+    remove_participants(db, chat_id, list(left))
+
+async def handle_group_info_event(chat_id: str, joined: List[str], left: List[str], new_name: Optional[str], db: Session) -> None:
+    """
+    Apply a GroupInfo event (members joining/leaving, group renamed) to a known conversation.
+    Unknown groups are skipped; their full membership is stored when they are created.
+    """
+    try:
+        if not db.query(Conversation.chatid).filter(Conversation.chatid == chat_id).first():
+            logger.info(f"Skipping group info event for unknown group {chat_id}")
+            return
+        
+        add_participants(db, chat_id, joined)
+        remove_participants(db, chat_id, left)
+        if new_name:
+            db.query(Conversation).filter(Conversation.chatid == chat_id).update(
+                {Conversation.group_name: new_name, Conversation.name: new_name}, synchronize_session=False
+            )
+        db.commit()
+        
+        # Keep the cached group info in line
+        cached = group_info_cache.get(chat_id)
+        if cached is not None:
+            if new_name:
+                cached["name"] = new_name
+            left_set = set(left)
+            participants = [p for p in cached.get("participants", []) if p.get("JID") not in left_set]
+            known = {p.get("JID") for p in participants}
+            participants.extend({"JID": jid} for jid in joined if jid not in known)
+            cached["participants"] = participants
+        
+        logger.info(f"Applied group info event for {chat_id}: {len(joined)} joined, {len(left)} left, renamed={bool(new_name)}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error applying group info event for {chat_id}: {e}")
+
 async def handle_new_message(chat_id: str, sender_jid: str, sender_name: str, message_text: str, message_type: str, db: Session) -> str:
     """
     Handle a new message in a conversation.
     Returns a response text.
     """
     try:
-        # Get the conversation
-        conversation = db.query(Conversation).filter(Conversation.chatid == chat_id).first()
+        # Load the conversation with its settings and tools for the turn
+        conversation = load_turn_context(db, chat_id)
         if not conversation:
             logger.warning(f"No conversation found for chat ID: {chat_id}. Cannot process message.")
             return "Error: Conversation not found"
+        
+        # The whole turn, from here to the reply, runs within the chat's time budget
+        deadline = Deadline(conversation.turn_timeout_seconds)
             
         # Generate a UUID for the message ID
         message_id = str(uuid.uuid4())
@@ -484,53 +576,136 @@ async def handle_new_message(chat_id: str, sender_jid: str, sender_name: str, me
         # Set chat presence to "composing" to show typing indicator
         await wuzapi_handler.set_chat_presence(chat_id, "composing")
         
-        # Get response from OpenAI
-        response_text = await openai_helper.get_openai_response(conversation, user_message, db)
-        
-        # Store the assistant's response
-        assistant_message_id = str(uuid.uuid4())
-        assistant_message = Message(
-            id=assistant_message_id,
-            chatid=chat_id,
-            sender=None,  # No sender for assistant messages
-            sender_name="Oats",
-            type=MessageType.TEXT,
-            content=response_text,
-            role="assistant"
-        )
-        
-        # Add to database
-        db.add(assistant_message)
-        db.commit()
-        
-        logger.info(f"Stored assistant response with ID: {assistant_message_id} for chat: {chat_id}")
-        
-        # Send the response via WuzAPI
-        whatsapp_msg_id = await wuzapi_handler.send_message(chat_id, response_text)
-        if whatsapp_msg_id:
-            logger.info(f"Sent response to WhatsApp with ID: {whatsapp_msg_id}")
-        else:
-            logger.error(f"Failed to send response to WhatsApp")
-        
-        # Get recent messages to check for any tool results that should be sent to the user
-        recent_msgs = db.query(Message).filter(
-            Message.chatid == chat_id,
-            Message.type == MessageType.TOOL_RESULT,
-            Message.created_at > user_message.created_at
-        ).all()
-        
-        for tool_result_msg in recent_msgs:
-            # Send tool results to the user as well
-            result_text = f"Tool result from {tool_result_msg.function_name}:\n\n{tool_result_msg.function_result}"
-            await wuzapi_handler.send_message(chat_id, result_text)
-            logger.info(f"Sent tool result for {tool_result_msg.function_name} to WhatsApp")
-        
-        return response_text
+        # Jobs started by this turn deliver their outcome only after its reply went out
+        async with tool_job_runner.turn():
+            # Get response from OpenAI
+            response_text = await openai_helper.get_openai_response(conversation, user_message, db, deadline=deadline)
+            
+            # Store the assistant's response
+            assistant_message_id = str(uuid.uuid4())
+            assistant_message = Message(
+                id=assistant_message_id,
+                chatid=chat_id,
+                sender=None,  # No sender for assistant messages
+                sender_name="Oats",
+                type=MessageType.TEXT,
+                content=response_text,
+                role="assistant"
+            )
+            
+            # Add to database
+            db.add(assistant_message)
+            db.commit()
+            
+            logger.info(f"Stored assistant response with ID: {assistant_message_id} for chat: {chat_id}")
+            
+            # Fold messages that left the history window into the summary, off the reply path
+            conversation_summarizer.schedule(chat_id, conversation.history_token_budget)
+            
+            # Send the response via WuzAPI
+            whatsapp_msg_id = await wuzapi_handler.send_message(chat_id, response_text)
+            if whatsapp_msg_id:
+                logger.info(f"Sent response to WhatsApp with ID: {whatsapp_msg_id}")
+            else:
+                logger.error(f"Failed to send response to WhatsApp")
+            
+            # Get recent messages to check for any tool results that should be sent to the user
+            recent_msgs = db.query(Message).filter(
+                Message.chatid == chat_id,
+                Message.type == MessageType.TOOL_RESULT,
+                Message.created_at > user_message.created_at
+            ).all()
+            
+            for tool_result_msg in recent_msgs:
+                tool_name = tool_result_msg.tool_definition_name or tool_result_msg.openai_function_name
+                
+                # Background jobs deliver their own result later (see deliver_tool_job); cancelled calls have none
+                if parse_job_handle(tool_result_msg.function_result) or tool_result_msg.function_result == TOOL_CANCELLED_RESULT:
+                    continue
+                
+                # Deliver files the tool produced (stored as media:// references)
+                for ref in find_media_refs(tool_result_msg.function_result):
+                    if await wuzapi_handler.send_file(chat_id, ref):
+                        logger.info(f"Sent media {ref} from tool {tool_name} to WhatsApp")
+                
+                # Send tool results to the user as well
+                result_text = f"Tool result from {tool_name}:\n\n{tool_result_msg.function_result}"
+                await wuzapi_handler.send_message(chat_id, result_text)
+                logger.info(f"Sent tool result for {tool_name} to WhatsApp")
+            
+            return response_text
         
     except Exception as e:
         logger.error(f"Error handling new message for chat {chat_id}: {e}")
         return f"Error processing message: {str(e)}"
 
+async def deliver_tool_job(db: Session, job: ToolJob) -> bool:
+    """
+    Deliver the result of a finished background tool job with a follow-up turn.
+    
+    The outcome is stored as a system note the model answers; files the tool produced
+    and the reply are sent to WhatsApp. Portal conversations only get the stored reply.
+    
+    Args:
+        db: Database session
+        job: The finished job
+        
+    Returns:
+        True if the follow-up reply was stored (and sent, for WhatsApp chats)
+    """
+    conversation = load_turn_context(db, job.chatid)
+    if not conversation:
+        logger.warning(f"No conversation found for tool job {job.id} in {job.chatid}")
+        return False
+    is_whatsapp = conversation.source_type == SourceType.WHATSAPP
+    
+    note = Message(
+        id=str(uuid.uuid4()),
+        chatid=job.chatid,
+        sender=None,
+        sender_name="Oats",
+        type=MessageType.TEXT,
+        content=job_result_prompt(job),
+        role="system"
+    )
+    db.add(note)
+    db.commit()
+    db.refresh(note)
+    
+    if is_whatsapp:
+        await wuzapi_handler.set_chat_presence(job.chatid, "composing")
+    
+    # No one is waiting on this reply right now: it yields to live turns when OpenAI capacity is short
+    response_text = await openai_helper.get_openai_response(conversation, note, db, priority=PRIORITY_BACKGROUND)
+    db.add(Message(
+        id=str(uuid.uuid4()),
+        chatid=job.chatid,
+        sender=None,
+        sender_name="Oats",
+        type=MessageType.TEXT,
+        content=response_text,
+        role="assistant"
+    ))
+    db.commit()
+    
+    if not is_whatsapp:
+        return True
+    
+    # Files the tool produced go out before the reply that mentions them
+    tool_name = job.tool_definition_name or job.openai_function_name
+    for ref in find_media_refs(job.result or ""):
+        if await wuzapi_handler.send_file(job.chatid, ref):
+            logger.info(f"Sent media {ref} from background job {job.id} ({tool_name}) to WhatsApp")
+    
+    whatsapp_msg_id = await wuzapi_handler.send_message(job.chatid, response_text)
+    if not whatsapp_msg_id:
+        logger.error(f"Failed to send the result of tool job {job.id} to WhatsApp")
+        return False
+    logger.info(f"Sent result of tool job {job.id} ({tool_name}) to WhatsApp with ID: {whatsapp_msg_id}")
+    return True
+
+tool_job_runner.set_delivery(deliver_tool_job)
+
 # Define Pydantic models for the incoming payload
 class WuzapiEventData(BaseModel):
     event: Dict[str, Any]
@@ -583,6 +758,9 @@ async def wuzapi_webhook_handler(
     logger.info(f"Request Headers: {request.headers}")
     logger.info(f"Form Data: jsonData='{jsonData}', token='{token}'")
     
+    # Record the raw event before any processing (no-op unless capture is enabled)
+    webhook_recorder.record(jsonData, token)
+    
     inner_payload_dict: Dict[str, Any]
     event_type: Optional[str] = None
     event_data: Dict[str, Any] = {}
@@ -626,9 +804,9 @@ async def wuzapi_webhook_handler(
         group_info = None
         group_display_name = chat_id
 
-        # Process conversation - check if exists, create if not
-        if chat_id:
-            if is_group_message and chat_id not in known_chats:
+        # Process conversation - create if not known yet
+        if chat_id and chat_id not in known_chats:
+            if is_group_message:
                 # Only fetch group info when creating a new conversation
                 group_info = await get_group_info(chat_id, client_name)
                 if group_info:
@@ -727,6 +905,23 @@ async def wuzapi_webhook_handler(
             
         logger.info(f"Client \'{client_name}\': Read receipt for Chat ID [{chat_id}]. Data: {event_data}")
         
+    elif event_type == "GroupInfo":
+        chat_id = event_data.get("JID")
+        joined = [jid for jid in (event_data.get("Join") or []) if isinstance(jid, str)]
+        left = [jid for jid in (event_data.get("Leave") or []) if isinstance(jid, str)]
+        new_name = (event_data.get("Name") or {}).get("Name") if isinstance(event_data.get("Name"), dict) else None
+        
+        logger.info(f"Client \'{client_name}\': Group info for [{chat_id}]: {len(joined)} joined, {len(left)} left, new name: {new_name}")
+        if chat_id and (joined or left or new_name):
+            background_tasks.add_task(
+                handle_group_info_event,
+                chat_id=chat_id,
+                joined=joined,
+                left=left,
+                new_name=new_name,
+                db=db
+            )
+        
     elif event_type == "HistorySync":
         logger.info(f"Client \'{client_name}\': History sync event. Data: {event_data}")
     else:
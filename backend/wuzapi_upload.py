@@ -0,0 +1,247 @@
+import os
+import json
+import base64
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Optional
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Largest file sent per WhatsApp media type, in bytes
+WUZAPI_MAX_IMAGE_BYTES = int(os.environ.get("WUZAPI_MAX_IMAGE_BYTES", str(16 * 1024 * 1024)))
+WUZAPI_MAX_AUDIO_BYTES = int(os.environ.get("WUZAPI_MAX_AUDIO_BYTES", str(16 * 1024 * 1024)))
+WUZAPI_MAX_DOCUMENT_BYTES = int(os.environ.get("WUZAPI_MAX_DOCUMENT_BYTES", str(100 * 1024 * 1024)))
+# Memory kept for base64 payloads of files sent repeatedly (0 disables the cache)
+WUZAPI_PAYLOAD_CACHE_BYTES = int(os.environ.get("WUZAPI_PAYLOAD_CACHE_BYTES", str(64 * 1024 * 1024)))
+# Files larger than this are always streamed from disk and never cached
+WUZAPI_PAYLOAD_CACHE_MAX_FILE_BYTES = int(os.environ.get("WUZAPI_PAYLOAD_CACHE_MAX_FILE_BYTES", str(4 * 1024 * 1024)))
+
+MEDIA_SIZE_LIMITS = {
+    "image": WUZAPI_MAX_IMAGE_BYTES,
+    "audio": WUZAPI_MAX_AUDIO_BYTES,
+    "document": WUZAPI_MAX_DOCUMENT_BYTES,
+}
+
+# Bytes read per chunk; a multiple of 3 so every chunk encodes to base64 without padding
+ENCODE_CHUNK_BYTES = 3 * 16 * 1024
+
+
+def encoded_length(size: int) -> int:
+    """Get the length of the base64 encoding of size bytes."""
+    return 4 * ((size + 2) // 3)
+
+
+def read_data_uri(file_path: str, mime_type: str) -> bytes:
+    """
+    Encode a whole file as a data URI.
+
+    Args:
+        file_path: The file to encode
+        mime_type: MIME type put in the URI
+
+    Returns:
+        The data URI as ASCII bytes
+    """
+    with open(file_path, "rb") as f:
+        return f"data:{mime_type};base64,".encode("ascii") + base64.b64encode(f.read())
+
+
+async def iter_data_uri(file_path: str, mime_type: str, size: int) -> AsyncIterator[bytes]:
+    """
+    Encode a file as a data URI one chunk at a time.
+
+    Args:
+        file_path: The file to encode
+        mime_type: MIME type put in the URI
+        size: Bytes to read (the size the Content-Length was computed from)
+
+    Yields:
+        The URI prefix, then the base64 encoding of each chunk
+    """
+    yield f"data:{mime_type};base64,".encode("ascii")
+    remaining = size
+    with open(file_path, "rb") as f:
+        while remaining > 0:
+            chunk = f.read(min(ENCODE_CHUNK_BYTES, remaining))
+            if not chunk:
+                raise IOError(f"{file_path} shrank while it was being sent")
+            remaining -= len(chunk)
+            yield base64.b64encode(chunk)
+
+
+class DataUriJsonBody:
+    """
+    A JSON request body with one data URI field, produced incrementally.
+
+    The body is the JSON object of the given fields plus data_field holding the file as a
+    data URI. Only one encoded chunk exists in memory at a time (or the cached data URI,
+    which is shared between sends), and the exact length is known up front so the request
+    can carry a Content-Length instead of chunked encoding.
+    """
+
+    def __init__(
+        self,
+        fields: Dict[str, Any],
+        data_field: str,
+        file_path: str,
+        mime_type: str,
+        size: int,
+        data_uri: Optional[bytes] = None
+    ):
+        """
+        Initialize the body.
+
+        Args:
+            fields: The other JSON fields (e.g. Phone, Caption, FileName)
+            data_field: Name of the field holding the file (Image, Audio or Document)
+            file_path: The file to send
+            mime_type: MIME type put in the data URI
+            size: File size in bytes
+            data_uri: The already encoded data URI, if cached
+        """
+        # {"Phone":"...","Image":"  +  data URI  +  "}
+        opening = json.dumps(fields, ensure_ascii=False)[:-1]
+        separator = ", " if fields else ""
+        self.prefix = f"{opening}{separator}{json.dumps(data_field)}: \"".encode("utf-8")
+        self.suffix = b"\"}"
+        self.file_path = file_path
+        self.mime_type = mime_type
+        self.size = size
+        self.data_uri = data_uri
+
+    @property
+    def content_length(self) -> int:
+        """Exact length of the body in bytes."""
+        if self.data_uri is not None:
+            uri_length = len(self.data_uri)
+        else:
+            uri_length = len(f"data:{self.mime_type};base64,") + encoded_length(self.size)
+        return len(self.prefix) + uri_length + len(self.suffix)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield self.prefix
+        if self.data_uri is not None:
+            yield self.data_uri
+        else:
+            async for chunk in iter_data_uri(self.file_path, self.mime_type, self.size):
+                yield chunk
+        yield self.suffix
+
+
+class EncodedPayloadCache:
+    """
+    Byte-bounded LRU cache of data URIs, for files sent to several chats.
+
+    Keys must change whenever the file content does (a media:// reference, or the path
+    with size and modification time).
+    """
+
+    def __init__(self, max_bytes: int = WUZAPI_PAYLOAD_CACHE_BYTES, max_file_bytes: int = WUZAPI_PAYLOAD_CACHE_MAX_FILE_BYTES):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Total size of the cached data URIs
+            max_file_bytes: Largest file whose data URI is cached
+        """
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def accepts(self, size: int) -> bool:
+        """Whether a file of this size is worth encoding into the cache."""
+        return 0 < encoded_length(size) <= self.max_bytes and size <= self.max_file_bytes
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Get a cached data URI.
+
+        Args:
+            key: The file's cache key
+
+        Returns:
+            The data URI, or None if not cached
+        """
+        with self._lock:
+            data_uri = self._entries.get(key)
+            if data_uri is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return data_uri
+
+    def put(self, key: str, data_uri: bytes) -> None:
+        """
+        Cache a data URI, evicting the least recently used ones to make room.
+
+        Args:
+            key: The file's cache key
+            data_uri: The encoded file
+        """
+        if len(data_uri) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = data_uri
+            self._size += len(data_uri)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get hit/miss counters.
+
+        Returns:
+            Counters plus the number and total size of cached payloads
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._size
+        return stats
+
+
+def build_file_body(
+    fields: Dict[str, Any],
+    data_field: str,
+    file_path: str,
+    mime_type: str,
+    cache_key: str,
+    cache: "EncodedPayloadCache"
+) -> DataUriJsonBody:
+    """
+    Build the streaming JSON body sending a file, reusing a cached encoding if there is one.
+
+    Small files are encoded once and cached; larger ones are streamed from disk.
+
+    Args:
+        fields: The other JSON fields
+        data_field: Name of the field holding the file
+        file_path: The file to send
+        mime_type: MIME type put in the data URI
+        cache_key: Key identifying this exact file content
+        cache: The payload cache
+
+    Returns:
+        The request body
+    """
+    size = os.path.getsize(file_path)
+    data_uri = cache.get(cache_key)
+    if data_uri is None and cache.accepts(size):
+        data_uri = read_data_uri(file_path, mime_type)
+        cache.put(cache_key, data_uri)
+    return DataUriJsonBody(fields, data_field, file_path, mime_type, size, data_uri)
+
+
+# Shared cache used by WuzapiHandler.send_file
+payload_cache = EncodedPayloadCache()
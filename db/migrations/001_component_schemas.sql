@@ -0,0 +1,20 @@
+-- Store OpenAPI component schemas once, keyed by content hash.
+-- Existing api_requests keep their inline request_body_schema, which is still used
+-- when request_body_schema_hash is NULL. Re-import a spec to move it to shared storage.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.component_schemas (
+    hash character varying NOT NULL PRIMARY KEY,
+    name character varying,
+    definition jsonb NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL
+);
+
+ALTER TABLE public.api_requests
+    ADD COLUMN IF NOT EXISTS request_body_schema_hash character varying REFERENCES public.component_schemas(hash),
+    ADD COLUMN IF NOT EXISTS schema_refs jsonb;
+
+CREATE INDEX IF NOT EXISTS idx_api_requests_request_body_schema_hash ON public.api_requests(request_body_schema_hash);
+
+COMMIT;
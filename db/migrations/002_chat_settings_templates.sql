@@ -0,0 +1,91 @@
+-- Share chat settings and API-linked tools instead of copying them per conversation.
+-- Adds the template columns, then folds the existing per-conversation copies back together:
+--   1. per-settings copies of API-linked tools collapse into one tool per distinct definition
+--   2. auto-generated settings with the same prompt, model and tools collapse into one template
+
+BEGIN;
+
+ALTER TABLE public.chat_settings
+    ADD COLUMN IF NOT EXISTS is_template boolean NOT NULL DEFAULT false,
+    ADD COLUMN IF NOT EXISTS template_id character varying REFERENCES public.chat_settings(id);
+
+CREATE INDEX IF NOT EXISTS idx_chat_settings_template_id ON public.chat_settings(template_id);
+
+-- 1. Tools: the oldest tool of each identical definition is kept. Per-settings copies were
+--    named "<name> (<first 8 chars of the settings id>)", so names are compared without that suffix
+CREATE TEMP TABLE tool_folds ON COMMIT DROP AS
+SELECT t.id AS tool_id,
+       first_value(t.id) OVER definition AS canonical_id,
+       count(*) OVER definition AS fold_size,
+       regexp_replace(t.name, ' \([0-9a-f]{8}\)$', '') AS base_name
+FROM public.tools t
+WHERE t.api_request_id IS NOT NULL
+WINDOW definition AS (
+    PARTITION BY t.api_request_id, t.type, coalesce(t.tool_type, ''),
+                 regexp_replace(coalesce(t.name, ''), ' \([0-9a-f]{8}\)$', ''), coalesce(t.description, ''),
+                 coalesce(t.function_schema::text, ''), t.configuration::text, coalesce(t.skip_params::text, '')
+    ORDER BY t.created_at, t.id
+    ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+);
+
+-- The kept tool is shared now, so it goes by the name without the per-settings suffix
+UPDATE public.tools t
+SET name = f.base_name
+FROM tool_folds f
+WHERE t.id = f.tool_id AND f.tool_id = f.canonical_id AND f.fold_size > 1;
+
+INSERT INTO public.chat_settings_tools (chat_settings_id, tool_id)
+SELECT DISTINCT cst.chat_settings_id, f.canonical_id
+FROM public.chat_settings_tools cst
+JOIN tool_folds f ON f.tool_id = cst.tool_id
+WHERE f.tool_id <> f.canonical_id
+ON CONFLICT DO NOTHING;
+
+DELETE FROM public.chat_settings_tools cst
+USING tool_folds f
+WHERE cst.tool_id = f.tool_id AND f.tool_id <> f.canonical_id;
+
+DELETE FROM public.tools t
+USING tool_folds f
+WHERE t.id = f.tool_id AND f.tool_id <> f.canonical_id;
+
+-- 2. Settings: only auto-generated ones are folded, hand-made settings are left alone
+CREATE TEMP TABLE settings_folds ON COMMIT DROP AS
+WITH signatures AS (
+    SELECT cs.id,
+           cs.system_prompt,
+           cs.model,
+           coalesce((
+               SELECT string_agg(cst.tool_id, ',' ORDER BY cst.tool_id)
+               FROM public.chat_settings_tools cst
+               WHERE cst.chat_settings_id = cs.id
+           ), '') AS tool_ids
+    FROM public.chat_settings cs
+    WHERE cs.description LIKE 'Auto-generated chat settings%' AND NOT cs.is_template
+)
+SELECT id AS settings_id,
+       first_value(id) OVER (PARTITION BY system_prompt, model, tool_ids ORDER BY id) AS template_id,
+       count(*) OVER (PARTITION BY system_prompt, model, tool_ids) AS shared_by
+FROM signatures;
+
+UPDATE public.chat_settings cs
+SET is_template = true,
+    name = 'Shared settings (migrated)',
+    description = 'Shared chat settings template, folded from per-conversation copies'
+FROM settings_folds f
+WHERE cs.id = f.settings_id AND f.settings_id = f.template_id AND f.shared_by > 1;
+
+UPDATE public.conversations c
+SET chat_settings_id = f.template_id
+FROM settings_folds f
+WHERE c.chat_settings_id = f.settings_id AND f.settings_id <> f.template_id;
+
+DELETE FROM public.chat_settings_tools cst
+USING settings_folds f
+WHERE cst.chat_settings_id = f.settings_id AND f.settings_id <> f.template_id;
+
+DELETE FROM public.chat_settings cs
+USING settings_folds f
+WHERE cs.id = f.settings_id AND f.settings_id <> f.template_id;
+
+COMMIT;
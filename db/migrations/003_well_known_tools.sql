@@ -0,0 +1,24 @@
+-- Key the built-in tools, so they are found by a unique index instead of a table scan.
+-- The oldest existing web search tool becomes the shared one; the backend creates it
+-- at startup if there is none.
+
+BEGIN;
+
+ALTER TABLE public.tools
+    ADD COLUMN IF NOT EXISTS builtin_key character varying;
+
+CREATE UNIQUE INDEX IF NOT EXISTS tools_builtin_key_key ON public.tools(builtin_key);
+
+UPDATE public.tools
+SET builtin_key = 'web_search'
+WHERE id = (
+    SELECT id
+    FROM public.tools
+    WHERE tool_type = 'web_search_preview'
+       OR configuration->>'type' IN ('web_search', 'web_search_preview')
+    ORDER BY created_at, id
+    LIMIT 1
+)
+AND NOT EXISTS (SELECT 1 FROM public.tools WHERE builtin_key = 'web_search');
+
+COMMIT;
@@ -0,0 +1,26 @@
+-- Token-budgeted history: per-message token counts, a budget per chat settings, and an
+-- index that serves the newest-first history window of a chat.
+-- Existing messages get an estimate (4 characters per token, tool fields capped at the
+-- default HISTORY_FIELD_MAX_CHARS); new messages are counted by the backend on insert.
+
+BEGIN;
+
+ALTER TABLE public.chat_settings
+    ADD COLUMN IF NOT EXISTS history_token_budget integer;
+
+ALTER TABLE public.messages
+    ADD COLUMN IF NOT EXISTS token_count integer;
+
+UPDATE public.messages
+SET token_count = 4 + (
+    COALESCE(length(content), 0)
+    + COALESCE(length(openai_function_name), 0)
+    + LEAST(COALESCE(length(function_arguments), 0), 4000)
+    + LEAST(COALESCE(length(function_result), 0), 4000)
+    + 3
+) / 4
+WHERE token_count IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_messages_chatid_created_at ON public.messages(chatid, created_at DESC, id DESC);
+
+COMMIT;
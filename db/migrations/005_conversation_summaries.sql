@@ -0,0 +1,15 @@
+-- Rolling per-conversation summaries of the messages older than the history window.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.conversation_summaries (
+    chatid character varying NOT NULL PRIMARY KEY REFERENCES public.conversations(chatid),
+    summary character varying NOT NULL,
+    summarized_until timestamp with time zone NOT NULL,
+    last_message_id character varying NOT NULL,
+    message_count integer NOT NULL DEFAULT 0,
+    token_count integer,
+    updated_at timestamp with time zone DEFAULT now() NOT NULL
+);
+
+COMMIT;
@@ -0,0 +1,8 @@
+-- Per API request TTL for the tool result cache (NULL keeps the method-based default).
+
+BEGIN;
+
+ALTER TABLE public.api_requests
+    ADD COLUMN IF NOT EXISTS cache_ttl_seconds integer;
+
+COMMIT;
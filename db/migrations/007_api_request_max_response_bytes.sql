@@ -0,0 +1,8 @@
+-- Per API request cap on the response body read by the tool executor (NULL keeps TOOL_RESPONSE_MAX_BYTES).
+
+BEGIN;
+
+ALTER TABLE public.api_requests
+    ADD COLUMN IF NOT EXISTS max_response_bytes integer;
+
+COMMIT;
@@ -0,0 +1,9 @@
+-- Path, query and header parameters of API requests, used by the compiled request plans.
+-- Requests imported before this migration keep NULL; re-import the spec to fill them.
+
+BEGIN;
+
+ALTER TABLE public.api_requests
+    ADD COLUMN IF NOT EXISTS parameters jsonb;
+
+COMMIT;
@@ -0,0 +1,29 @@
+-- Long-running tools run as background jobs: the turn replies with an acknowledgement and
+-- the result is delivered later with a follow-up model turn.
+
+BEGIN;
+
+ALTER TABLE public.tools
+    ADD COLUMN IF NOT EXISTS long_running boolean NOT NULL DEFAULT false;
+
+CREATE TABLE IF NOT EXISTS public.tool_jobs (
+    id character varying NOT NULL PRIMARY KEY,
+    chatid character varying NOT NULL REFERENCES public.conversations(chatid),
+    tool_id character varying REFERENCES public.tools(id),
+    tool_call_id character varying,
+    tool_definition_name character varying,
+    openai_function_name character varying NOT NULL,
+    arguments jsonb,
+    status character varying NOT NULL DEFAULT 'pending',
+    result character varying,
+    error character varying,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    started_at timestamp with time zone,
+    finished_at timestamp with time zone,
+    delivered_at timestamp with time zone
+);
+
+CREATE INDEX IF NOT EXISTS idx_tool_jobs_chatid_created_at ON public.tool_jobs(chatid, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_tool_jobs_status ON public.tool_jobs(status);
+
+COMMIT;
@@ -0,0 +1,9 @@
+-- Time budget of a turn per chat settings; NULL uses the default of the conversation's
+-- source type (WHATSAPP_TURN_TIMEOUT_SECONDS / PORTAL_TURN_TIMEOUT_SECONDS).
+
+BEGIN;
+
+ALTER TABLE public.chat_settings
+    ADD COLUMN IF NOT EXISTS turn_timeout_seconds integer;
+
+COMMIT;
@@ -0,0 +1,9 @@
+-- Edit time of API requests. It is part of the signature of the compiled request plans and
+-- the cached tools payloads, so every worker recompiles a tool after its request is edited.
+
+BEGIN;
+
+ALTER TABLE public.api_requests
+    ADD COLUMN IF NOT EXISTS updated_at timestamp with time zone;
+
+COMMIT;
@@ -47,6 +47,14 @@ CREATE TABLE public.apis (
     processed boolean NOT NULL
 );
 
+-- Component schemas table (OpenAPI schemas stored once, keyed by content hash)
+CREATE TABLE public.component_schemas (
+    hash character varying NOT NULL PRIMARY KEY,
+    name character varying,
+    definition jsonb NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL
+);
+
 -- API requests table
 CREATE TABLE public.api_requests (
     id character varying NOT NULL PRIMARY KEY,
@@ -55,9 +63,15 @@ CREATE TABLE public.api_requests (
     method character varying NOT NULL,
     description character varying,
     request_body_schema jsonb,
+    request_body_schema_hash character varying REFERENCES public.component_schemas(hash),
+    schema_refs jsonb,
     response_schema jsonb,
+    parameters jsonb,
     skip_parameters jsonb,
-    constant_parameters jsonb
+    constant_parameters jsonb,
+    cache_ttl_seconds integer,
+    max_response_bytes integer,
+    updated_at timestamp with time zone
 );
 
 -- Chat settings table
@@ -66,7 +80,11 @@ CREATE TABLE public.chat_settings (
     name character varying NOT NULL,
     description character varying,
     system_prompt character varying NOT NULL,
-    model character varying NOT NULL DEFAULT 'gpt-4o-mini'
+    model character varying NOT NULL DEFAULT 'gpt-4o-mini',
+    is_template boolean NOT NULL DEFAULT false,
+    template_id character varying REFERENCES public.chat_settings(id),
+    history_token_budget integer,
+    turn_timeout_seconds integer
 );
 
 -- Tools table
@@ -80,6 +98,8 @@ CREATE TABLE public.tools (
     configuration jsonb NOT NULL,
     function_schema jsonb,
     skip_params character varying[],
+    builtin_key character varying UNIQUE,
+    long_running boolean NOT NULL DEFAULT false,
     created_at timestamp with time zone DEFAULT now() NOT NULL,
     updated_at timestamp with time zone
 );
@@ -114,6 +134,35 @@ CREATE TABLE public.conversation_participants (
     PRIMARY KEY (number, chatid)
 );
 
+-- Conversation summaries table (older messages folded into one rolling summary)
+CREATE TABLE public.conversation_summaries (
+    chatid character varying NOT NULL PRIMARY KEY REFERENCES public.conversations(chatid),
+    summary character varying NOT NULL,
+    summarized_until timestamp with time zone NOT NULL,
+    last_message_id character varying NOT NULL,
+    message_count integer NOT NULL DEFAULT 0,
+    token_count integer,
+    updated_at timestamp with time zone DEFAULT now() NOT NULL
+);
+
+-- Tool jobs table (long-running tool calls executed in the background)
+CREATE TABLE public.tool_jobs (
+    id character varying NOT NULL PRIMARY KEY,
+    chatid character varying NOT NULL REFERENCES public.conversations(chatid),
+    tool_id character varying REFERENCES public.tools(id),
+    tool_call_id character varying,
+    tool_definition_name character varying,
+    openai_function_name character varying NOT NULL,
+    arguments jsonb,
+    status character varying NOT NULL DEFAULT 'pending',
+    result character varying,
+    error character varying,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    started_at timestamp with time zone,
+    finished_at timestamp with time zone,
+    delivered_at timestamp with time zone
+);
+
 -- Messages table
 CREATE TABLE public.messages (
     id character varying NOT NULL PRIMARY KEY,
@@ -135,6 +184,7 @@ CREATE TABLE public.messages (
     openai_function_name character varying,
     function_arguments character varying,
     function_result character varying,
+    token_count integer,
     created_at timestamp with time zone DEFAULT now()
 );
 
@@ -152,9 +202,11 @@ CREATE INDEX idx_apis_service ON public.apis(service);
 -- Indexes for api_requests table
 CREATE INDEX idx_api_requests_api_id ON public.api_requests(api_id);
 CREATE INDEX idx_api_requests_method ON public.api_requests(method);
+CREATE INDEX idx_api_requests_request_body_schema_hash ON public.api_requests(request_body_schema_hash);
 
 -- Indexes for chat_settings table
 CREATE INDEX idx_chat_settings_model ON public.chat_settings(model);
+CREATE INDEX idx_chat_settings_template_id ON public.chat_settings(template_id);
 
 -- Indexes for tools table
 CREATE INDEX idx_tools_type ON public.tools(type);
@@ -173,9 +225,14 @@ CREATE INDEX idx_conversations_source_type ON public.conversations(source_type);
 -- Indexes for conversation_participants table
 CREATE INDEX idx_conversation_participants_chatid ON public.conversation_participants(chatid);
 
+-- Indexes for tool_jobs table
+CREATE INDEX idx_tool_jobs_chatid_created_at ON public.tool_jobs(chatid, created_at DESC);
+CREATE INDEX idx_tool_jobs_status ON public.tool_jobs(status);
+
 -- Indexes for messages table
 CREATE INDEX idx_messages_chatid ON public.messages(chatid);
 CREATE INDEX idx_messages_type ON public.messages(type);
 CREATE INDEX idx_messages_quoted_message_id ON public.messages(quoted_message_id);
 CREATE INDEX idx_messages_created_at ON public.messages(created_at);
-CREATE INDEX idx_messages_tool_call_id ON public.messages(tool_call_id); 
\ No newline at end of file
+CREATE INDEX idx_messages_tool_call_id ON public.messages(tool_call_id);
+CREATE INDEX idx_messages_chatid_created_at ON public.messages(chatid, created_at DESC, id DESC); 
\ No newline at end of file